@@ -0,0 +1,553 @@
+"""
+Asyncio crawl engine (script.py --engine async).
+
+Runs the same league -> team -> player -> image pipeline as the threaded
+engine, but on a single event loop with one aiohttp session and a global
+in-flight request budget. ImageMagick encoding, the only CPU-bound stage,
+is handed to the shared encode stage (encoder.py).
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from get_miniface import (
+    encode_succeeded,
+    find_player_cards,
+    parse_card,
+    save_card_images,
+    unchanged_card_key,
+    image_sources,
+    is_transient_failure,
+    record_image_response,
+)
+from http_cache import conditional_headers
+from http_client import (
+    DEFAULT_HEADERS,
+    IMAGE_CHUNK_SIZE,
+    NOT_AN_IMAGE,
+    SIGNATURE_LENGTH,
+    get_cache,
+    image_rejection,
+    is_image,
+    record_fetch,
+    rewrite_url,
+)
+from metrics import run_metrics
+import concurrency
+import discovery
+import manifest
+import rate_limiter
+from players_in_team import parse_players_in_team
+from event_cache import events
+from teams import parse_teams_urls
+
+# Import configuration with fallbacks
+try:
+    from config import (
+        REQUEST_TIMEOUT,
+        MAX_RETRIES,
+        RETRY_DELAY_BASE,
+        ASYNC_MAX_IN_FLIGHT,
+        ASYNC_LIMIT_PER_HOST,
+        HEDGED_IMAGE_FETCH,
+        HEDGE_DELAY,
+        MAX_IMAGE_BYTES,
+    )
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    REQUEST_TIMEOUT = 30
+    MAX_RETRIES = 3
+    RETRY_DELAY_BASE = 1
+    ASYNC_MAX_IN_FLIGHT = 200
+    ASYNC_LIMIT_PER_HOST = 100
+    HEDGED_IMAGE_FETCH = False
+    HEDGE_DELAY = 0.5
+    MAX_IMAGE_BYTES = 8 * 1024 * 1024
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def log_debug(message):
+    """Print debug messages only if in debug mode"""
+    if os.getenv("DEBUG") or globals().get("DEBUG", False):
+        print(f"[DEBUG] {message}")
+
+
+class AsyncCrawler:
+    """Event-loop driven crawler sharing one session and one request budget"""
+
+    def __init__(
+        self,
+        done_players,
+        output_dir_standard,
+        output_dir_background,
+        alternate_offsets=None,
+        max_in_flight=ASYNC_MAX_IN_FLIGHT,
+        shard=None,
+        quiet=False,
+    ):
+        self.done_players = done_players
+        # Player ID -> task of the first listing processed in this run
+        self.player_tasks = {}
+        self.output_dir_standard = output_dir_standard
+        self.output_dir_background = output_dir_background
+        self.alternate_offsets = alternate_offsets or []
+        self.max_in_flight = max_in_flight
+        self.shard = shard
+        self.quiet = quiet
+
+        self.session = None
+        self.semaphore = None
+        # Event name -> task, so each background is downloaded only once
+        self.events = {}
+
+    @staticmethod
+    async def read_image(r, max_bytes):
+        """
+        Async counterpart of http_client._read_image.
+
+        Returns:
+            tuple: (body, bytes read, rejected); body is empty and rejected
+            the reason if the response is not an image of at most max_bytes
+        """
+        rejected = image_rejection(
+            r.headers.get("Content-Type"), r.headers.get("Content-Length"), max_bytes
+        )
+        chunks = []
+        size = 0
+        sniffed = False
+        if rejected is None:
+            async for chunk in r.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    rejected = f"body exceeds the limit of {max_bytes} bytes"
+                    break
+                chunks.append(chunk)
+                if not sniffed and size >= SIGNATURE_LENGTH:
+                    sniffed = True
+                    if not is_image(b"".join(chunks)[:SIGNATURE_LENGTH]):
+                        rejected = NOT_AN_IMAGE
+                        break
+            if rejected is None and not sniffed and not is_image(b"".join(chunks)):
+                rejected = NOT_AN_IMAGE
+        if rejected is not None:
+            log_debug(f"Aborted image download {r.url}: {rejected}")
+            r.close()
+            return b"", size, rejected
+        return b"".join(chunks), size, None
+
+    async def fetch(self, url, cache=False, image=False):
+        """
+        GET a URL within the global in-flight budget and per-host rate limit.
+
+        Args:
+            url: URL to fetch
+            cache: Revalidate against / store in the on-disk HTTP cache
+            image: Stream the body and abort it early unless it is an image
+                of at most MAX_IMAGE_BYTES (an aborted body is empty)
+
+        Returns:
+            tuple: (status, body, final_url, rejected); rejected is the
+            reason an image body was aborted, or None
+
+        Raises:
+            aiohttp.ClientError or asyncio.TimeoutError after MAX_RETRIES
+        """
+        cache = get_cache() if cache else None
+        entry = cache.lookup(url) if cache is not None else None
+        headers = conditional_headers(entry) if entry is not None else None
+
+        limit = concurrency.limit_for(url)
+        for attempt in range(MAX_RETRIES):
+            try:
+                if limit is not None:
+                    await limit.acquire_async()
+                status_code = None
+                rejected = None
+                abandoned = False
+                start_time = time.perf_counter()
+                try:
+                    await rate_limiter.acquire_async(url)
+                    async with self.semaphore:
+                        start_time = time.perf_counter()
+                        async with self.session.get(
+                            rewrite_url(url), headers=headers
+                        ) as r:
+                            status_code = r.status
+                            if not image:
+                                body = await r.read()
+                                size = len(body)
+                            elif r.status == 200:
+                                body, size, rejected = await self.read_image(
+                                    r, MAX_IMAGE_BYTES
+                                )
+                            else:
+                                # Error pages of image requests are never read
+                                body, size = b"", 0
+                                r.close()
+                except asyncio.CancelledError:
+                    # A lost hedged fetch is no congestion signal
+                    abandoned = True
+                    raise
+                finally:
+                    if limit is not None:
+                        elapsed = time.perf_counter() - start_time
+                        limit.release(elapsed, status_code, abandoned=abandoned)
+                record_fetch(url, time.perf_counter() - start_time, r.status, size)
+                throttled = rate_limiter.report_response(url, r.status, r.headers)
+                if throttled and attempt < MAX_RETRIES - 1:
+                    log_debug(f"Throttled (HTTP {r.status}) on {url}, backing off")
+                    continue
+
+                if entry is not None and r.status == 304:
+                    cached_body = cache.read_body(entry)
+                    if cached_body is not None:
+                        return 200, cached_body, str(r.url), None
+                    return await self.fetch(url, image=image)
+
+                if cache is not None and r.status == 200 and rejected is None:
+                    cache.store(url, body, r.headers)
+                return r.status, body, str(r.url), rejected
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                record_fetch(url, time.perf_counter() - start_time)
+                if attempt < MAX_RETRIES - 1:
+                    log_debug(f"Retry {attempt + 1}/{MAX_RETRIES} for {url}: {e}")
+                    await asyncio.sleep(RETRY_DELAY_BASE * (attempt + 1))
+                else:
+                    raise
+
+    async def fetch_page(self, url, cache=False):
+        """Fetch an HTML page, returning its body or None on failure"""
+        try:
+            status, body, _, _ = await self.fetch(url, cache=cache)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log_error(f"Error fetching {url}: {e}")
+            return None
+        if status >= 400:
+            log_error(f"Error fetching {url}: HTTP {status}")
+            return None
+        return body
+
+    async def download_image(self, url):
+        """Async counterpart of get_miniface.download_image"""
+        sources = image_sources(url)
+        if not sources:
+            log_debug(f"Skipped image known to be missing: {url}")
+            return False
+        if HEDGED_IMAGE_FETCH and len(sources) > 1:
+            return await self.download_image_hedged(url, sources)
+
+        failed = False
+        for source in sources:
+            try:
+                status, body, _, rejected = await self.fetch(
+                    source, cache=True, image=True
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                log_error(f"Failed to download {source}: {e}")
+                return None
+            if record_image_response(url, source, status, body, rejected):
+                return body
+            if is_transient_failure(status):
+                log_error(f"Failed to download {source}: HTTP {status}")
+                failed = True
+            else:
+                log_debug(f"Image not found (HTTP {status}): {source}")
+
+        return None if failed else False
+
+    async def download_image_hedged(self, url, sources):
+        """
+        Async counterpart of get_miniface.download_image_hedged: the losers
+        are cancelled as soon as one source returns a valid image.
+        """
+        pending = list(sources)
+        running = {}
+        failed = False
+        try:
+            while pending or running:
+                if pending:
+                    if running:
+                        # The running sources are slow: hedge with the next one
+                        run_metrics.record("image_hedge", 0.0)
+                    source = pending.pop(0)
+                    running[
+                        asyncio.ensure_future(
+                            self.fetch(source, cache=True, image=True)
+                        )
+                    ] = source
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=HEDGE_DELAY if pending else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    source = running.pop(task)
+                    try:
+                        status, body, _, rejected = task.result()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        log_error(f"Failed to download {source}: {e}")
+                        failed = True
+                        continue
+                    if record_image_response(url, source, status, body, rejected):
+                        return body
+                    if is_transient_failure(status):
+                        log_error(f"Failed to download {source}: HTTP {status}")
+                        failed = True
+                    else:
+                        log_debug(f"Image not found (HTTP {status}): {source}")
+            return None if failed else False
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def get_card_event(self, event_name, event_url):
+        """Download an event background once and share it between cards"""
+        # Cards waiting on an event that is still downloading share its task
+        task = self.events.get(event_name)
+        if task is not None:
+            events.count_wait()
+            return await task
+
+        data = events.lookup(event_name)
+        if data is not None:
+            return data
+
+        task = asyncio.ensure_future(self.download_image(event_url))
+        self.events[event_name] = task
+        try:
+            data = await task
+        finally:
+            del self.events[event_name]
+        events.store(event_name, data)
+        return data
+
+    async def process_card(self, card, player_id):
+        """
+        Download the images of one card and hand them to the encoder.
+
+        Returns:
+            Same as get_miniface.save_card_images
+        """
+        image_dict, image_download_tasks = parse_card(card)
+        card_key = unchanged_card_key(image_dict, player_id)
+        if card_key is not None:
+            return card_key
+
+        coroutines = []
+        for img_type, url, name in image_download_tasks:
+            if img_type == "main":
+                coroutines.append(self.download_image(url))
+            else:
+                coroutines.append(self.get_card_event(name, url))
+
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+        for (img_type, _, name), result in zip(image_download_tasks, results):
+            if isinstance(result, Exception):
+                log_error(f"Error downloading {img_type} image {name}: {result}")
+                result = None
+            if img_type == "main":
+                image_dict["bytes"] = result
+            else:
+                image_dict["background_bytes"] = result
+
+        # Submitting can block while the encode queue is full, so do it off
+        # the event loop, then wait for the encode itself
+        loop = asyncio.get_running_loop()
+        encodes = []
+        card_key = await loop.run_in_executor(
+            None,
+            save_card_images,
+            image_dict,
+            player_id,
+            self.output_dir_standard,
+            self.output_dir_background,
+            encodes,
+        )
+        if encodes:
+            await asyncio.wait([asyncio.wrap_future(f) for f in encodes])
+        if not all(map(encode_succeeded, encodes)):
+            return None
+        return card_key
+
+    async def process_player(self, player_url):
+        """
+        Process a single player - download and extract minifaces.
+
+        A player listed by several teams is processed once; the other teams
+        wait for that result, so none of them counts as done before the
+        player's files are on disk.
+
+        Returns:
+            bool: False if the player page could not be fetched or any of
+            its cards was not generated
+        """
+        player_id = str(player_url.split("/player/")[-1].split("/")[0])
+        task = self.player_tasks.get(player_id)
+        if task is None:
+            if player_id in self.done_players:
+                log_debug(f"Skipped {player_id} (completed in a previous run)")
+                return True
+            self.done_players.add(player_id)
+            task = self.player_tasks[player_id] = asyncio.ensure_future(
+                self.process_player_page(player_id, player_url)
+            )
+        else:
+            log_debug(f"Waiting for {player_id} (listed by another team)")
+        return await task
+
+    async def process_player_page(self, player_id, player_url):
+        """Fetch a player page and generate the minifaces of all of its cards"""
+        body = await self.fetch_page(player_url, cache=True)
+        if body is None:
+            return False
+
+        page_hash = None
+        if manifest.active_manifest is not None:
+            page_hash = manifest.hash_bytes(body)
+            if manifest.active_manifest.player_unchanged(player_id, page_hash):
+                log_debug(f"Skipped {player_id} (unchanged since last run)")
+                discovery.mark_done("player", player_id)
+                return True
+
+        cards = find_player_cards(body)
+        if not cards:
+            log_debug(f"No efootball-2022 cards found for player {player_id}")
+            discovery.mark_done("player", player_id)
+            return True
+
+        card_keys = await asyncio.gather(
+            *(self.process_card(card, player_id) for card in cards)
+        )
+        if None in card_keys:
+            log_error(f"Incomplete player {player_id}, not marking it done")
+            return False
+        if page_hash is not None:
+            manifest.active_manifest.record_player(player_id, page_hash, card_keys)
+        discovery.mark_done("player", player_id)
+        return True
+
+    async def process_team(self, team_url):
+        """Process a single team - get all players and process them concurrently"""
+        players_urls = discovery.recorded_players(team_url)
+        if players_urls is None:
+            body = await self.fetch_page(team_url, cache=True)
+            if body is None:
+                return False
+            players_urls = discovery.record_players(
+                team_url, parse_players_in_team(body, team_url)
+            )
+
+        if not players_urls:
+            log_debug(f"No players found for team {team_url}")
+            return False
+
+        results = await asyncio.gather(
+            *(self.process_player(player_url) for player_url in players_urls)
+        )
+        discovery.finish_team(team_url, all(results))
+        return True
+
+    async def process_league(self, league_counter, league_url, league_name, total):
+        """Process a single league - get all teams and process them concurrently"""
+        start_time = time.time()
+        if not self.quiet:
+            print(f"\nStarted League ({league_counter + 1}/{total}): {league_name}")
+
+        if discovery.is_done("league", league_url):
+            log_debug(f"Skipped League {league_name} (completed in a previous run)")
+            return True
+
+        teams_urls = discovery.recorded_teams(league_url)
+        if teams_urls is None:
+            body = await self.fetch_page(league_url, cache=True)
+            teams_urls = discovery.record_teams(
+                league_url,
+                league_name,
+                parse_teams_urls(body) if body is not None else [],
+                self.alternate_offsets,
+                self.shard,
+            )
+            if teams_urls is None:
+                return False
+
+        teams_urls = discovery.outstanding_teams(league_name, teams_urls)
+        results = await asyncio.gather(
+            *(self.process_team(team_url) for team_url in teams_urls)
+        )
+        discovery.finish_league(league_url)
+
+        elapsed_time = time.time() - start_time
+        if not self.quiet:
+            print(
+                f"✓ Completed League {league_name} in {elapsed_time:.2f}s ({sum(results)}/{len(teams_urls)} teams successful)"
+            )
+        return True
+
+    async def run(self, leagues_urls, leagues_names):
+        """Crawl every league concurrently and return the number that succeeded"""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_in_flight, limit_per_host=ASYNC_LIMIT_PER_HOST
+        )
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=DEFAULT_HEADERS
+        ) as self.session:
+            results = await asyncio.gather(
+                *(
+                    self.process_league(
+                        counter, url, leagues_names[counter], len(leagues_urls)
+                    )
+                    for counter, url in enumerate(leagues_urls)
+                )
+            )
+        return sum(results)
+
+
+def run_async_engine(
+    leagues_urls,
+    leagues_names,
+    done_players,
+    output_dir_standard,
+    output_dir_background,
+    alternate_offsets=None,
+    max_in_flight=ASYNC_MAX_IN_FLIGHT,
+    shard=None,
+    quiet=False,
+):
+    """
+    Run the asyncio engine to completion.
+
+    Returns:
+        int: Number of leagues processed successfully
+
+    Raises:
+        RuntimeError: If aiohttp is not installed
+    """
+    if aiohttp is None:
+        raise RuntimeError(
+            "The async engine requires aiohttp (install the 'async' extra)"
+        )
+
+    crawler = AsyncCrawler(
+        done_players,
+        output_dir_standard,
+        output_dir_background,
+        alternate_offsets=alternate_offsets,
+        max_in_flight=max_in_flight,
+        shard=shard,
+        quiet=quiet,
+    )
+    return asyncio.run(crawler.run(leagues_urls, leagues_names))
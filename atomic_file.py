@@ -0,0 +1,33 @@
+"""
+Atomic file writes shared by the caches, journals and outputs.
+
+Data is written to a temp file next to the target and renamed over it, so
+readers (and an interrupted run) never see a half-written file. The temp
+file is removed again if the write fails.
+"""
+
+import os
+import tempfile
+
+
+def write_atomic(path, data):
+    """
+    Atomically replace path with data (bytes, or str written as UTF-8).
+
+    Missing parent directories are created.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
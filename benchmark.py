@@ -0,0 +1,267 @@
+"""
+Benchmark the scrapers against the local stand-in server (fixture_server.py).
+
+Each configuration runs script.py (or get_update_only.py) as a subprocess in
+a fresh working directory, with every request redirected to the fixture
+server. For each run the following are reported:
+
+- players/sec and images/sec (DDS files written)
+- p50 / p95 request latency as seen by the scraper
+- CPU time (user + system, including encode worker processes)
+- peak RSS of the largest process
+
+Configurations are given as NAME="ARGS", e.g.
+    python benchmark.py --run threads="--engine threads" --run async="--engine async"
+"""
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fixture_server import (
+    add_server_arguments,
+    rewrite_rules,
+    source_from_arguments,
+    start_server,
+)
+
+# Directory holding script.py and get_update_only.py
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configurations run when no --run option is given
+DEFAULT_RUNS = {
+    "script.py": {
+        "threads": "--engine threads",
+        "async": "--engine async",
+        "pipeline": "--engine pipeline",
+    },
+    "get_update_only.py": {"default": ""},
+}
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def parse_run(value):
+    """Parse a NAME=ARGS configuration"""
+    name, _, arguments = value.partition("=")
+    if not name:
+        raise argparse.ArgumentTypeError("expected NAME=ARGS")
+    return name, arguments
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark crawl configurations against a local pesmaster stand-in",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark.py                                   # threads, async and pipeline engines
+  python benchmark.py --latency 0.05 --jitter 0.02      # Simulate a remote server
+  python benchmark.py --error-rate 0.02 --repeat 3      # Exercise the retry path
+  python benchmark.py --script get_update_only.py
+  python benchmark.py --run small="--workers 16" --run big="--workers 128"
+  python benchmark.py --fixtures fixtures --record      # Record real pages once, then replay
+        """,
+    )
+    parser.add_argument(
+        "--script",
+        choices=sorted(DEFAULT_RUNS),
+        default="script.py",
+        help="Scraper to benchmark (default: script.py)",
+    )
+    parser.add_argument(
+        "--run",
+        type=parse_run,
+        action="append",
+        metavar="NAME=ARGS",
+        help="Configuration to run (repeatable; default: one per engine)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs per configuration (default: 1)"
+    )
+    parser.add_argument(
+        "--rate-scale",
+        type=float,
+        default=1000.0,
+        help="Multiplier applied to the configured rate limits (default: 1000, i.e. effectively unlimited)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=1800,
+        help="Seconds before a run is killed (default: 1800)",
+    )
+    parser.add_argument("--json", help="Also write the results as JSON to this path")
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the working directory of every run"
+    )
+    add_server_arguments(parser)
+    return parser.parse_args()
+
+
+def count_images(work_dir):
+    """Count the DDS files written by a run"""
+    return sum(
+        filename.endswith(".dds")
+        for _, _, filenames in os.walk(work_dir)
+        for filename in filenames
+    )
+
+
+def run_config(script, arguments, base_url, rate_scale, timeout, keep):
+    """
+    Run one configuration and return its measurements.
+
+    Returns:
+        dict or None if the run failed
+    """
+    work_dir = tempfile.mkdtemp(prefix="miniface-bench-")
+    report_path = os.path.join(work_dir, "run_report.json")
+    env = dict(
+        os.environ,
+        MINIFACE_URL_REWRITE=rewrite_rules(base_url),
+        MINIFACE_RATE_SCALE=str(rate_scale),
+    )
+    command = [
+        sys.executable,
+        os.path.join(REPO_DIR, script),
+        "--quiet",
+        "--report",
+        report_path,
+        *shlex.split(arguments),
+    ]
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=work_dir, env=env, stdout=subprocess.DEVNULL
+    )
+    deadline = start_time + timeout
+    while True:
+        # wait4 reports the usage of this run alone (including the encode
+        # processes it reaped), unlike RUSAGE_CHILDREN
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            break
+        if time.perf_counter() > deadline:
+            process.kill()
+            pid, status, usage = os.wait4(process.pid, 0)
+            log_error(f"{script} {arguments} timed out after {timeout:.0f}s")
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start_time
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        stats = report["run"]
+    except (OSError, ValueError, KeyError):
+        report = stats = None
+    images = count_images(work_dir)
+    if keep:
+        print(f"  kept {work_dir}")
+    else:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if process.returncode != 0 or stats is None:
+        log_error(f"{script} {arguments} failed (exit code {process.returncode})")
+        return None
+
+    return {
+        "elapsed": elapsed,
+        "players": stats["players"],
+        "images": images,
+        "players_per_sec": stats["players"] / elapsed,
+        "images_per_sec": images / elapsed,
+        "requests": stats["requests"],
+        "latency_p50": stats["latency_p50"],
+        "latency_p95": stats["latency_p95"],
+        "cpu": usage.ru_utime + usage.ru_stime,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": usage.ru_maxrss / 1024,
+        "stages": report["stages"],
+    }
+
+
+def median_result(results):
+    """Pick the run with the median wall time out of repeated runs"""
+    results = sorted(results, key=lambda result: result["elapsed"])
+    return results[len(results) // 2]
+
+
+def print_table(rows):
+    """Print one line per configuration"""
+    print(
+        f"\n{'config':<16}{'time':>8}{'players/s':>11}{'images/s':>10}"
+        f"{'p50':>9}{'p95':>9}{'CPU':>8}{'RSS':>9}"
+    )
+    for name, result in rows:
+        if result is None:
+            print(f"{name:<16}{'failed':>8}")
+            continue
+        print(
+            f"{name:<16}{result['elapsed']:>7.2f}s{result['players_per_sec']:>11.1f}"
+            f"{result['images_per_sec']:>10.1f}{result['latency_p50'] * 1000:>7.1f}ms"
+            f"{result['latency_p95'] * 1000:>7.1f}ms{result['cpu']:>7.2f}s"
+            f"{result['peak_rss_mib']:>6.0f}MiB"
+        )
+
+
+def main():
+    args = parse_arguments()
+    runs = args.run or list(DEFAULT_RUNS[args.script].items())
+
+    server = start_server(
+        source_from_arguments(args),
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+    )
+    print(f"Fixture server on {server.base_url}")
+
+    rows = []
+    for name, arguments in runs:
+        print(f"Running {name} ({args.script} {arguments})...")
+        results = [
+            run_config(
+                args.script,
+                arguments,
+                server.base_url,
+                args.rate_scale,
+                args.timeout,
+                args.keep,
+            )
+            for _ in range(max(args.repeat, 1))
+        ]
+        results = [result for result in results if result is not None]
+        rows.append((name, median_result(results) if results else None))
+
+    server.shutdown()
+    print_table(rows)
+    print(f"\nServer: {server.counters}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "script": args.script,
+                    "server": server.counters,
+                    "results": dict(rows),
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Checkpoint journal for resuming interrupted scrapes.
+
+The journal is an append-only JSON-lines file. Each line either queues the
+children discovered for a unit of work (the teams of a league, the players
+of a team) or marks a league, team or player as completed. Writes are
+buffered and flushed periodically, so a crash loses at most a few seconds
+of progress. With --resume the journal is replayed and only outstanding
+work is processed.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+# Import configuration with fallbacks
+try:
+    from config import CHECKPOINT_FLUSH_INTERVAL, CHECKPOINT_FLUSH_RECORDS
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    CHECKPOINT_FLUSH_INTERVAL = 10
+    CHECKPOINT_FLUSH_RECORDS = 500
+
+# Journal used by the current run (None if checkpointing is disabled)
+active_journal = None
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+class Journal:
+    """Thread-safe append-only progress journal"""
+
+    KINDS = ("league", "team", "player")
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.completed = {kind: set() for kind in self.KINDS}
+        self.queued = {}
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+        if resume:
+            self._replay()
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _replay(self):
+        """Rebuild completed units and queued work from an existing journal"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A crash can leave the last line half-written
+                        continue
+                    if record.get("t") == "done":
+                        self.completed[record["k"]].add(record["id"])
+                    elif record.get("t") == "queue":
+                        self.queued[record["id"]] = record["items"]
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log_error(f"Could not read checkpoint journal {self.path}: {e}")
+
+    def _append(self, record):
+        with self.lock:
+            self.buffer.append(json.dumps(record, separators=(",", ":")))
+            due = (
+                len(self.buffer) >= CHECKPOINT_FLUSH_RECORDS
+                or time.monotonic() - self.last_flush >= CHECKPOINT_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def is_done(self, kind, key):
+        """Check whether a league/team/player was completed by an earlier run"""
+        with self.lock:
+            return key in self.completed[kind]
+
+    def completed_players(self):
+        """Return the set of player IDs completed so far"""
+        with self.lock:
+            return set(self.completed["player"])
+
+    def queued_items(self, parent):
+        """Return the children recorded for a league/team URL, or None"""
+        with self.lock:
+            return self.queued.get(parent)
+
+    def queue(self, parent, items):
+        """Record the work discovered for a league/team URL"""
+        with self.lock:
+            self.queued[parent] = list(items)
+        self._append({"t": "queue", "id": parent, "items": list(items)})
+
+    def mark_done(self, kind, key):
+        """Record a league/team/player as completed"""
+        with self.lock:
+            if key in self.completed[kind]:
+                return
+            self.completed[kind].add(key)
+        self._append({"t": "done", "k": kind, "id": key})
+
+    def flush(self):
+        """Write buffered records to disk and fsync"""
+        with self.lock:
+            if self.buffer:
+                self.file.write("\n".join(self.buffer) + "\n")
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.buffer = []
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        """Flush and close the journal"""
+        self.flush()
+        with self.lock:
+            self.file.close()
+
+
+def enable(path, resume=False):
+    """Open the journal at path and make it the active one for this run"""
+    global active_journal
+    active_journal = Journal(path, resume=resume)
+    return active_journal
@@ -0,0 +1,199 @@
+"""
+Adaptive (AIMD) limits on in-flight requests.
+
+Worker counts in config.py are upper bounds; how many requests are actually
+in flight to a host group (see rate_limiter.host_group) is decided at
+runtime. Like TCP congestion control, the limit grows by one for every
+window of successful responses and is cut multiplicatively on timeouts,
+429/5xx responses, or when the response latency climbs well above the
+uncongested baseline - so the scrape converges to the highest concurrency
+the server tolerates instead of relying on hand-picked constants.
+"""
+
+import asyncio
+import threading
+
+from rate_limiter import host_group
+
+# Import configuration with fallbacks
+try:
+    from config import (
+        ADAPTIVE_CONCURRENCY,
+        CONCURRENCY_LIMITS,
+        CONCURRENCY_DECREASE,
+        CONCURRENCY_LATENCY_TOLERANCE,
+    )
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    ADAPTIVE_CONCURRENCY = True
+    CONCURRENCY_LIMITS = {
+        "pages": (8, 1, 64),
+        "graphics": (16, 2, 128),
+        "mirror": (4, 1, 32),
+    }
+    CONCURRENCY_DECREASE = 0.7
+    CONCURRENCY_LATENCY_TOLERANCE = 3.0
+
+# Weight of the newest sample in the smoothed latency
+LATENCY_SMOOTHING = 0.1
+# Per-response growth of the baseline latency, so it follows a server that
+# became slower for good instead of treating it as congested forever
+BASELINE_DRIFT = 1.001
+# How often a cancellable acquire checks its cancel event, in seconds
+CANCEL_POLL_INTERVAL = 0.05
+
+
+class AIMDLimit:
+    """Blocking gate whose capacity follows an AIMD controller"""
+
+    def __init__(self, initial, minimum, maximum):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.completed = 0
+        # No further decrease until this many responses have completed, so
+        # one burst of failures counts as a single congestion signal
+        self.hold_until = 0
+        self.baseline = None
+        self.smoothed = None
+        self.decreases = 0
+        self.cond = threading.Condition()
+        self.async_waiters = []
+
+    def _free(self):
+        return int(self.limit) - self.in_flight
+
+    def acquire(self, cancelled=None):
+        """
+        Block until a request may be sent.
+
+        Args:
+            cancelled: Optional threading.Event; the wait is given up once
+                it is set (e.g. for the losers of a hedged fetch)
+
+        Returns:
+            bool: True if a slot was taken, False if cancelled
+        """
+        with self.cond:
+            while self._free() <= 0:
+                if cancelled is None:
+                    self.cond.wait()
+                elif cancelled.is_set():
+                    return False
+                else:
+                    self.cond.wait(CANCEL_POLL_INTERVAL)
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self):
+        """Wait on the event loop until a request may be sent"""
+        while True:
+            with self.cond:
+                if self._free() > 0:
+                    self.in_flight += 1
+                    return
+                loop = asyncio.get_running_loop()
+                waiter = loop.create_future()
+                self.async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self.cond:
+                    if waiter.done() and not waiter.cancelled():
+                        # Pass the wake-up on to the next waiter
+                        self._wake()
+                    elif (loop, waiter) in self.async_waiters:
+                        self.async_waiters.remove((loop, waiter))
+                raise
+
+    def release(self, elapsed=None, status_code=None, failed=False, abandoned=False):
+        """
+        Free the slot of a finished request and adjust the limit.
+
+        Args:
+            elapsed: Request duration in seconds
+            status_code: Response status, None if the request failed
+            failed: True for timeouts and connection errors
+            abandoned: True if the caller cancelled the request (e.g. a lost
+                hedged fetch); frees the slot without adjusting the limit
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if abandoned:
+                self._wake()
+                return
+            self.completed += 1
+            if (
+                failed
+                or status_code is None
+                or status_code == 429
+                or status_code >= 500
+            ):
+                self._decrease()
+            elif elapsed is not None:
+                self._observe_latency(elapsed)
+            self._wake()
+
+    def _observe_latency(self, elapsed):
+        if self.baseline is None:
+            self.baseline = self.smoothed = elapsed
+        self.baseline = min(elapsed, self.baseline * BASELINE_DRIFT)
+        self.smoothed += LATENCY_SMOOTHING * (elapsed - self.smoothed)
+        if self.smoothed > self.baseline * CONCURRENCY_LATENCY_TOLERANCE:
+            # Requests are queueing on the server side
+            self._decrease()
+        elif self.in_flight + 1 >= int(self.limit):
+            # Only grow while the current limit is actually used; one slot
+            # per window of `limit` successes
+            self.limit = min(self.limit + 1 / self.limit, self.maximum)
+
+    def _decrease(self):
+        if self.completed < self.hold_until:
+            return
+        self.limit = max(self.limit * CONCURRENCY_DECREASE, self.minimum)
+        self.hold_until = self.completed + self.in_flight + 1
+        self.decreases += 1
+
+    def _wake(self):
+        free = self._free()
+        if free <= 0:
+            return
+        self.cond.notify(free)
+        while free > 0 and self.async_waiters:
+            loop, waiter = self.async_waiters.pop(0)
+            loop.call_soon_threadsafe(_resolve, waiter)
+            free -= 1
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_limits = {group: AIMDLimit(*limits) for group, limits in CONCURRENCY_LIMITS.items()}
+
+
+def limit_for(url):
+    """Return the adaptive limit of a URL's host group, or None if disabled"""
+    if not ADAPTIVE_CONCURRENCY:
+        return None
+    return _limits.get(host_group(url))
+
+
+def snapshot():
+    """Current limit and number of cuts per host group"""
+    return {
+        group: {"limit": int(limit.limit), "decreases": limit.decreases}
+        for group, limit in _limits.items()
+    }
+
+
+def describe():
+    """Human readable summary of the current limits"""
+    if not ADAPTIVE_CONCURRENCY:
+        return "disabled"
+    return ", ".join(
+        f"{group}={stats['limit']} in flight ({stats['decreases']} cuts)"
+        for group, stats in snapshot().items()
+    )
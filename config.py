@@ -1,6 +1,7 @@
 # Configuration file for the optimized eFootball miniface downloader
 # Python 3.14t Free-Threading Optimized
 
+import os
 import sys
 
 # Detect if GIL is disabled (free-threading mode)
@@ -16,25 +17,166 @@ DEBUG_MODE = (
 QUIET_MODE = False  # Enable quiet mode by default (can be overridden by --quiet flag)
 
 # Threading Configuration - Optimized for Free-Threading
-# Adjust these based on your system and network capacity
+# These are upper bounds: the number of requests actually in flight is tuned
+# at runtime (see Adaptive Concurrency below).
+# MAX_WORKERS is the total thread count of script.py (threads engine) and
+# get_update_only.py: team, player and image tasks share one priority
+# executor (work_executor.py). The per-level counts size the pipeline engine.
 # With free-threading (GIL disabled), we can use MORE workers for true parallelism
 if not GIL_ENABLED:
     # Free-threading optimized: 2x more workers for true parallel execution
+    MAX_WORKERS = 256  # Total worker threads (2x increase)
     MAX_WORKERS_TEAMS = 8  # Concurrent teams processing (2x increase)
     MAX_WORKERS_PLAYERS = 16  # Concurrent players per team (2x increase)
-    MAX_WORKERS_IMAGES = 12  # Concurrent image downloads per player (2x increase)
 else:
     # Conservative settings for GIL-bound Python
+    MAX_WORKERS = 64  # Total worker threads
     MAX_WORKERS_TEAMS = 4  # Concurrent teams processing
     MAX_WORKERS_PLAYERS = 8  # Concurrent players per team
-    MAX_WORKERS_IMAGES = 6  # Concurrent image downloads per player
 
 # Request Rate Limiting
-# These delays help avoid overwhelming the server
-REQUEST_DELAY = 0.5  # Delay between main requests (seconds)
-IMAGE_REQUEST_DELAY = 0.5  # Delay between image downloads (seconds)
+# Every request takes a token from a process-wide, per-host bucket (see
+# rate_limiter.py), so the request rate no longer grows with the worker count.
+# Values are (requests per second, burst size).
+RATE_LIMITS = {
+    "pages": (10.0, 10),  # pesmaster.com league/team/player pages
+    "graphics": (20.0, 20),  # pesmaster.com card images
+    "mirror": (5.0, 5),  # efootballhub.net fallback images
+}
+RATE_LIMIT_BACKOFF = 0.5  # Rate multiplier applied on 429/503 responses
+RATE_LIMIT_RECOVERY = 1.05  # Rate multiplier per successful response (up to limit)
+REQUEST_DELAY = 1 / RATE_LIMITS["pages"][0]  # Min interval between page requests
 REQUEST_TIMEOUT = 30  # Timeout for all HTTP requests (seconds)
 
+# Adaptive Concurrency
+# In-flight requests per host group are tuned at runtime (AIMD, see
+# concurrency.py): the limit grows by one per window of successful responses
+# and is multiplied by CONCURRENCY_DECREASE on timeouts, 429/5xx responses,
+# or when latency exceeds CONCURRENCY_LATENCY_TOLERANCE x the uncongested
+# baseline. Values are (initial, minimum, maximum) in-flight requests.
+ADAPTIVE_CONCURRENCY = True
+CONCURRENCY_LIMITS = {
+    "pages": (8, 1, 64),
+    "graphics": (16, 2, 128),
+    "mirror": (4, 1, 32),
+}
+CONCURRENCY_DECREASE = 0.7
+CONCURRENCY_LATENCY_TOLERANCE = 3.0
+
+# HTTP Connection Pooling
+# All scrapers share one keep-alive session (see http_client.py).
+HTTP_POOL_CONNECTIONS = 4  # Number of hosts to keep connection pools for
+HTTP_POOL_MAXSIZE = None  # Connections per host (None = MAX_WORKERS + 1)
+
+# Image Downloads
+# Card images are streamed: a response whose Content-Type or first bytes are
+# not an image (e.g. a soft-404 HTML page) is aborted without reading the
+# rest, and so is one larger than this.
+MAX_IMAGE_BYTES = 8 * 1024 * 1024
+
+# HTML Parsing
+# Parser used by the scrapers: "lxml" (fast, install the `fast` extra) or
+# "html.parser" (pure Python). None picks lxml when it is installed.
+HTML_PARSER = None
+
+# URL Rewrites
+# Prefix -> replacement applied to every request URL, e.g. to point the
+# scrapers at a local stand-in server. The MINIFACE_URL_REWRITE environment
+# variable ("from=to,from=to") overrides this (used by benchmark.py).
+URL_REWRITES = {}
+
+# Persistent HTTP Cache
+# Responses with ETag/Last-Modified are stored here and revalidated with
+# conditional requests on the next run. Persist this directory between CI
+# runs (actions/cache). Set to None to disable.
+HTTP_CACHE_DIR = ".http_cache"
+# Entries not revalidated for this long are deleted at the end of a run,
+# together with bodies no entry refers to any more, so the persisted
+# directory does not grow without bound.
+HTTP_CACHE_MAX_AGE = 30 * 24 * 3600
+
+# Incremental Builds (--incremental)
+# Records source/output hashes of every generated DDS file so unchanged
+# players and cards are skipped on the next run.
+MANIFEST_PATH = "miniface_manifest.json"
+
+# Negative Cache (skipped_players.txt)
+# Card images that returned 404 or an HTML page are not requested again
+# until their retry horizon (doubling with every further miss), and the
+# mirror that last served a card is tried first. The GitHub workflows commit
+# this file. Set to None to disable.
+NEGATIVE_CACHE_PATH = os.path.join(
+    "MinifaceServer", "content", "miniface-server", "skipped_players.txt"
+)
+NEGATIVE_CACHE_RETRY = 7 * 24 * 3600  # Seconds before a missing image is re-probed
+NEGATIVE_CACHE_MAX_RETRY = 90 * 24 * 3600  # Upper bound of the doubling horizon
+
+# Hedged Image Fetching (opt-in)
+# Race pesmaster and the efootballhub.net mirrors instead of trying them one
+# after another: the next source is requested once HEDGE_DELAY seconds pass
+# without an answer, the first valid image wins and the rest are cancelled.
+# The winning mirror is remembered per card in the skip list (see above).
+HEDGED_IMAGE_FETCH = False
+HEDGE_DELAY = 0.5  # Seconds before the next source is raced
+
+# Checkpointing (--resume)
+# Completed leagues/teams/players and discovered work are journaled here so
+# an interrupted run can be resumed.
+CHECKPOINT_PATH = "scrape_journal.jsonl"
+CHECKPOINT_FLUSH_INTERVAL = 10  # Seconds between journal flushes
+CHECKPOINT_FLUSH_RECORDS = 500  # Flush early once this many records are buffered
+
+# Player Index
+# The threads engine reads every team page before fetching any player and
+# writes player ID -> teams and leagues here, one page fetch per player.
+PLAYER_INDEX_PATH = "player_index.json"
+
+# Run Report
+# Per-stage counters, bytes and latency histograms (see metrics.py) are
+# written as JSON at the end of every run, and optionally as a Prometheus
+# text file (e.g. for the node exporter's textfile collector).
+RUN_REPORT_PATH = "run_report.json"
+PROMETHEUS_REPORT_PATH = None
+
+# Asyncio Engine (script.py --engine async)
+ASYNC_MAX_IN_FLIGHT = 200  # Global budget of concurrent HTTP requests
+ASYNC_LIMIT_PER_HOST = 100  # Concurrent connections per host
+
+# Event Background Cache
+# Downloaded event backgrounds are shared by all cards of an event and kept
+# in memory up to this many bytes (least recently used are evicted first).
+EVENT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Backgrounds trimmed and resized to the face size are cached per encode
+# worker, so trim/resize runs once per event instead of once per card.
+BACKGROUND_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Pipeline Engine (script.py --engine pipeline)
+# Worker threads per stage; stages are connected by bounded queues.
+PIPELINE_WORKERS = {
+    "leagues": 2,  # League pages -> team URLs
+    "teams": MAX_WORKERS_TEAMS,  # Team pages -> player URLs
+    "players": MAX_WORKERS_TEAMS * MAX_WORKERS_PLAYERS,  # Player pages -> cards
+    "images": MAX_WORKERS_TEAMS * MAX_WORKERS_PLAYERS * 2,  # Card images
+}
+PIPELINE_QUEUE_SIZE = 1000  # Max items waiting in front of each stage
+
+# DDS Encode Stage
+# ImageMagick encoding runs in its own worker pool (processes when the GIL is
+# enabled, threads on free-threaded builds), fed by a bounded queue.
+ENCODE_WORKERS = None  # Encode workers (None = CPU count)
+ENCODE_QUEUE_SIZE = None  # Max queued + running batches (None = 4 x workers)
+ENCODE_BATCH_SIZE = 16  # Cards encoded per worker call
+ENCODE_FLUSH_INTERVAL = 0.5  # Max seconds a card waits for its batch to fill
+# DDS encoder backend: "wand" (ImageMagick) or "numpy" (pure NumPy BC3
+# compressor with Pillow decoding, no native ImageMagick dependency; install
+# the `numpy` extra). Compare both with: python dds_encoder.py face.png
+DDS_ENCODER = "wand"
+# Size the encode pool from CPU utilisation (Linux): add workers while a CPU
+# is idle and batches are waiting, remove them while the CPUs are
+# oversubscribed. ENCODE_WORKERS is then the maximum.
+ENCODE_ADAPTIVE = True
+ENCODE_ADJUST_INTERVAL = 2.0  # Seconds between adjustments
+
 # Alternate National Team Offsets
 # Some national teams have alternate pages with different cards.
 # Enable this to fetch alternate versions by replacing the team ID with (id + offset).
@@ -46,19 +188,16 @@ MAX_RETRIES = 3  # Number of retries for failed requests
 RETRY_DELAY_BASE = 1  # Base delay for retries (exponential backoff)
 
 # Performance Notes:
-# - Increase worker counts if you have good bandwidth and CPU
-# - Increase delays if you get rate limited or blocked
-# - Decrease delays if the server can handle more load
+# - In-flight requests and encode workers adapt at runtime; worker counts
+#   and CONCURRENCY_LIMITS only cap them
+# - Lower RATE_LIMITS if you get rate limited or blocked
+# - Raise RATE_LIMITS if the server can handle more load
 # - Monitor CPU and memory usage when adjusting worker counts
 
 # Conservative settings (slower but safer):
-# MAX_WORKERS_TEAMS = 2
-# MAX_WORKERS_PLAYERS = 4
-# MAX_WORKERS_IMAGES = 3
-# REQUEST_DELAY = 0.2
+# MAX_WORKERS = 16
+# RATE_LIMITS["pages"] = (5.0, 5)
 
 # Aggressive settings (faster but may get rate limited):
-# MAX_WORKERS_TEAMS = 6
-# MAX_WORKERS_PLAYERS = 12
-# MAX_WORKERS_IMAGES = 10
-# REQUEST_DELAY = 0.05
+# MAX_WORKERS = 128
+# RATE_LIMITS["pages"] = (20.0, 20)
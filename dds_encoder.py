@@ -0,0 +1,376 @@
+"""
+Pure-NumPy DXT5 (BC3) encoder and DDS writer.
+
+Alternative to ImageMagick for the DDS encode stage (DDS_ENCODER = "numpy"
+in config.py). PNG decoding, trimming, resizing and compositing use Pillow;
+compression is vectorized over every 4x4 block of one or more images at
+once, so both variants of a card (or a whole batch of cards of the same
+size) are compressed in a single call.
+
+Like ImageMagick, a full mipmap chain is written for power-of-two sizes.
+
+Run this module with PNG files as arguments to compare its output against
+the ImageMagick backend:
+
+    python dds_encoder.py face1.png face2.png
+"""
+
+import io
+import struct
+import sys
+
+import numpy as np
+from PIL import Image
+
+DDS_MAGIC = b"DDS "
+DDSD_CAPS = 0x1
+DDSD_HEIGHT = 0x2
+DDSD_WIDTH = 0x4
+DDSD_PIXELFORMAT = 0x1000
+DDSD_MIPMAPCOUNT = 0x20000
+DDSD_LINEARSIZE = 0x80000
+DDPF_FOURCC = 0x4
+DDSCAPS_COMPLEX = 0x8
+DDSCAPS_TEXTURE = 0x1000
+DDSCAPS_MIPMAP = 0x400000
+
+# One compressed 4x4 block: alpha endpoints + 3-bit indices, colour
+# endpoints (RGB565) + 2-bit indices
+BLOCK_DTYPE = np.dtype(
+    [
+        ("a0", "u1"),
+        ("a1", "u1"),
+        ("alpha_indices", "u1", (6,)),
+        ("c0", "<u2"),
+        ("c1", "<u2"),
+        ("color_indices", "<u4"),
+    ]
+)
+
+# Alpha index codes for interpolation steps 0 (= a0) .. 7 (= a1)
+ALPHA_CODES = np.array([0, 2, 3, 4, 5, 6, 7, 1], dtype=np.uint64)
+
+
+def dds_header(width, height, mipmaps=1):
+    """Return the magic and 124-byte DDS header of a DXT5 texture"""
+    flags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PIXELFORMAT | DDSD_LINEARSIZE
+    caps = DDSCAPS_TEXTURE
+    if mipmaps > 1:
+        flags |= DDSD_MIPMAPCOUNT
+        caps |= DDSCAPS_COMPLEX | DDSCAPS_MIPMAP
+    linear_size = max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * 16
+    pixel_format = struct.pack("<II4s5I", 32, DDPF_FOURCC, b"DXT5", 0, 0, 0, 0, 0)
+    return (
+        DDS_MAGIC
+        + struct.pack("<7I", 124, flags, height, width, linear_size, 0, mipmaps)
+        + bytes(44)
+        + pixel_format
+        + struct.pack("<5I", caps, 0, 0, 0, 0)
+    )
+
+
+def mipmap_sizes(width, height):
+    """Return the (width, height) of every mip level ImageMagick would write"""
+    sizes = [(width, height)]
+    if width & (width - 1) or height & (height - 1):
+        return sizes
+    while width > 1 or height > 1:
+        width, height = max(1, width // 2), max(1, height // 2)
+        sizes.append((width, height))
+    return sizes
+
+
+def _split_blocks(pixels):
+    """(N, H, W, 4) uint8 -> (N, blocks, 16, 4), edge-padded to multiples of 4"""
+    pad_h, pad_w = -pixels.shape[1] % 4, -pixels.shape[2] % 4
+    if pad_h or pad_w:
+        pixels = np.pad(pixels, ((0, 0), (0, pad_h), (0, pad_w), (0, 0)), mode="edge")
+    count, height, width, _ = pixels.shape
+    blocks = pixels.reshape(count, height // 4, 4, width // 4, 4, 4)
+    blocks = blocks.transpose(0, 1, 3, 2, 4, 5)
+    return blocks.reshape(count, -1, 16, 4)
+
+
+def _to_565(color):
+    color = np.clip(np.rint(color), 0, 255)
+    r = np.rint(color[..., 0] * 31 / 255).astype(np.uint32)
+    g = np.rint(color[..., 1] * 63 / 255).astype(np.uint32)
+    b = np.rint(color[..., 2] * 31 / 255).astype(np.uint32)
+    return (r << 11) | (g << 5) | b
+
+
+def _from_565(value):
+    r = (value >> 11) & 0x1F
+    g = (value >> 5) & 0x3F
+    b = value & 0x1F
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], -1)
+
+
+def _encode_alpha(alpha, out):
+    alpha = alpha.astype(np.int32)
+    a0 = alpha.max(1)
+    a1 = alpha.min(1)
+    span = (a0 - a1)[:, None]
+
+    # Nearest of the 8 interpolated values, 0 = a0 .. 7 = a1
+    steps = ((a0[:, None] - alpha) * 7 + span // 2) // np.maximum(span, 1)
+    codes = ALPHA_CODES[steps]
+    bits = (codes << (np.arange(16, dtype=np.uint64) * 3)).sum(1, dtype=np.uint64)
+
+    out["a0"] = a0
+    out["a1"] = a1
+    out["alpha_indices"] = bits.astype("<u8").view(np.uint8).reshape(-1, 8)[:, :6]
+
+
+def _encode_color(rgb, out):
+    rgb = rgb.astype(np.float32)
+    mean = rgb.mean(1, keepdims=True)
+    centered = rgb - mean
+
+    # Principal axis of every block by power iteration on its covariance
+    covariance = np.einsum("npi,npj->nij", centered, centered)
+    axis = np.ones((len(rgb), 3), dtype=np.float32)
+    for _ in range(8):
+        axis = np.einsum("nij,nj->ni", covariance, axis)
+        norm = np.linalg.norm(axis, axis=1, keepdims=True)
+        axis = np.where(norm > 1e-6, axis / np.maximum(norm, 1e-6), 0)
+    projection = np.einsum("npi,ni->np", centered, axis)
+    high = mean[:, 0] + projection.max(1)[:, None] * axis
+    low = mean[:, 0] + projection.min(1)[:, None] * axis
+
+    c0 = _to_565(high)
+    c1 = _to_565(low)
+    # c0 > c1 selects the 4-colour mode
+    swap = c0 < c1
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+
+    e0 = _from_565(c0).astype(np.float32)
+    e1 = _from_565(c1).astype(np.float32)
+    palette = np.stack([e0, e1, (2 * e0 + e1) / 3, (e0 + 2 * e1) / 3], 1)
+    distance = ((rgb[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(-1)
+    indices = distance.argmin(-1).astype(np.uint32)
+    indices[c0 == c1] = 0
+    bits = (indices << (np.arange(16, dtype=np.uint32) * 2)).sum(1, dtype=np.uint32)
+
+    out["c0"] = c0
+    out["c1"] = c1
+    out["color_indices"] = bits
+
+
+def encode_bc3(pixels):
+    """
+    Compress RGBA images of the same size to BC3.
+
+    Args:
+        pixels: uint8 array of shape (H, W, 4) or (N, H, W, 4)
+
+    Returns:
+        bytes (single image) or list of bytes (batch)
+    """
+    single = pixels.ndim == 3
+    if single:
+        pixels = pixels[None]
+    blocks = _split_blocks(np.ascontiguousarray(pixels, dtype=np.uint8))
+    count, per_image = blocks.shape[:2]
+    blocks = blocks.reshape(-1, 16, 4)
+
+    out = np.empty(len(blocks), dtype=BLOCK_DTYPE)
+    _encode_alpha(blocks[:, :, 3], out)
+    _encode_color(blocks[:, :, :3], out)
+
+    data = out.reshape(count, per_image)
+    encoded = [image_blocks.tobytes() for image_blocks in data]
+    return encoded[0] if single else encoded
+
+
+def decode_bc3(data, width, height):
+    """Decompress one BC3 surface to an (H, W, 4) uint8 array"""
+    blocks_w, blocks_h = max(1, (width + 3) // 4), max(1, (height + 3) // 4)
+    blocks = np.frombuffer(data, dtype=BLOCK_DTYPE, count=blocks_w * blocks_h)
+
+    a0 = blocks["a0"].astype(np.int32)[:, None]
+    a1 = blocks["a1"].astype(np.int32)[:, None]
+    k7 = np.arange(1, 7)
+    k5 = np.arange(1, 5)
+    eight = np.concatenate([a0, a1, ((7 - k7) * a0 + k7 * a1) // 7], 1)
+    six = np.concatenate(
+        [a0, a1, ((5 - k5) * a0 + k5 * a1) // 5, 0 * a0, 0 * a0 + 255], 1
+    )
+    alpha_palette = np.where(a0 > a1, eight, six)
+    alpha_bits = np.zeros(len(blocks), dtype=np.uint64)
+    for i in range(6):
+        alpha_bits |= blocks["alpha_indices"][:, i].astype(np.uint64) << np.uint64(
+            8 * i
+        )
+    shifts = np.arange(16, dtype=np.uint64) * 3
+    alpha_indices = ((alpha_bits[:, None] >> shifts) & 7).astype(np.intp)
+    alpha = np.take_along_axis(alpha_palette, alpha_indices, 1)
+
+    c0 = blocks["c0"].astype(np.uint32)
+    c1 = blocks["c1"].astype(np.uint32)
+    e0 = _from_565(c0).astype(np.int32)
+    e1 = _from_565(c1).astype(np.int32)
+    four = np.stack([e0, e1, (2 * e0 + e1) // 3, (e0 + 2 * e1) // 3], 1)
+    three = np.stack([e0, e1, (e0 + e1) // 2, np.zeros_like(e0)], 1)
+    color_palette = np.where((c0 > c1)[:, None, None], four, three)
+    shifts = np.arange(16, dtype=np.uint32) * 2
+    color_indices = (blocks["color_indices"][:, None] >> shifts) & 3
+    rgb = np.take_along_axis(
+        color_palette, color_indices[:, :, None].astype(np.intp), 1
+    )
+
+    pixels = np.concatenate([rgb, alpha[:, :, None]], -1).astype(np.uint8)
+    pixels = pixels.reshape(blocks_h, blocks_w, 4, 4, 4).transpose(0, 2, 1, 3, 4)
+    return pixels.reshape(blocks_h * 4, blocks_w * 4, 4)[:height, :width]
+
+
+def read_dds(data):
+    """Decode the top mip level of a DXT5 DDS file to an (H, W, 4) array"""
+    if data[:4] != DDS_MAGIC or data[84:88] != b"DXT5":
+        raise ValueError("Not a DXT5 DDS file")
+    height, width = struct.unpack_from("<II", data, 12)
+    return decode_bc3(data[128:], width, height)
+
+
+def trim(img, percent_background=0.5):
+    """
+    Remove a solid border, using the top left pixel as the border colour.
+
+    Approximates ImageMagick's trim with trim:percent-background: edges are
+    removed one row or column at a time while at least
+    (1 - percent_background) of the edge is border colour.
+    """
+    pixels = np.asarray(img)
+    border = np.all(pixels == pixels[0, 0], axis=-1)
+    if border.all():
+        return img
+    threshold = 1 - percent_background
+    top, bottom, left, right = 0, border.shape[0], 0, border.shape[1]
+    while bottom - top > 1 and right - left > 1:
+        area = border[top:bottom, left:right]
+        shares = (
+            area[0].mean(),
+            area[-1].mean(),
+            area[:, 0].mean(),
+            area[:, -1].mean(),
+        )
+        edge = max(range(4), key=shares.__getitem__)
+        if shares[edge] < threshold:
+            break
+        if edge == 0:
+            top += 1
+        elif edge == 1:
+            bottom -= 1
+        elif edge == 2:
+            left += 1
+        else:
+            right -= 1
+    return img.crop((left, top, right, bottom))
+
+
+class NumpyBackend:
+    """NumPy/Pillow implementation of the image operations in get_miniface"""
+
+    name = "numpy"
+
+    @staticmethod
+    def decode(blob):
+        with Image.open(io.BytesIO(blob)) as img:
+            return img.convert("RGBA")
+
+    @staticmethod
+    def size(img):
+        return img.size
+
+    @staticmethod
+    def prepare_background(blob, width, height):
+        with NumpyBackend.decode(blob) as back_img:
+            trimmed = trim(back_img, percent_background=0.5)
+            return trimmed.resize((width, height), Image.Resampling.LANCZOS)
+
+    @staticmethod
+    def composite(back_img, fore_img):
+        return Image.alpha_composite(back_img, fore_img)
+
+    @staticmethod
+    def clone(img):
+        return img.copy()
+
+    @staticmethod
+    def close(img):
+        img.close()
+
+    @staticmethod
+    def encode_dds(images):
+        """
+        Encode images to DDS files, batching images of the same size.
+
+        Returns:
+            list: DDS file bytes per image
+        """
+        results = [None] * len(images)
+        groups = {}
+        for i, img in enumerate(images):
+            groups.setdefault(img.size, []).append(i)
+
+        for (width, height), members in groups.items():
+            levels = mipmap_sizes(width, height)
+            chunks = [[dds_header(width, height, len(levels))] for _ in members]
+            for level_size in levels:
+                batch = np.stack(
+                    [
+                        np.asarray(
+                            images[i]
+                            if level_size == (width, height)
+                            else images[i].resize(level_size, Image.Resampling.BILINEAR)
+                        )
+                        for i in members
+                    ]
+                )
+                for chunk, data in zip(chunks, encode_bc3(batch)):
+                    chunk.append(data)
+            for i, chunk in zip(members, chunks):
+                results[i] = b"".join(chunk)
+        return results
+
+
+def psnr(a, b):
+    """Peak signal-to-noise ratio of two uint8 arrays in dB"""
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255**2 / mse)
+
+
+def main():
+    """Compare this encoder with ImageMagick on the given PNG files"""
+    if len(sys.argv) < 2:
+        print(f"Usage: python {sys.argv[0]} image.png [...]")
+        sys.exit(1)
+
+    try:
+        from get_miniface import WandBackend, image as wand_image
+    except ImportError:
+        wand_image = None
+
+    print(f"{'file':40} {'numpy':>8} {'magick':>8} {'diff':>8}  (PSNR dB)")
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            blob = f.read()
+        img = NumpyBackend.decode(blob)
+        source = np.asarray(img)
+        ours = read_dds(NumpyBackend.encode_dds([img])[0])
+        line = f"{path[-40:]:40} {psnr(source, ours):8.2f}"
+
+        if wand_image is not None:
+            magick_img = WandBackend.decode(blob)
+            try:
+                theirs = read_dds(WandBackend.encode_dds([magick_img])[0])
+            finally:
+                WandBackend.close(magick_img)
+            line += f" {psnr(source, theirs):8.2f} {psnr(ours, theirs):8.2f}"
+        else:
+            line += f" {'n/a':>8} {'n/a':>8}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+League -> team -> player discovery shared by the crawl engines.
+
+The threads engine (script.py), async_engine.py and pipeline_engine.py all
+turn a league into its teams and a team into its players the same way:
+replay the lists recorded in the checkpoint journal by an interrupted run,
+or else scrape them, add the alternate national team URLs, keep only this
+shard's teams and record the result. They also mark work done by the same
+rules: a team once it listed players and all of them succeeded, a league
+once every team recorded for it is done.
+
+Fetching stays with the engines (the async engine fetches on its event
+loop), so each step is split around the fetch:
+
+    teams_urls = recorded_teams(league_url)
+    if teams_urls is None:
+        teams_urls = record_teams(league_url, league_name, scraped_urls, ...)
+    teams_urls = outstanding_teams(league_name, teams_urls)
+
+(The threads engine keeps the completed teams too, so its player index
+covers the whole league.)
+"""
+
+import os
+import sys
+
+import checkpoint
+from sharding import filter_shard
+from teams import generate_alternate_team_urls
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def log_debug(message):
+    """Print debug messages only if in debug mode"""
+    if os.getenv("DEBUG") or globals().get("DEBUG", False):
+        print(f"[DEBUG] {message}")
+
+
+def is_done(kind, key):
+    """Check the journal for a league/team/player completed by an earlier run"""
+    journal = checkpoint.active_journal
+    return journal is not None and journal.is_done(kind, key)
+
+
+def mark_done(kind, key):
+    """Record a completed league/team/player, if a journal is active"""
+    if checkpoint.active_journal is not None:
+        checkpoint.active_journal.mark_done(kind, key)
+
+
+def outstanding_teams(league_name, teams_urls):
+    """Drop the teams completed by an earlier run"""
+    teams_urls = [url for url in teams_urls if not is_done("team", url)]
+    log_debug(f"{len(teams_urls)} teams outstanding in {league_name}")
+    return teams_urls
+
+
+def recorded_teams(league_url):
+    """
+    Return the teams of a league recorded by an interrupted run, or None if
+    the league still has to be scraped
+    """
+    journal = checkpoint.active_journal
+    return journal.queued_items(league_url) if journal is not None else None
+
+
+def record_teams(
+    league_url, league_name, teams_urls, alternate_offsets=None, shard=None
+):
+    """
+    Turn the team URLs scraped from a league page into the league's teams.
+
+    Alternate national team URLs are added for national leagues, only this
+    shard's teams are kept (stable hash on the team URL) and the list is
+    recorded in the journal.
+
+    Args:
+        teams_urls: Team URLs listed on the league page
+        alternate_offsets: Team ID offsets of alternate national teams
+        shard: (index, count) tuple from sharding.parse_shard, or None
+
+    Returns:
+        list: The league's team URLs, or None if the page listed no teams
+    """
+    if not teams_urls:
+        log_error(f"No teams found for league {league_name}")
+        return None
+
+    teams_urls = list(teams_urls)
+    if "National" in league_name and alternate_offsets:
+        alternate_urls = []
+        for team_url in teams_urls:
+            alternate_urls.extend(
+                generate_alternate_team_urls(team_url, alternate_offsets)
+            )
+        if alternate_urls:
+            log_debug(f"Generated {len(alternate_urls)} alternate national team URLs")
+            teams_urls.extend(alternate_urls)
+
+    teams_urls = filter_shard(teams_urls, shard)
+    if checkpoint.active_journal is not None:
+        checkpoint.active_journal.queue(league_url, teams_urls)
+    return teams_urls
+
+
+def recorded_players(team_url):
+    """Return the players of a team recorded by an interrupted run, or None"""
+    journal = checkpoint.active_journal
+    return journal.queued_items(team_url) if journal is not None else None
+
+
+def record_players(team_url, players_urls):
+    """Record the player URLs scraped from a team page and return them"""
+    if players_urls and checkpoint.active_journal is not None:
+        checkpoint.active_journal.queue(team_url, players_urls)
+    return players_urls
+
+
+def finish_team(team_url, ok):
+    """
+    Mark a team done if it listed players and every one of them succeeded.
+
+    Args:
+        ok: True if the team had players and all of them were processed
+    """
+    if ok:
+        mark_done("team", team_url)
+
+
+def finish_league(league_url):
+    """
+    Mark a league done once every team recorded for it is done.
+
+    Returns:
+        bool: True if the league is done
+    """
+    journal = checkpoint.active_journal
+    if journal is None:
+        return False
+    teams_urls = journal.queued_items(league_url)
+    if teams_urls is None or not all(
+        journal.is_done("team", team_url) for team_url in teams_urls
+    ):
+        return False
+    journal.mark_done("league", league_url)
+    return True
@@ -0,0 +1,375 @@
+"""
+Decoupled DDS encoding stage.
+
+Download threads hand downloaded PNG bytes to the encode stage instead of
+running ImageMagick themselves. Jobs go through a bounded queue to a pool
+of CPU-count workers: a ProcessPoolExecutor on GIL builds, or a thread pool
+when the GIL is disabled (free-threaded Python runs Wand in parallel without
+the pickling overhead). Every output file is written atomically by its
+worker, so no global lock is needed.
+
+Small images are cheap to encode compared to the per-call overhead, so jobs
+can be submitted through a Batcher, which groups them into chunks of
+ENCODE_BATCH_SIZE handled by a single worker call. A partial chunk is sent
+once its oldest job has waited ENCODE_FLUSH_INTERVAL seconds.
+
+Worker processes record stage metrics (decode, composite, encode, write)
+into their own copy of metrics.run_metrics; it is drained after every job
+and merged into the parent's when the result comes back.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from metrics import run_metrics
+
+# Import configuration with fallbacks
+try:
+    from config import (
+        GIL_ENABLED,
+        ENCODE_WORKERS,
+        ENCODE_QUEUE_SIZE,
+        ENCODE_BATCH_SIZE,
+        ENCODE_FLUSH_INTERVAL,
+        ENCODE_ADAPTIVE,
+        ENCODE_ADJUST_INTERVAL,
+    )
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    GIL_ENABLED = True
+    ENCODE_WORKERS = None
+    ENCODE_QUEUE_SIZE = None
+    ENCODE_BATCH_SIZE = 16
+    ENCODE_FLUSH_INTERVAL = 0.5
+    ENCODE_ADAPTIVE = True
+    ENCODE_ADJUST_INTERVAL = 2.0
+
+_stage = None
+_batchers = {}
+_stage_lock = threading.Lock()
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def _init_worker():
+    # Forked workers inherit the parent's counters; only ship their own
+    run_metrics.drain()
+
+
+def _run_measured(fn, *args):
+    """Run fn in a worker process and return its result with the metrics it recorded"""
+    result = fn(*args)
+    return result, run_metrics.drain()
+
+
+def _resolve(inner, outer, measured):
+    """Resolve the caller's future from a pool future (merging process metrics)"""
+    try:
+        result = inner.result()
+    except BaseException as e:
+        outer.set_exception(e)
+        return
+    if measured:
+        result, stages = result
+        run_metrics.merge(stages)
+    outer.set_result(result)
+
+
+def read_cpu_times():
+    """Return (idle, total) jiffies of all CPUs from /proc/stat (Linux only)"""
+    with open("/proc/stat", "r", encoding="ascii") as f:
+        values = [int(value) for value in f.readline().split()[1:9]]
+    # idle + iowait
+    return values[3] + values[4], sum(values)
+
+
+def read_runnable():
+    """Return the number of runnable tasks from /proc/loadavg (Linux only)"""
+    with open("/proc/loadavg", "r", encoding="ascii") as f:
+        return int(f.read().split()[3].split("/")[0])
+
+
+class EncodeStage:
+    """
+    Bounded queue in front of a pool of encode workers.
+
+    The pool has one worker per CPU, but only `limit` jobs are handed to it
+    at a time. With ENCODE_ADAPTIVE, the limit follows the CPU utilisation:
+    a worker is added while jobs are waiting and at least one CPU is idle,
+    and one is removed while more tasks are runnable than there are CPUs
+    (the crawler threads are starved). This needs /proc (Linux); elsewhere
+    the limit stays at the pool size.
+    """
+
+    def __init__(
+        self, workers=None, queue_size=None, use_processes=None, adaptive=None
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 4
+        self.use_processes = GIL_ENABLED if use_processes is None else use_processes
+        self.cpus = os.cpu_count() or 1
+
+        # Counts queued plus running jobs; submit blocks once it is exhausted
+        self.slots = threading.BoundedSemaphore(self.queue_size)
+        if self.use_processes:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker
+            )
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="encode"
+            )
+
+        # Jobs waiting for a worker, and jobs handed to the pool
+        self.lock = threading.Condition()
+        self.pending = deque()
+        self.running = 0
+        self.limit = self.workers
+
+        self.stopped = threading.Event()
+        self.tuner = None
+        if ENCODE_ADAPTIVE if adaptive is None else adaptive:
+            try:
+                read_cpu_times()
+                read_runnable()
+            except (OSError, ValueError, IndexError):
+                pass
+            else:
+                self.tuner = threading.Thread(
+                    target=self._tune, name="encode-tuner", daemon=True
+                )
+                self.tuner.start()
+
+    def submit(self, fn, *args, callback=None):
+        """
+        Queue fn(*args) on an encode worker, blocking while the queue is full.
+
+        Args:
+            fn: Picklable top-level function
+            callback: Optional function called with the finished future
+
+        Returns:
+            concurrent.futures.Future
+        """
+        self.slots.acquire()
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        with self.lock:
+            self.pending.append((fn, args, future))
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        """Hand waiting jobs to the pool up to the current limit"""
+        with self.lock:
+            jobs = []
+            while self.pending and self.running < self.limit:
+                jobs.append(self.pending.popleft())
+                self.running += 1
+        for fn, args, future in jobs:
+            try:
+                if self.use_processes:
+                    inner = self.executor.submit(_run_measured, fn, *args)
+                else:
+                    inner = self.executor.submit(fn, *args)
+            except BaseException as e:
+                self._finished()
+                future.set_exception(e)
+                continue
+            inner.add_done_callback(
+                lambda inner, future=future: self._done(inner, future)
+            )
+
+    def _finished(self):
+        with self.lock:
+            self.running -= 1
+            self.lock.notify_all()
+        self.slots.release()
+
+    def _done(self, inner, future):
+        self._finished()
+        # Keep the workers busy before running the caller's callbacks
+        self._dispatch()
+        _resolve(inner, future, self.use_processes)
+
+    def _tune(self):
+        idle, total = read_cpu_times()
+        while not self.stopped.wait(ENCODE_ADJUST_INTERVAL):
+            # Average a few instantaneous readings; the count includes us
+            runnable = read_runnable() - 1
+            for _ in range(3):
+                if self.stopped.wait(ENCODE_ADJUST_INTERVAL / 4):
+                    return
+                runnable += read_runnable() - 1
+            runnable /= 4
+
+            new_idle, new_total = read_cpu_times()
+            idle_share = (new_idle - idle) / max(new_total - total, 1)
+            idle, total = new_idle, new_total
+
+            with self.lock:
+                if self.pending and idle_share * self.cpus >= 1:
+                    self.limit = min(self.limit + 1, self.workers)
+                elif runnable > self.cpus and self.limit > 1:
+                    self.limit -= 1
+            self._dispatch()
+
+    def shutdown(self, wait=True):
+        """Wait for queued jobs (if wait) and stop the workers"""
+        with self.lock:
+            if wait:
+                while self.pending or self.running:
+                    self.lock.wait()
+            else:
+                cancelled, self.pending = self.pending, deque()
+        self.stopped.set()
+        if not wait:
+            for _, _, future in cancelled:
+                future.cancel()
+                self.slots.release()
+        self.executor.shutdown(wait=wait)
+
+
+class Batcher:
+    """Groups submitted items into chunks handled by one encode worker call"""
+
+    def __init__(self, stage, batch_fn, batch_size, flush_interval):
+        """
+        Args:
+            stage: EncodeStage running the chunks
+            batch_fn: Picklable top-level function taking a list of items and
+                returning a list with one result per item
+            batch_size: Items per chunk
+            flush_interval: Max seconds an item waits for its chunk to fill
+        """
+        self.stage = stage
+        self.batch_fn = batch_fn
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = []
+        self.oldest = None
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(
+            target=self._flush_periodically, name="encode-batcher", daemon=True
+        )
+        self.flusher.start()
+
+    def submit(self, item, callback=None):
+        """
+        Add an item to the current chunk; blocks while the encode queue is full.
+
+        Returns:
+            concurrent.futures.Future: Resolved with the result of this item
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        with self.lock:
+            if not self.pending:
+                self.oldest = time.monotonic()
+            self.pending.append((item, future))
+            chunk = self._take() if len(self.pending) >= self.batch_size else None
+        if chunk:
+            self._dispatch(chunk)
+        return future
+
+    def _take(self):
+        chunk, self.pending = self.pending, []
+        return chunk
+
+    def _dispatch(self, chunk):
+        items = [item for item, _ in chunk]
+        futures = [future for _, future in chunk]
+        try:
+            batch_future = self.stage.submit(self.batch_fn, items)
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        def resolve(batch_future):
+            try:
+                results = batch_future.result()
+            except BaseException as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+        batch_future.add_done_callback(resolve)
+
+    def flush(self):
+        """Send the current partial chunk"""
+        with self.lock:
+            chunk = self._take()
+        if chunk:
+            self._dispatch(chunk)
+
+    def _flush_periodically(self):
+        while not self.stopped.wait(self.flush_interval / 2):
+            with self.lock:
+                due = (
+                    self.pending
+                    and time.monotonic() - self.oldest >= self.flush_interval
+                )
+                chunk = self._take() if due else None
+            if chunk:
+                self._dispatch(chunk)
+
+    def close(self):
+        """Stop the flush thread and send what is left"""
+        self.stopped.set()
+        self.flusher.join()
+        self.flush()
+
+
+def get_encode_stage():
+    """Return the process-wide encode stage, creating it on first use"""
+    global _stage
+    if _stage is None:
+        with _stage_lock:
+            if _stage is None:
+                _stage = EncodeStage(ENCODE_WORKERS, ENCODE_QUEUE_SIZE)
+    return _stage
+
+
+def submit_batched(batch_fn, item, callback=None):
+    """
+    Queue an item for batch_fn on the encode stage, batched with other items.
+
+    Returns:
+        concurrent.futures.Future: Resolved with the result of this item
+    """
+    batcher = _batchers.get(batch_fn)
+    if batcher is None:
+        stage = get_encode_stage()
+        with _stage_lock:
+            batcher = _batchers.get(batch_fn)
+            if batcher is None:
+                batcher = _batchers[batch_fn] = Batcher(
+                    stage, batch_fn, ENCODE_BATCH_SIZE, ENCODE_FLUSH_INTERVAL
+                )
+    return batcher.submit(item, callback=callback)
+
+
+def shutdown_encode_stage(wait=True):
+    """Flush pending batches, then drain and stop the encode stage if started"""
+    global _stage
+    with _stage_lock:
+        batchers = list(_batchers.values())
+        _batchers.clear()
+        stage, _stage = _stage, None
+    for batcher in batchers:
+        batcher.close()
+    if stage is not None:
+        stage.shutdown(wait=wait)
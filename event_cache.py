@@ -0,0 +1,130 @@
+"""
+Bounded in-memory cache of card event backgrounds.
+
+Thousands of cards share a few hundred event backgrounds, so every
+background PNG is downloaded once and kept in an LRU cache capped by total
+size. Lookups are O(1). Concurrent requests for an event that is still
+downloading wait for that single download instead of starting their own.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Import configuration with fallbacks
+try:
+    from config import EVENT_CACHE_MAX_BYTES
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    EVENT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class EventCache:
+    """Thread-safe, size-bounded LRU cache with single-flight loading"""
+
+    def __init__(self, max_bytes=EVENT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def lookup(self, name):
+        """Return the cached bytes of an event, or None (counts a hit or miss)"""
+        with self.lock:
+            data = self.entries.get(name)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(name)
+            self.hits += 1
+            return data
+
+    def store(self, name, data):
+        """Cache the bytes of an event, evicting least recently used entries"""
+        if not data or len(data) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(name, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[name] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def get(self, name, loader):
+        """
+        Return the bytes of an event, calling loader() on a miss.
+
+        Only one thread runs the loader for a given event; the others wait for
+        its result. Failed downloads (falsy results) are shared with waiting
+        threads but not cached.
+        """
+        with self.lock:
+            data = self.entries.get(name)
+            if data is not None:
+                self.entries.move_to_end(name)
+                self.hits += 1
+                return data
+            future = self.loading.get(name)
+            if future is not None:
+                self.waits += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = self.loading[name] = Future()
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            data = loader()
+        except BaseException as e:
+            with self.lock:
+                del self.loading[name]
+            future.set_exception(e)
+            raise
+
+        self.store(name, data)
+        with self.lock:
+            del self.loading[name]
+        future.set_result(data)
+        return data
+
+    def count_wait(self):
+        """Count a request deduplicated against an in-flight download"""
+        with self.lock:
+            self.waits += 1
+
+    def stats(self):
+        """Return cache counters"""
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "evictions": self.evictions,
+            }
+
+    def format_stats(self):
+        """Return the counters as a printable line"""
+        stats = self.stats()
+        return (
+            f"{stats['entries']} events ({stats['bytes'] / 1048576:.1f} MiB), "
+            f"{stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['waits']} deduplicated, {stats['evictions']} evictions"
+        )
+
+
+# Cache shared by every download thread
+events = EventCache()
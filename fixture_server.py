@@ -0,0 +1,489 @@
+"""
+Local stand-in for pesmaster.com and efootballhub.net used by benchmark.py.
+
+Requests are served under a host prefix (http://127.0.0.1:PORT/<host>/<path>)
+so one server stands in for every site the scrapers talk to; the scrapers
+are pointed at it with MINIFACE_URL_REWRITE (see rewrite_rules()).
+
+Pages and images come from one of two sources:
+
+- Recorded fixtures: a directory laid out as <host>/<path>, with
+  index.html for paths ending in "/". With --record, missing files are
+  fetched from the real site once and saved, so a recorded run can be
+  replayed offline afterwards.
+- A synthetic site (default) with the same markup as the real pages: an
+  index of leagues, league pages, team pages, player pages with cards, the
+  featured players page, and generated PNG faces and event backgrounds.
+
+Every response can be delayed (--latency/--jitter) and a fraction of them
+replaced by a 503 (--error-rate). ETags are sent and If-None-Match is
+honoured, so the HTTP cache revalidates as against the real site.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Hosts the scrapers fetch from
+HOSTS = ("www.pesmaster.com", "efootballhub.net")
+
+# Team page links encode player IDs with this offset (the scrapers keep the
+# last 5 hex digits); featured page links use the 6 digit variant
+TEAM_LINK_OFFSET = 0x100000
+FEATURED_LINK_OFFSET = 0x1000000
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def rewrite_rules(base_url):
+    """Return the MINIFACE_URL_REWRITE value pointing every host at base_url"""
+    return ",".join(f"https://{host}={base_url}/{host}" for host in HOSTS)
+
+
+def make_png(width, height, row):
+    """
+    Encode an RGBA image as PNG without any imaging library.
+
+    Args:
+        row: Function y -> bytes of the width RGBA pixels of row y
+    """
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)  # No filter
+        rows.extend(row(y))
+
+    def chunk(kind, data):
+        body = kind + data
+        return (
+            struct.pack(">I", len(data))
+            + body
+            + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(bytes(rows), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+class SyntheticSite:
+    """Generates pesmaster-like pages and images for a fixed-size game"""
+
+    def __init__(
+        self, leagues=2, teams=4, players=10, cards=2, events=8, size=128, seed=0
+    ):
+        self.leagues = leagues
+        self.teams = teams
+        self.players = players
+        self.cards = cards
+        self.events = events
+        self.size = size
+        self.seed = seed
+        self.images = {}
+        self.images_lock = threading.Lock()
+
+    # IDs -----------------------------------------------------------------
+
+    def team_id(self, league, team):
+        return 1000 + league * self.teams + team
+
+    def team_players(self, team_id):
+        first = 10000 + (team_id - 1000) * self.players
+        return range(first, first + self.players)
+
+    def all_players(self):
+        for league in range(self.leagues):
+            for team in range(self.teams):
+                yield from self.team_players(self.team_id(league, team))
+
+    # Pages ---------------------------------------------------------------
+
+    def index_page(self):
+        leagues = "".join(
+            f'<div class="team-block"><a href="efootball-2022/league/{league}/">'
+            f'<span class="team-block-name">League {league}</span></a></div>'
+            for league in range(self.leagues)
+        )
+        return (
+            '<!DOCTYPE html><html><body><div class="team-block-container"></div>'
+            f'<div class="team-block-container">{leagues}</div></body></html>'
+        )
+
+    def league_page(self, league):
+        teams = "".join(
+            f'<div class="team-block"><a href="efootball-2022/team/{self.team_id(league, team)}/">'
+            f"Team {self.team_id(league, team)}</a></div>"
+            for team in range(self.teams)
+        )
+        return (
+            '<!DOCTYPE html><html><body><div class="team-block-container">'
+            f"{teams}</div></body></html>"
+        )
+
+    def team_page(self, team_id):
+        links = "".join(
+            f'<a href="/efootball-2022/player/{TEAM_LINK_OFFSET + player_id}/">{player_id}</a>'
+            for player_id in self.team_players(team_id)
+        )
+        containers = '<div class="player-card-container"></div>' * 4
+        return (
+            f"<!DOCTYPE html><html><body>{containers}"
+            f'<div class="player-card-container">{links}</div></body></html>'
+        )
+
+    def card(self, player_id, card, link=""):
+        team_id = 1000 + (player_id - 10000) // self.players
+        event = (player_id + card) % self.events
+        return (
+            f'<figure class="player-card efootball-2022">{link}'
+            f'<img data-src="/efootball-2022/graphics/teamlogos/e_{team_id}.png">'
+            f'<img data-src="/efootball-2022/graphics/players/Variation2022/ev{event}_b02.png">'
+            f'<img data-src="/efootball-2022/graphics/players/Variation2022/{player_id}{card:02d}_.png">'
+            "</figure>"
+        )
+
+    def player_page(self, player_id):
+        cards = "".join(self.card(player_id, card) for card in range(self.cards))
+        return (
+            '<!DOCTYPE html><html><body><div class="player-card-container">'
+            f"{cards}</div></body></html>"
+        )
+
+    def featured_page(self, count=20):
+        cards = "".join(
+            self.card(
+                player_id,
+                0,
+                f'<a href="/efootball-2022/player/{FEATURED_LINK_OFFSET + player_id}/"></a>',
+            )
+            for player_id, _ in zip(self.all_players(), range(count))
+        )
+        return (
+            '<!DOCTYPE html><html><body><div class="player-card-container">'
+            f"{cards}</div></body></html>"
+        )
+
+    # Images --------------------------------------------------------------
+
+    def face(self, name):
+        rng = random.Random(f"{self.seed}:{name}")
+        color = bytes(rng.randrange(256) for _ in range(3)) + b"\xff"
+        clear = b"\x00" * 4
+        half = self.size / 2
+
+        def row(y):
+            # Opaque disk on a transparent square
+            span = max(half**2 - (y + 0.5 - half) ** 2, 0) ** 0.5
+            start, end = round(half - span), round(half + span)
+            return clear * start + color * (end - start) + clear * (self.size - end)
+
+        return make_png(self.size, self.size, row)
+
+    def background(self, name):
+        rng = random.Random(f"{self.seed}:{name}")
+        red, green = rng.randrange(256), rng.randrange(256)
+        black = b"\x00\x00\x00\xff"
+        border = self.size // 16
+
+        def row(y):
+            # Vertical gradient inside a black frame (trimmed by the renderer)
+            if y < border or y >= self.size - border:
+                return black * self.size
+            fill = bytes((red, green, y * 255 // self.size, 255))
+            return black * border + fill * (self.size - 2 * border) + black * border
+
+        return make_png(self.size, self.size, row)
+
+    def image(self, name):
+        with self.images_lock:
+            data = self.images.get(name)
+        if data is None:
+            data = self.background(name) if "_b02" in name else self.face(name)
+            with self.images_lock:
+                self.images[name] = data
+        return data
+
+    # Routing -------------------------------------------------------------
+
+    def lookup(self, host, path):
+        """Return (content_type, body) for a path, or None for a 404"""
+        if host != "www.pesmaster.com":
+            # Mirrors only matter when pesmaster is missing an image
+            return None
+        parts = [part for part in path.split("/") if part]
+        if parts[:1] != ["efootball-2022"]:
+            return None
+        parts = parts[1:]
+        try:
+            if not parts:
+                return "text/html", self.index_page().encode()
+            if parts[0] == "league" and int(parts[1]) < self.leagues:
+                return "text/html", self.league_page(int(parts[1])).encode()
+            if parts[0] == "team":
+                return "text/html", self.team_page(int(parts[1])).encode()
+            if parts[0] == "player" and parts[1] == "featured":
+                return "text/html", self.featured_page().encode()
+            if parts[0] == "player":
+                return "text/html", self.player_page(int(parts[1])).encode()
+            if parts[0] == "graphics" and parts[-1].endswith(".png"):
+                return "image/png", self.image(parts[-1])
+        except (IndexError, ValueError):
+            pass
+        return None
+
+
+class FixtureDirectory:
+    """Serves recorded responses from disk, optionally recording new ones"""
+
+    def __init__(self, root, record=False):
+        self.root = root
+        self.record = record
+
+    def path_for(self, host, path):
+        relative = path.lstrip("/")
+        if not relative or relative.endswith("/"):
+            relative += "index.html"
+        root = os.path.abspath(self.root)
+        full = os.path.abspath(os.path.join(root, host, relative))
+        if not full.startswith(root + os.sep):
+            return None
+        return full
+
+    def lookup(self, host, path):
+        full = self.path_for(host, path)
+        if full is None:
+            return None
+        content_type = "image/png" if full.endswith(".png") else "text/html"
+        try:
+            with open(full, "rb") as f:
+                return content_type, f.read()
+        except FileNotFoundError:
+            if not self.record:
+                return None
+        return self.fetch(host, path, full, content_type)
+
+    def fetch(self, host, path, full, content_type):
+        import http_client
+
+        try:
+            r = http_client.get(f"https://{host}{path}", retries=1)
+        except Exception as e:
+            log_error(f"Recording {host}{path} failed: {e}")
+            return None
+        if r.status_code != 200:
+            return None
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "wb") as f:
+            f.write(r.content)
+        return content_type, r.content
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Routes /<host>/<path> to the server's source"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.count("requests")
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if server.error_rate and random.random() < server.error_rate:
+            server.count("errors")
+            self.respond(503, b"", "text/plain", {"Retry-After": "0"})
+            return
+
+        host, _, path = self.path.lstrip("/").partition("/")
+        found = server.source.lookup(host, "/" + path.split("?")[0])
+        if found is None:
+            server.count("not_found")
+            self.respond(404, b"<!DOCTYPE html><html>Not found</html>", "text/html")
+            return
+
+        content_type, body = found
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            server.count("not_modified")
+            self.respond(304, b"", content_type, {"ETag": etag})
+            return
+        self.respond(200, body, content_type, {"ETag": etag})
+
+    def respond(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if status != 304:
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client cancelled the request (e.g. a lost hedged fetch)
+                self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, source, latency=0.0, jitter=0.0, error_rate=0.0):
+        super().__init__(address, FixtureHandler)
+        self.source = source
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.counters = {"requests": 0, "errors": 0, "not_found": 0, "not_modified": 0}
+        self.counters_lock = threading.Lock()
+
+    def count(self, name):
+        with self.counters_lock:
+            self.counters[name] += 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(source, port=0, latency=0.0, jitter=0.0, error_rate=0.0):
+    """Serve source on a background thread and return the FixtureServer"""
+    server = FixtureServer(
+        ("127.0.0.1", port),
+        source,
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+    )
+    threading.Thread(
+        target=server.serve_forever, name="fixture-server", daemon=True
+    ).start()
+    return server
+
+
+def add_server_arguments(parser):
+    """Add the fixture source and fault injection options to a parser"""
+    parser.add_argument(
+        "--fixtures",
+        help="Serve recorded fixtures from this directory instead of a synthetic site",
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Fetch fixtures missing from --fixtures from the real sites and save them",
+    )
+    parser.add_argument(
+        "--leagues", type=int, default=2, help="Synthetic site: leagues (default: 2)"
+    )
+    parser.add_argument(
+        "--teams",
+        type=int,
+        default=4,
+        help="Synthetic site: teams per league (default: 4)",
+    )
+    parser.add_argument(
+        "--players",
+        type=int,
+        default=10,
+        help="Synthetic site: players per team (default: 10)",
+    )
+    parser.add_argument(
+        "--cards",
+        type=int,
+        default=2,
+        help="Synthetic site: cards per player (default: 2)",
+    )
+    parser.add_argument(
+        "--events",
+        type=int,
+        default=8,
+        help="Synthetic site: distinct event backgrounds (default: 8)",
+    )
+    parser.add_argument(
+        "--image-size",
+        type=int,
+        default=128,
+        help="Synthetic site: image width and height (default: 128)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds added to every response (default: 0)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Random +/- seconds added to the latency (default: 0)",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with a 503 (default: 0)",
+    )
+
+
+def source_from_arguments(args):
+    """Build the fixture source selected by add_server_arguments options"""
+    if args.fixtures:
+        return FixtureDirectory(args.fixtures, record=args.record)
+    return SyntheticSite(
+        args.leagues, args.teams, args.players, args.cards, args.events, args.image_size
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local pesmaster stand-in serving recorded or synthetic pages",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python fixture_server.py --port 8901 --latency 0.05 --jitter 0.02
+  python fixture_server.py --fixtures fixtures --record
+  MINIFACE_URL_REWRITE=<printed rules> python script.py
+        """,
+    )
+    parser.add_argument(
+        "--port", type=int, default=8901, help="Port to listen on (default: 8901)"
+    )
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(
+        source_from_arguments(args),
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+    )
+    print(f"Serving on {server.base_url}")
+    print(f"MINIFACE_URL_REWRITE={rewrite_rules(server.base_url)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Requests: {server.counters}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,58 @@
 from check_acl import checkACLID
 import os
 import requests
+import http_client
+import atomic_file
 import threading
 import sys
-from concurrent.futures import ThreadPoolExecutor
-from bs4 import BeautifulSoup as bs
-from wand import image
 import time
-
-# Thread-safe storage for downloaded events
-downloaded_events_lock = threading.Lock()
-downloaded_events = {"names": [], "bytes": []}
-
-# Thread-safe locks for directory and file operations
-directory_creation_lock = threading.Lock()
-file_save_lock = threading.Lock()
-
-# Configuration for image downloads
-MAX_IMAGE_WORKERS = 4
-IMAGE_REQUEST_DELAY = 0.05  # Small delay between image requests
+import zlib
+from collections import OrderedDict
+from html_parsing import parse_html
+import manifest as manifest_module
+import negative_cache
+from manifest import Manifest, hash_bytes
+from encoder import submit_batched
+from event_cache import events
+from metrics import run_metrics
+from work_executor import get_executor, FIRST_COMPLETED, PRIORITY_IMAGE
+
+try:
+    from wand import image
+except ImportError:
+    # Only needed by the "wand" encoder backend (DDS_ENCODER in config.py)
+    image = None
+
+# Striped locks for file operations: only writers of the same output path
+# (or paths hashing to the same stripe) wait for each other
+FILE_LOCK_STRIPES = 64
+file_locks = [threading.Lock() for _ in range(FILE_LOCK_STRIPES)]
+
+# Import configuration with fallbacks
+try:
+    from config import (
+        BACKGROUND_CACHE_MAX_BYTES,
+        DDS_ENCODER,
+        HEDGED_IMAGE_FETCH,
+        HEDGE_DELAY,
+    )
+except ImportError:
+    BACKGROUND_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    DDS_ENCODER = "wand"
+    HEDGED_IMAGE_FETCH = False
+    HEDGE_DELAY = 0.5
+
+# Result of a card with nothing to generate: a default or dummy card, one
+# without an event background, or images missing at every source. Falsy, and
+# unlike None (a failed card) it still lets its player count as done.
+NO_OUTPUT = ""
+
+# Trimmed and resized event backgrounds, keyed by (event, width, height).
+# Each encode worker keeps its own cache; sizes are estimated from the
+# pixel count (ImageMagick Q16 stores 8 bytes per RGBA pixel, Pillow 4).
+prepared_backgrounds_lock = threading.Lock()
+prepared_backgrounds = OrderedDict()
+prepared_backgrounds_size = 0
 
 
 def log_error(message):
@@ -35,7 +69,325 @@ def log_debug(message):
         print(f"[DEBUG] {message}")
 
 
-def save_miniface_image(player_id, image_dict, with_background=True, base_dir="."):
+def miniface_path(base_dir, player_id, image_dict):
+    """Return the output path of a card's DDS file"""
+    return os.path.join(
+        base_dir, player_id, image_dict["team"], image_dict["id"] + ".dds"
+    )
+
+
+def path_lock(fn):
+    """Return the lock guarding writes to an output path"""
+    key = os.path.normpath(os.path.abspath(fn)).encode("utf-8")
+    return file_locks[zlib.crc32(key) % FILE_LOCK_STRIPES]
+
+
+def remove_stale_temp_files(base_dir):
+    """
+    Delete temp files left in an output tree by an interrupted run.
+
+    Returns:
+        int: Number of files removed
+    """
+    removed = 0
+    for dirpath, _, filenames in os.walk(base_dir):
+        for filename in filenames:
+            if filename.startswith(".") and filename.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(dirpath, filename))
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+
+class WandBackend:
+    """ImageMagick (Wand) implementation of the image operations"""
+
+    name = "wand"
+
+    @staticmethod
+    def decode(blob):
+        return image.Image(blob=blob)
+
+    @staticmethod
+    def size(img):
+        return img.width, img.height
+
+    @staticmethod
+    def prepare_background(blob, width, height):
+        back_img = image.Image(blob=blob)
+        back_img.trim(percent_background=0.5)
+        back_img.resize(width, height)
+        return back_img
+
+    @staticmethod
+    def composite(back_img, fore_img):
+        back_img.composite(fore_img)
+        return back_img
+
+    @staticmethod
+    def clone(img):
+        return img.clone()
+
+    @staticmethod
+    def close(img):
+        img.close()
+
+    @staticmethod
+    def encode_dds(images):
+        """Return the DXT5 DDS file bytes of every image"""
+        blobs = []
+        for img in images:
+            img.compression = "dxt5"
+            blobs.append(img.make_blob("dds"))
+        return blobs
+
+
+def get_encoder_backend():
+    """
+    Return the image backend selected by DDS_ENCODER.
+
+    Raises:
+        ImportError: If the libraries of the selected backend are missing
+    """
+    if DDS_ENCODER == "numpy":
+        from dds_encoder import NumpyBackend
+
+        return NumpyBackend
+    if image is None:
+        raise ImportError(
+            "Wand/ImageMagick is not available; install it or set "
+            'DDS_ENCODER = "numpy" in config.py'
+        )
+    return WandBackend
+
+
+def prepared_background(backend, event_key, background_bytes, width, height):
+    """
+    Return the event background trimmed and resized to width x height.
+
+    The prepared raster is cached per (event_key, width, height) and a
+    clone is returned, which the caller owns and must close.
+    """
+    global prepared_backgrounds_size
+    key = (event_key, width, height)
+    with prepared_backgrounds_lock:
+        cached = prepared_backgrounds.get(key)
+        if cached is not None:
+            prepared_backgrounds.move_to_end(key)
+            return backend.clone(cached)
+
+    back_img = backend.prepare_background(background_bytes, width, height)
+
+    size = width * height * 8
+    if size > BACKGROUND_CACHE_MAX_BYTES:
+        return back_img
+
+    with prepared_backgrounds_lock:
+        if key in prepared_backgrounds:
+            # Another thread prepared it meanwhile
+            backend.close(back_img)
+        else:
+            prepared_backgrounds[key] = back_img
+            prepared_backgrounds_size += size
+            while prepared_backgrounds_size > BACKGROUND_CACHE_MAX_BYTES:
+                (_, w, h), evicted = prepared_backgrounds.popitem(last=False)
+                prepared_backgrounds_size -= w * h * 8
+                backend.close(evicted)
+        return backend.clone(prepared_backgrounds[key])
+
+
+def decode_image(backend, blob):
+    """Decode PNG bytes with the backend, recording the decode stage"""
+    with run_metrics.timed("decode", len(blob)):
+        return backend.decode(blob)
+
+
+def encode_images(backend, images):
+    """DXT5-compress images with the backend, recording the encode stage"""
+    if not images:
+        return []
+    start_time = time.perf_counter()
+    try:
+        blobs = backend.encode_dds(images)
+    except BaseException:
+        run_metrics.record("encode", time.perf_counter() - start_time, ok=False)
+        raise
+    run_metrics.record(
+        "encode", time.perf_counter() - start_time, sum(len(blob) for blob in blobs)
+    )
+    return blobs
+
+
+def write_atomic(fn, data):
+    """
+    Write a file atomically.
+
+    The data is written to a temp file next to fn and renamed over it, so an
+    interrupted run never leaves a half-written DDS behind.
+    """
+    with run_metrics.timed("write", len(data)):
+        atomic_file.write_atomic(fn, data)
+
+
+def render_background_variant(backend, fore_img, background_bytes, event_key=None):
+    """
+    Composite a decoded foreground over the trimmed and resized background.
+
+    Args:
+        backend: Image backend (see get_encoder_backend)
+        fore_img: Decoded foreground (not modified, still owned by the caller)
+        background_bytes: PNG bytes of the event background
+        event_key: Identifies the background (e.g. its URL) so the trimmed
+            raster can be reused across cards; None disables the cache
+
+    Returns:
+        A new image owned by the caller
+    """
+    with run_metrics.timed("composite"):
+        width, height = backend.size(fore_img)
+        if event_key:
+            back_img = prepared_background(
+                backend, event_key, background_bytes, width, height
+            )
+        else:
+            back_img = backend.prepare_background(background_bytes, width, height)
+        try:
+            result = backend.composite(back_img, fore_img)
+        except BaseException:
+            backend.close(back_img)
+            raise
+    if result is not back_img:
+        backend.close(back_img)
+    return result
+
+
+def write_miniface(fn, foreground_bytes, background_bytes=None, event_key=None):
+    """
+    Decode a foreground PNG and write one variant of a miniface as DXT5 DDS.
+
+    Args:
+        fn: Output path
+        foreground_bytes: PNG bytes of the player face
+        background_bytes: PNG bytes of the event background; if given, the
+            trimmed and resized background is composited under the face
+        event_key: See render_background_variant
+    """
+    backend = get_encoder_backend()
+    fore_img = decode_image(backend, foreground_bytes)
+    try:
+        if not background_bytes:
+            # No-background version (foreground only)
+            write_atomic(fn, encode_images(backend, [fore_img])[0])
+            return
+        # Composite version (background + foreground)
+        back_img = render_background_variant(
+            backend, fore_img, background_bytes, event_key
+        )
+        try:
+            write_atomic(fn, encode_images(backend, [back_img])[0])
+        finally:
+            backend.close(back_img)
+    finally:
+        backend.close(fore_img)
+
+
+def encode_miniface_batch(jobs):
+    """
+    Encode every output variant of a batch of cards. Runs inside an encode
+    worker.
+
+    Each foreground PNG is decoded once and shared by both variants of its
+    card, all images of the batch are compressed in one backend call, and
+    every image is closed before returning.
+
+    Args:
+        jobs: List of dictionaries with "bytes", "background_bytes",
+            "background_url", "outputs" ({"standard": path, "background":
+            path}) and "overwrite" (re-encode files that already exist)
+
+    Returns:
+        list: One dict per job, variant -> True if written successfully
+        (or already present)
+    """
+    results = [{} for _ in jobs]
+    # (job index, variant, output path, image) of everything to encode
+    rendered = []
+    decoded = []
+    try:
+        backend = get_encoder_backend()
+        for index, job in enumerate(jobs):
+            pending = {}
+            for variant, fn in job["outputs"].items():
+                if os.path.exists(fn) and not job.get("overwrite"):
+                    log_debug(f"File already exists: {fn}")
+                    results[index][variant] = True
+                else:
+                    pending[variant] = fn
+            if not pending:
+                continue
+
+            try:
+                fore_img = decode_image(backend, job["bytes"])
+            except Exception as e:
+                log_error(f"Error decoding {', '.join(pending.values())}: {e}")
+                results[index].update(dict.fromkeys(pending, False))
+                continue
+            decoded.append(fore_img)
+
+            for variant, fn in pending.items():
+                try:
+                    if variant == "background":
+                        img = render_background_variant(
+                            backend,
+                            fore_img,
+                            job["background_bytes"],
+                            job.get("background_url"),
+                        )
+                    else:
+                        img = fore_img
+                    rendered.append((index, variant, fn, img))
+                except Exception as e:
+                    log_error(f"Error rendering {variant} image {fn}: {e}")
+                    results[index][variant] = False
+
+        blobs = encode_images(backend, [img for _, _, _, img in rendered])
+        for (index, variant, fn, _), data in zip(rendered, blobs):
+            try:
+                with path_lock(fn):
+                    if os.path.exists(fn) and not jobs[index].get("overwrite"):
+                        # Written by a concurrent job meanwhile
+                        results[index][variant] = True
+                        continue
+                    write_atomic(fn, data)
+                log_debug(f"Saved {variant} image: {fn}")
+                results[index][variant] = True
+            except Exception as e:
+                log_error(f"Error saving {variant} image {fn}: {e}")
+                results[index][variant] = False
+    except Exception as e:
+        log_error(f"Error encoding batch of {len(jobs)} cards: {e}")
+        for index, job in enumerate(jobs):
+            for variant in job["outputs"]:
+                results[index].setdefault(variant, False)
+    finally:
+        for _, variant, _, img in rendered:
+            if variant == "background":
+                backend.close(img)
+        for img in decoded:
+            backend.close(img)
+    return results
+
+
+def encode_miniface_job(job):
+    """Encode every output variant of one card (see encode_miniface_batch)"""
+    return encode_miniface_batch([job])[0]
+
+
+def save_miniface_image(
+    player_id, image_dict, with_background=True, base_dir=".", overwrite=False
+):
     """
     Save miniface image to disk with proper thread safety.
 
@@ -44,6 +396,7 @@ def save_miniface_image(player_id, image_dict, with_background=True, base_dir=".
         image_dict: Dictionary containing image data (bytes, background_bytes, team, id)
         with_background: If True, composite background with foreground; if False, save foreground only
         base_dir: Base directory for saving (relative or absolute path)
+        overwrite: Re-encode even if the output file already exists
 
     Returns:
         bool: True if save successful, False otherwise
@@ -60,41 +413,20 @@ def save_miniface_image(player_id, image_dict, with_background=True, base_dir=".
         return False
 
     try:
-        # Thread-safe directory creation for player
-        player_dir = os.path.join(base_dir, player_id)
-        with directory_creation_lock:
-            if not os.path.exists(player_dir):
-                os.makedirs(player_dir)
-
-        # Thread-safe directory creation for team
-        team_dir = os.path.join(player_dir, image_dict["team"])
-        with directory_creation_lock:
-            if not os.path.exists(team_dir):
-                os.makedirs(team_dir)
-
-        fn = os.path.join(team_dir, image_dict["id"] + ".dds")
-
-        # Thread-safe file save with atomic check-then-save
-        with file_save_lock:
-            if os.path.exists(fn):
+        fn = miniface_path(base_dir, player_id, image_dict)
+
+        # Check-then-save under the lock of this path only
+        with path_lock(fn):
+            if os.path.exists(fn) and not overwrite:
                 log_debug(f"File already exists: {fn}")
                 return True
 
-            # Image processing
-            if with_background:
-                # Composite version (background + foreground)
-                back_img = image.Image(blob=image_dict["background_bytes"])
-                fore_img = image.Image(blob=image_dict["bytes"])
-                back_img.trim(percent_background=0.5)
-                back_img.resize(fore_img.width, fore_img.height)
-                back_img.composite(fore_img)
-                back_img.compression = "dxt5"
-                back_img.save(filename=fn)
-            else:
-                # No-background version (foreground only)
-                fore_img = image.Image(blob=image_dict["bytes"])
-                fore_img.compression = "dxt5"
-                fore_img.save(filename=fn)
+            write_miniface(
+                fn,
+                image_dict["bytes"],
+                image_dict["background_bytes"] if with_background else None,
+                image_dict.get("background_url"),
+            )
 
             log_debug(
                 f"Saved {'background' if with_background else 'no-background'} image: {fn}"
@@ -108,50 +440,67 @@ def save_miniface_image(player_id, image_dict, with_background=True, base_dir=".
         return False
 
 
-def miniface_downloader(
-    card, player_id=None, output_dir_standard=None, output_dir_background=None
-):
+def find_player_cards(content):
     """
-    Thread-safe version of miniface downloader with concurrent image processing.
-    Saves to both standard (no-background) and background versions.
+    Extract eFootball card elements from the HTML of a player page.
 
     Args:
-        card: BeautifulSoup card element to process
-        player_id: Optional player ID (will be extracted if not provided)
-        output_dir_standard: Directory for no-background version (default: current directory)
-        output_dir_background: Directory for background version (default: None, skips background save)
+        content: Raw HTML of the player page
+
+    Returns:
+        List of card elements, or None if the page has no card container
     """
-    if output_dir_standard is None:
-        output_dir_standard = "."
+    soup = parse_html(content, "div", "player-card-container")
+    cards_div = soup.find_all("div", attrs={"class": "player-card-container"})
 
-    if output_dir_standard is None:
-        output_dir_standard = "."
+    if not cards_div:
+        return None
+
+    return cards_div[len(cards_div) - 1].find_all(
+        "figure", attrs={"class": "player-card efootball-2022"}
+    )
+
+
+def parse_card(card):
+    """
+    Collect team, card id and image URLs from a card element.
+
+    Args:
+        card: BeautifulSoup card element to process
 
+    Returns:
+        tuple: (image_dict, image_download_tasks) where each task is
+        (img_type, url, name) with img_type "main" or "background".
+        image_dict["fingerprint"] identifies the card across runs.
+    """
     image_dict = {
         "team": "",
         "default": True,
         "bytes": False,
         "id": "",
         "background_bytes": False,
+        "url": "",
+        "background_url": "",
     }
 
     pictures_div = card.find_all("img")
     image_download_tasks = []
+    team_logo = ""
+    event_name = ""
 
     for pictures in pictures_div:
         if "teamlogos" in pictures["data-src"]:
-            image_dict["team"] = checkACLID(
-                str(
-                    int(
-                        pictures["data-src"]
-                        .split("/teamlogos/")[1]
-                        .split("/")[0]
-                        .replace(".png", "")
-                        .replace("e_", "")
-                        .replace("_w", "")
-                    )
+            team_logo = str(
+                int(
+                    pictures["data-src"]
+                    .split("/teamlogos/")[1]
+                    .split("/")[0]
+                    .replace(".png", "")
+                    .replace("e_", "")
+                    .replace("_w", "")
                 )
             )
+            image_dict["team"] = checkACLID(team_logo)
         elif "graphics/players" in pictures["data-src"]:
             picture_url = "https://www.pesmaster.com" + pictures["data-src"]
             if "/Variation2022/" in pictures["data-src"]:
@@ -168,34 +517,68 @@ def miniface_downloader(
             if not "b" in picture_name and not "dummy" in picture_name:
                 if not image_dict["default"]:
                     image_download_tasks.append(("main", picture_url, picture_name))
+                    image_dict["url"] = picture_url
                 image_dict["id"] = picture_name.replace("_.png", "")
             elif "_b02" in picture_name:
                 image_download_tasks.append(("background", picture_url, picture_name))
+                image_dict["background_url"] = picture_url
+                event_name = picture_name
+
+    # Everything that decides the generated files, known without fetching
+    # a single image: a card with the same fingerprint as last run is skipped
+    image_dict["fingerprint"] = hash_bytes(
+        "\n".join((image_dict["id"], team_logo, event_name, image_dict["url"])).encode()
+    )
+    return image_dict, image_download_tasks
 
-    # Download images concurrently
-    if image_download_tasks:
-        with ThreadPoolExecutor(max_workers=MAX_IMAGE_WORKERS) as executor:
-            futures = {}
-            for img_type, url, name in image_download_tasks:
-                if img_type == "main":
-                    future = executor.submit(download_image, url)
-                    futures[future] = ("main", name)
-                elif img_type == "background":
-                    future = executor.submit(get_card_event, name, url)
-                    futures[future] = ("background", name)
-
-            # Collect results
-            for future in futures:
-                img_type, name = futures[future]
-                try:
-                    result = future.result()
-                    if img_type == "main":
-                        image_dict["bytes"] = result
-                    elif img_type == "background":
-                        image_dict["background_bytes"] = result
-                except Exception as e:
-                    log_error(f"Error downloading {img_type} image {name}: {e}")
 
+def unchanged_card_key(image_dict, player_id):
+    """
+    Check a parsed card against the manifest before any image is fetched.
+
+    Returns:
+        str: Manifest key of the card if it has the same fingerprint as last
+        run and its outputs are intact (incremental mode only), else None
+    """
+    manifest = manifest_module.active_manifest
+    if manifest is None or not player_id or not image_dict["url"]:
+        return None
+    if not manifest.card_fingerprint_unchanged(
+        player_id, image_dict["team"], image_dict["id"], image_dict["fingerprint"]
+    ):
+        return None
+    card_key = Manifest.card_key(player_id, image_dict["team"], image_dict["id"])
+    log_debug(f"Unchanged card {card_key}, skipping image fetches")
+    run_metrics.record("unchanged_card", 0.0)
+    return card_key
+
+
+def save_card_images(
+    image_dict,
+    player_id=None,
+    output_dir_standard=".",
+    output_dir_background=None,
+    encodes=None,
+):
+    """
+    Save the downloaded images of a card to both output trees.
+
+    Encoding is queued on the encode stage (see encoder.py). In incremental
+    mode the manifest is consulted first, and cards whose source images are
+    unchanged and whose outputs are intact are skipped.
+
+    Args:
+        image_dict: Dictionary filled by parse_card plus downloaded bytes
+        player_id: Optional player ID (will be extracted if not provided)
+        output_dir_standard: Directory for no-background version
+        output_dir_background: Directory for background version (None skips it)
+        encodes: Optional list the queued encode future is appended to
+
+    Returns:
+        str: Manifest key of the card if its outputs are up to date or queued
+        for encoding, NO_OUTPUT if it has no images to generate from, or
+        None if an image could not be fetched
+    """
     # Determine player_id if not provided
     if not player_id:
         try:
@@ -207,92 +590,344 @@ def miniface_downloader(
             )
         except (ValueError, IndexError):
             log_error(f"Could not determine player_id from {image_dict['id']}")
-            return
+            return None
 
     # Save both versions: no-background and with-background
-    if image_dict["bytes"] and image_dict["background_bytes"]:
-        # Save to standard directory (no background)
-        save_miniface_image(
-            player_id,
-            image_dict,
-            with_background=False,
-            base_dir=output_dir_standard,
+    if image_dict["bytes"] is None or image_dict["background_bytes"] is None:
+        return None
+    if not (image_dict["bytes"] and image_dict["background_bytes"]):
+        return NO_OUTPUT
+
+    card_key = Manifest.card_key(player_id, image_dict["team"], image_dict["id"])
+    outputs = {"standard": miniface_path(output_dir_standard, player_id, image_dict)}
+    if output_dir_background:
+        outputs["background"] = miniface_path(
+            output_dir_background, player_id, image_dict
         )
 
-        # Save to background directory if specified
-        if output_dir_background:
-            save_miniface_image(
+    manifest = manifest_module.active_manifest
+    if manifest is not None:
+        source_hash = hash_bytes(image_dict["bytes"])
+        background_hash = hash_bytes(image_dict["background_bytes"])
+        if manifest.card_unchanged(
+            player_id,
+            image_dict["team"],
+            image_dict["id"],
+            source_hash,
+            background_hash,
+        ):
+            # The next run can then skip the downloads as well
+            manifest.record_fingerprint(
                 player_id,
-                image_dict,
-                with_background=True,
-                base_dir=output_dir_background,
+                image_dict["team"],
+                image_dict["id"],
+                image_dict["fingerprint"],
             )
+            log_debug(f"Unchanged card {card_key}, skipping encode")
+            return card_key
+
+    # Outside incremental mode existing files are kept as they are
+    pending = {
+        variant: fn
+        for variant, fn in outputs.items()
+        if manifest is not None or not os.path.exists(fn)
+    }
+    if not pending:
+        log_debug(f"Files already exist for card {card_key}")
+        return card_key
 
+    def on_encoded(future):
+        try:
+            results = future.result()
+        except Exception as e:
+            log_error(f"Encode worker failed for card {card_key}: {e}")
+            return
+        if manifest is not None and all(results.values()):
+            manifest.record_card(
+                player_id,
+                image_dict["team"],
+                image_dict["id"],
+                image_dict["url"],
+                source_hash,
+                image_dict["background_url"],
+                background_hash,
+                outputs,
+                image_dict["fingerprint"],
+            )
+
+    # Hand the encode off to the batched encode stage; blocks while its
+    # queue is full
+    job = {
+        "bytes": image_dict["bytes"],
+        "background_bytes": image_dict["background_bytes"],
+        "background_url": image_dict["background_url"],
+        "outputs": pending,
+        "overwrite": manifest is not None,
+    }
+    future = submit_batched(encode_miniface_batch, job, callback=on_encoded)
+    if encodes is not None:
+        encodes.append(future)
+    return card_key
 
-def download_image(url: str, fallback_attempted=False):
+
+def encode_succeeded(future):
+    """Check that a finished encode future wrote every output of its card"""
+    return future.exception() is None and all(future.result().values())
+
+
+def miniface_downloader(
+    card,
+    player_id=None,
+    output_dir_standard=None,
+    output_dir_background=None,
+    encodes=None,
+):
     """
-    Download image with retry logic and proper error handling
+    Thread-safe version of miniface downloader with concurrent image processing.
+    Saves to both standard (no-background) and background versions.
+
+    Args:
+        card: BeautifulSoup card element to process
+        player_id: Optional player ID (will be extracted if not provided)
+        output_dir_standard: Directory for no-background version (default: current directory)
+        output_dir_background: Directory for background version (default: None, skips background save)
+        encodes: Optional list the queued encode future is appended to
+
+    Returns:
+        Same as save_card_images
     """
-    max_retries = 3
-    retry_delay = 1
+    if output_dir_standard is None:
+        output_dir_standard = "."
 
-    for attempt in range(max_retries):
-        try:
-            # Add small delay to be respectful to the server
-            time.sleep(IMAGE_REQUEST_DELAY)
+    image_dict, image_download_tasks = parse_card(card)
+    card_key = unchanged_card_key(image_dict, player_id)
+    if card_key is not None:
+        return card_key
 
-            r = requests.get(url, timeout=30)
-            if r.status_code == 200 and not r.content.startswith(b"<!DOCTYPE html>"):
-                return r.content
-            else:
-                # Only try fallbacks once to prevent infinite recursion
-                if not fallback_attempted:
-                    if "pesmaster" in url and "Variation2022" in url:
-                        fallback_url = url.replace(
-                            "https://www.pesmaster.com/efootball-2022/graphics/players/Variation2022/",
-                            "https://efootballhub.net/images/efootball23/players/",
-                        )
-                        return download_image(fallback_url, fallback_attempted=True)
-                    elif "efootball23" in url:
-                        fallback_url = url.replace("efootball23", "efootball24")
-                        return download_image(fallback_url, fallback_attempted=True)
+    # Download images concurrently on the shared executor, ahead of any
+    # queued player or team work
+    if image_download_tasks:
+        executor = get_executor()
+        futures = {}
+        for img_type, url, name in image_download_tasks:
+            if img_type == "main":
+                future = executor.submit(PRIORITY_IMAGE, download_image, url)
+                futures[future] = ("main", name)
+            elif img_type == "background":
+                future = executor.submit(PRIORITY_IMAGE, get_card_event, name, url)
+                futures[future] = ("background", name)
+        executor.wait(futures)
+
+        # Collect results
+        for future in futures:
+            img_type, name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                log_error(f"Error downloading {img_type} image {name}: {e}")
+                result = None
+            if img_type == "main":
+                image_dict["bytes"] = result
+            elif img_type == "background":
+                image_dict["background_bytes"] = result
+
+    return save_card_images(
+        image_dict, player_id, output_dir_standard, output_dir_background, encodes
+    )
+
+
+def image_fallback_url(url):
+    """
+    Return the mirror URL to try when an image is missing, or None.
+
+    pesmaster Variation2022 images fall back to efootballhub.net efootball23,
+    and efootball23 URLs fall back to efootball24.
+    """
+    if "pesmaster" in url and "Variation2022" in url:
+        return url.replace(
+            "https://www.pesmaster.com/efootball-2022/graphics/players/Variation2022/",
+            "https://efootballhub.net/images/efootball23/players/",
+        )
+    elif "efootball23" in url:
+        return url.replace("efootball23", "efootball24")
+    return None
+
+
+def image_sources(url):
+    """
+    Return the URLs an image is requested from, in the order they are tried.
+
+    When the negative cache is enabled, the source that last served the
+    image comes first and sources known to be missing are left out.
+    """
+    sources = [url]
+    fallback_url = image_fallback_url(url)
+    while fallback_url and fallback_url not in sources:
+        sources.append(fallback_url)
+        fallback_url = image_fallback_url(fallback_url)
+
+    cache = negative_cache.active_cache
+    if cache is None:
+        return sources
+    return cache.sources_to_try(url, sources)
+
+
+def is_valid_image_response(status_code, content):
+    """Check that a response is a real image and not a soft-404 HTML page"""
+    return status_code == 200 and http_client.is_image(content)
+
+
+def is_transient_failure(status_code):
+    """Check whether an image response may succeed when requested again later"""
+    return status_code == 429 or status_code >= 500
+
+
+def record_image_response(url, source, status_code, content, rejected=None):
+    """
+    Update the negative cache with the response of one image source.
+
+    Args:
+        rejected: Why an image body was aborted (r.rejected), or None
+
+    Returns:
+        bool: True if the response is a valid image
+    """
+    valid = is_valid_image_response(status_code, content)
+    cache = negative_cache.active_cache
+    if cache is not None:
+        if valid:
+            cache.record_found(url, source)
+        elif status_code in (404, 410):
+            cache.record_missing(source, status_code)
+        elif status_code == 200 and http_client.is_soft_404(rejected):
+            # Soft 404: the site answered with an HTML page. Other rejections
+            # (e.g. an oversized image) say nothing about the image missing
+            cache.record_missing(source, "html")
+    return valid
+
+
+def download_image(url: str):
+    """
+    Download image with retry logic and proper error handling, trying the
+    efootballhub.net mirrors when pesmaster does not have it.
 
-                # No valid fallback or fallback already attempted
-                log_debug(f"Image not found (HTTP {r.status_code}): {url}")
-                return False
+    Returns:
+        bytes: The image; False if it is missing at every source, or None
+        if a request failed (so the card is tried again on the next run)
+    """
+    sources = image_sources(url)
+    if not sources:
+        log_debug(f"Skipped image known to be missing: {url}")
+        return False
+    if HEDGED_IMAGE_FETCH and len(sources) > 1:
+        return download_image_hedged(url, sources)
 
+    failed = False
+    for source in sources:
+        try:
+            # Rate limiting and retries are handled by the shared client
+            r = http_client.get(source, cache=True, image=True)
         except requests.RequestException as e:
-            if attempt < max_retries - 1:
-                log_debug(f"Retry {attempt + 1}/{max_retries} for {url}: {e}")
-                time.sleep(retry_delay * (attempt + 1))
-            else:
-                log_error(f"Failed to download {url} after {max_retries} attempts: {e}")
-                return False
+            log_error(f"Failed to download {source}: {e}")
+            return None
         except Exception as e:
-            log_error(f"Unexpected error downloading {url}: {e}")
-            return False
+            log_error(f"Unexpected error downloading {source}: {e}")
+            return None
+        if record_image_response(url, source, r.status_code, r.content, r.rejected):
+            return r.content
+        if is_transient_failure(r.status_code):
+            log_error(f"Failed to download {source}: HTTP {r.status_code}")
+            failed = True
+        else:
+            log_debug(f"Image not found (HTTP {r.status_code}): {source}")
 
-    return False
+    return None if failed else False
 
 
-def get_card_event(event_name, event_url):
+def download_image_hedged(url, sources):
     """
-    Thread-safe event downloading with caching
+    Race the sources of an image instead of trying them one after another.
+
+    The next source is requested as soon as the previous ones have failed,
+    or once HEDGE_DELAY seconds have passed without an answer. The first
+    valid image wins; sources not started yet are dropped and requests
+    still waiting for a concurrency slot, a rate limit token or a retry are
+    cancelled. Attempts run on the shared executor and every request goes
+    through the shared client, so per-host limits apply.
+
+    Returns:
+        Same as download_image
     """
-    # Thread-safe check for cached event
-    with downloaded_events_lock:
-        if event_name in downloaded_events["names"]:
-            index = downloaded_events["names"].index(event_name)
-            return downloaded_events["bytes"][index]
+    executor = get_executor()
+    lock = threading.Lock()
+    cancelled = threading.Event()
+    state = {"image": None, "failed": False}
+
+    def attempt(source):
+        try:
+            r = http_client.get(source, cache=True, cancelled=cancelled, image=True)
+        except requests.RequestException as e:
+            if not cancelled.is_set():
+                log_error(f"Failed to download {source}: {e}")
+                state["failed"] = True
+            return
+        except Exception as e:
+            log_error(f"Unexpected error downloading {source}: {e}")
+            state["failed"] = True
+            return
+        valid = is_valid_image_response(r.status_code, r.content)
+        with lock:
+            won = valid and state["image"] is None
+            if won:
+                state["image"] = r.content
+                cancelled.set()
+        # A late valid answer from a loser must not replace the winner
+        if won or not valid:
+            record_image_response(url, source, r.status_code, r.content, r.rejected)
+        if valid:
+            return
+        if is_transient_failure(r.status_code):
+            log_error(f"Failed to download {source}: HTTP {r.status_code}")
+            state["failed"] = True
+        else:
+            log_debug(f"Image not found (HTTP {r.status_code}): {source}")
+
+    pending = list(sources)
+    attempts = []
+    hedge_at = 0.0
+    try:
+        while state["image"] is None:
+            running = [future for future in attempts if not future.done()]
+            if not pending and not running:
+                break
+            if pending and (not running or time.monotonic() >= hedge_at):
+                if running:
+                    # The previous source is slow: hedge with the next one
+                    run_metrics.record("image_hedge", 0.0)
+                attempts.append(
+                    executor.submit(PRIORITY_IMAGE, attempt, pending.pop(0))
+                )
+                hedge_at = time.monotonic() + HEDGE_DELAY
+                continue
+            executor.wait(
+                running,
+                timeout=max(hedge_at - time.monotonic(), 0) if pending else None,
+                return_when=FIRST_COMPLETED,
+            )
+    finally:
+        cancelled.set()
+        for future in attempts:
+            future.cancel()
+    if state["image"] is not None:
+        return state["image"]
+    return None if state["failed"] else False
 
-    # Download the event
-    b = download_image(event_url)
 
-    # Thread-safe caching
-    with downloaded_events_lock:
-        # Double-check in case another thread added it while we were downloading
-        if event_name not in downloaded_events["names"]:
-            downloaded_events["names"].append(event_name)
-            downloaded_events["bytes"].append(b)
+def get_card_event(event_name, event_url):
+    """
+    Thread-safe event downloading with caching.
 
-    return b
+    Backgrounds are kept in the shared bounded LRU cache (event_cache.py);
+    concurrent requests for the same event share one download.
+    """
+    return events.get(event_name, lambda: download_image(event_url))
@@ -1,27 +1,49 @@
 import os
 import requests
+import http_client
+import concurrency
+import rate_limiter
+import manifest
+import negative_cache
 import threading
 import argparse
 import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from bs4 import BeautifulSoup as bs
-from get_miniface import miniface_downloader
+from concurrent.futures import wait
+from html_parsing import parse_html
+from get_miniface import (
+    encode_succeeded,
+    miniface_downloader,
+    remove_stale_temp_files,
+)
+from encoder import shutdown_encode_stage
+import work_executor
+from work_executor import get_executor, PRIORITY_PLAYER
+from event_cache import events
+from metrics import run_metrics
 
 # Import configuration with fallbacks
 try:
     from config import (
-        MAX_WORKERS_PLAYERS,
-        MAX_WORKERS_IMAGES,
+        MAX_WORKERS,
         REQUEST_DELAY,
         REQUEST_TIMEOUT,
+        MANIFEST_PATH,
+        NEGATIVE_CACHE_PATH,
+        RUN_REPORT_PATH,
+        PROMETHEUS_REPORT_PATH,
     )
 except ImportError:
     # Fallback configuration if config.py doesn't exist
-    MAX_WORKERS_PLAYERS = 8
-    MAX_WORKERS_IMAGES = 6
+    MAX_WORKERS = 64
     REQUEST_DELAY = 0.1
     REQUEST_TIMEOUT = 30
+    MANIFEST_PATH = "miniface_manifest.json"
+    NEGATIVE_CACHE_PATH = os.path.join(
+        "MinifaceServer", "content", "miniface-server", "skipped_players.txt"
+    )
+    RUN_REPORT_PATH = "run_report.json"
+    PROMETHEUS_REPORT_PATH = None
 
 # Thread-safe set for tracking processed players
 done_players_lock = threading.Lock()
@@ -70,6 +92,7 @@ Examples:
   python get_update_only.py                    # Run with default settings
   python get_update_only.py --debug           # Run with debug logging
   python get_update_only.py -d --quiet        # Debug mode with minimal output
+  python get_update_only.py --incremental     # Only regenerate changed minifaces
         """,
     )
 
@@ -90,13 +113,29 @@ Examples:
     parser.add_argument(
         "--workers",
         type=int,
-        help="Override number of concurrent players (default from config.py)",
+        help="Override total number of worker threads shared by players and images (default from config.py)",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only regenerate minifaces whose source changed since the last run (uses the manifest)",
     )
 
     parser.add_argument(
         "--delay",
         type=float,
-        help="Override request delay in seconds (default from config.py)",
+        help="Override minimum interval between page requests across all workers in seconds (default from config.py)",
+    )
+
+    parser.add_argument(
+        "--report",
+        help="Path of the JSON run report with per-stage metrics (default from config.py)",
+    )
+
+    parser.add_argument(
+        "--prometheus",
+        help="Also write the per-stage metrics in Prometheus text format to this path",
     )
 
     return parser.parse_args()
@@ -109,7 +148,7 @@ os.makedirs(OUTPUT_DIR_BACKGROUND, exist_ok=True)
 
 def initialize_script():
     """Initialize the script with configuration and arguments"""
-    global DEBUG, MAX_WORKERS_PLAYERS, MAX_WORKERS_IMAGES, REQUEST_DELAY, REQUEST_TIMEOUT
+    global DEBUG, MAX_WORKERS, REQUEST_DELAY, REQUEST_TIMEOUT
 
     # Parse command line arguments
     args = parse_arguments()
@@ -119,33 +158,75 @@ def initialize_script():
     # Import configuration with fallbacks
     try:
         from config import (
-            MAX_WORKERS_PLAYERS as DEFAULT_PLAYERS,
-            MAX_WORKERS_IMAGES as DEFAULT_IMAGES,
+            MAX_WORKERS as DEFAULT_WORKERS,
             REQUEST_DELAY as DEFAULT_DELAY,
             REQUEST_TIMEOUT as DEFAULT_TIMEOUT,
         )
 
         debug_print("Configuration loaded from config.py")
     except ImportError:
-        DEFAULT_PLAYERS = 8
-        DEFAULT_IMAGES = 6
+        DEFAULT_WORKERS = 64
         DEFAULT_DELAY = 0.1
         DEFAULT_TIMEOUT = 30
         log_error("config.py not found, using default configuration")
 
     # Apply command line overrides
-    MAX_WORKERS_PLAYERS = args.workers if args.workers else DEFAULT_PLAYERS
-    MAX_WORKERS_IMAGES = DEFAULT_IMAGES
+    MAX_WORKERS = args.workers if args.workers else DEFAULT_WORKERS
+    work_executor.configure(MAX_WORKERS)
     REQUEST_DELAY = args.delay if args.delay else DEFAULT_DELAY
+    if args.delay:
+        rate_limiter.configure("pages", rate=1 / REQUEST_DELAY)
     REQUEST_TIMEOUT = DEFAULT_TIMEOUT
 
+    if args.incremental:
+        manifest.enable(MANIFEST_PATH)
+        debug_print(f"Incremental mode: using manifest {MANIFEST_PATH}")
+
+    if NEGATIVE_CACHE_PATH:
+        cache = negative_cache.enable(NEGATIVE_CACHE_PATH)
+        debug_print(
+            f"Skip list {NEGATIVE_CACHE_PATH}: {cache.stats()['missing']} images known to be missing"
+        )
+
     if not QUIET:
         print("Loading Featured Players...")
-    debug_print(f"Configuration: Players={MAX_WORKERS_PLAYERS}, Delay={REQUEST_DELAY}s")
+    debug_print(f"Configuration: Workers={MAX_WORKERS}, Delay={REQUEST_DELAY}s")
 
     return args
 
 
+def write_run_report(args, elapsed, players, leagues=None):
+    """Write the JSON run report and, if requested, the Prometheus text file"""
+    histogram = http_client.latency_histogram()
+    run = {
+        "elapsed": elapsed,
+        "players": players,
+        "players_per_second": players / max(elapsed, 1e-9),
+        "requests": histogram["count"],
+        "cache_hits": histogram["cache_hits"],
+        "latency_mean": histogram["mean"],
+        "latency_p50": histogram["p50"],
+        "latency_p95": histogram["p95"],
+    }
+    if leagues is not None:
+        run["leagues"] = leagues
+    for group, stats in concurrency.snapshot().items():
+        run[f"concurrency_limit_{group}"] = stats["limit"]
+        run[f"concurrency_decreases_{group}"] = stats["decreases"]
+    if negative_cache.active_cache is not None:
+        cache_stats = negative_cache.active_cache.stats()
+        run.update({f"skip_list_{key}": value for key, value in cache_stats.items()})
+    event_stats = events.stats()
+    run.update({f"event_cache_{key}": value for key, value in event_stats.items()})
+    try:
+        run_metrics.write_json(args.report or RUN_REPORT_PATH, run)
+        prometheus_path = args.prometheus or PROMETHEUS_REPORT_PATH
+        if prometheus_path:
+            run_metrics.write_prometheus(prometheus_path, run)
+    except OSError as e:
+        log_error(f"Could not write run report: {e}")
+
+
 def extract_player_id_from_card(card):
     """Extract player ID from a card element"""
     try:
@@ -182,11 +263,18 @@ def process_featured_card(card):
 
         debug_print(f"Processing featured player {player_id}")
 
-        # Add small delay to be respectful to the server
-        time.sleep(REQUEST_DELAY)
-
         # Process the card directly
-        miniface_downloader(card, player_id, OUTPUT_DIR_STANDARD, OUTPUT_DIR_BACKGROUND)
+        encodes = []
+        card_key = miniface_downloader(
+            card, player_id, OUTPUT_DIR_STANDARD, OUTPUT_DIR_BACKGROUND, encodes
+        )
+
+        # Encoding runs on the encode stage; the player only counts as
+        # processed once its files are on disk
+        wait(encodes)
+        if card_key is None or not all(map(encode_succeeded, encodes)):
+            log_error(f"Incomplete featured player {player_id}")
+            return f"✗ Incomplete featured player {player_id}"
 
         # Success: do not add to skip list (only skipping 'not found' players)
         log_success(f"Processed featured player {player_id}")
@@ -200,33 +288,29 @@ def process_featured_card(card):
 def main():
     """Main function to download featured players"""
     args = initialize_script()
+    for output_dir in (OUTPUT_DIR_STANDARD, OUTPUT_DIR_BACKGROUND):
+        remove_stale_temp_files(output_dir)
 
     if not args.quiet:
-        print(f"Starting featured players download with {MAX_WORKERS_PLAYERS} workers")
+        print(f"Starting featured players download with {MAX_WORKERS} workers")
 
     debug_print("Debug mode enabled - verbose logging active")
-    debug_print(
-        f"Configuration: Players={MAX_WORKERS_PLAYERS}, Images={MAX_WORKERS_IMAGES}"
-    )
-    debug_print(f"Request delay: {REQUEST_DELAY}s, Timeout: {REQUEST_TIMEOUT}s")
+    debug_print(f"Configuration: Workers={MAX_WORKERS} shared by players and images")
+    debug_print(f"Rate limits: {rate_limiter.describe()}, Timeout: {REQUEST_TIMEOUT}s")
 
     overall_start_time = time.time()
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36"
-    }
-
     try:
         if not args.quiet:
             print("Fetching featured players page...")
 
         # Get the featured players page
-        url = requests.get(
+        url = http_client.get(
             "https://www.pesmaster.com/efootball-2022/player/featured/",
             timeout=REQUEST_TIMEOUT,
         ).url
-        r = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        soup = bs(r.content, "html.parser")
+        r = http_client.get(url, timeout=REQUEST_TIMEOUT)
+        soup = parse_html(r.content, "div", "player-card-container")
         cards_div = soup.find_all("div", attrs={"class": "player-card-container"})
 
         if not cards_div:
@@ -250,21 +334,34 @@ def main():
         if not args.quiet:
             print(f"Processing {len(all_cards)} featured players...")
 
-        # Process featured players concurrently
+        # Process featured players concurrently on the shared executor
         successful_players = 0
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS_PLAYERS) as executor:
-            futures = {
-                executor.submit(process_featured_card, card): card
-                for card in all_cards
-            }
-
-            for future in as_completed(futures):
-                result = future.result()
-                if result.startswith("✓"):
-                    successful_players += 1
-                    debug_print(f"    {result}")
-                elif result.startswith("✗"):
-                    debug_print(f"    {result}")
+        executor = get_executor()
+        futures = [
+            executor.submit(PRIORITY_PLAYER, process_featured_card, card)
+            for card in all_cards
+        ]
+        executor.wait(futures)
+
+        for future in futures:
+            result = future.result()
+            if result.startswith("✓"):
+                successful_players += 1
+                debug_print(f"    {result}")
+            elif result.startswith("✗"):
+                debug_print(f"    {result}")
+
+        # Wait for queued encodes before recording the final state
+        work_executor.shutdown_executor()
+        shutdown_encode_stage()
+        if manifest.active_manifest is not None:
+            manifest.active_manifest.save()
+        if negative_cache.active_cache is not None:
+            try:
+                negative_cache.active_cache.save()
+            except OSError as e:
+                log_error(f"Could not write skip list: {e}")
+        http_client.prune_cache()
 
         overall_elapsed_time = time.time() - overall_start_time
 
@@ -281,13 +378,23 @@ def main():
         )
 
         if DEBUG:
-            print(f"\n[DEBUG] Final Statistics:")
+            print("\n[DEBUG] Final Statistics:")
             print(f"[DEBUG] - Total execution time: {overall_elapsed_time:.2f}s")
             print(
                 f"[DEBUG] - Players per second: {total_players/max(overall_elapsed_time, 1):.2f}"
             )
-            print(f"[DEBUG] - Thread configuration used: Players={MAX_WORKERS_PLAYERS}")
+            print(f"[DEBUG] - Thread configuration used: Workers={MAX_WORKERS}")
             print(f"[DEBUG] - Request delay used: {REQUEST_DELAY}s")
+            print("[DEBUG] - Request latency histogram:")
+            for line in http_client.format_latency_histogram():
+                print(f"[DEBUG]   {line}")
+            print(f"[DEBUG] - Event cache: {events.format_stats()}")
+            print(f"[DEBUG] - Final concurrency limits: {concurrency.describe()}")
+            print("[DEBUG] - Stage metrics:")
+            for line in run_metrics.format_stats():
+                print(f"[DEBUG]   {line}")
+
+        write_run_report(args, overall_elapsed_time, total_players)
 
     except requests.RequestException as e:
         log_error(f"Network error fetching featured players: {e}")
@@ -0,0 +1,43 @@
+"""
+Shared HTML parsing helper for the scrapers.
+
+Pages are parsed with lxml when it is installed (falling back to the
+pure-Python html.parser), and only the subtrees the scrapers actually read
+(e.g. the player-card-container divs) are built, via a SoupStrainer.
+"""
+
+from bs4 import BeautifulSoup as bs, SoupStrainer
+
+# Import configuration with fallbacks
+try:
+    from config import HTML_PARSER
+except ImportError:
+    HTML_PARSER = None
+
+try:
+    import lxml  # noqa: F401
+
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+if HTML_PARSER is None:
+    HTML_PARSER = "lxml" if LXML_AVAILABLE else "html.parser"
+elif HTML_PARSER == "lxml" and not LXML_AVAILABLE:
+    HTML_PARSER = "html.parser"
+
+
+def parse_html(content, tag="div", css_class=None):
+    """
+    Parse a page, building only the elements that match tag and css_class.
+
+    Args:
+        content: Raw HTML
+        tag: Tag name of the elements to keep
+        css_class: Class the kept elements must have (None parses everything)
+
+    Returns:
+        BeautifulSoup tree containing the matching elements and their subtrees
+    """
+    strainer = SoupStrainer(tag, class_=css_class) if css_class else None
+    return bs(content, HTML_PARSER, parse_only=strainer)
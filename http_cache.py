@@ -0,0 +1,158 @@
+"""
+Persistent on-disk HTTP cache with ETag/Last-Modified revalidation.
+
+Bodies are stored content-addressed (objects/<sha256>) so identical images
+served from several URLs are kept once; a small JSON index entry per URL
+records the validators. Cached URLs are revalidated with If-None-Match /
+If-Modified-Since and 304 responses are served from disk.
+
+The cache directory is meant to be persisted between CI runs (actions/cache).
+Every lookup refreshes the modification time of the URL's index entry, so
+prune() can drop the entries no run has used for a while, together with the
+bodies no remaining entry refers to.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from atomic_file import write_atomic
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class HTTPCache:
+    """Content-addressed response cache keyed by URL"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_dir = os.path.join(directory, "index")
+        self.objects_dir = os.path.join(directory, "objects")
+
+    def _index_path(self, url):
+        key = _sha256(url.encode("utf-8"))
+        return os.path.join(self.index_dir, key[:2], key + ".json")
+
+    def _object_path(self, body_hash):
+        return os.path.join(self.objects_dir, body_hash[:2], body_hash)
+
+    def lookup(self, url):
+        """
+        Return the index entry for a URL, or None if it is not cached.
+
+        Entries whose body object has gone missing are treated as absent.
+        """
+        try:
+            with open(self._index_path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._object_path(entry.get("body_hash", ""))):
+            return None
+        try:
+            # Mark the entry as used by this run (see prune)
+            os.utime(self._index_path(url))
+        except OSError:
+            pass
+        return entry
+
+    def read_body(self, entry):
+        """Return the cached body of an index entry, or None if unreadable"""
+        try:
+            with open(self._object_path(entry["body_hash"]), "rb") as f:
+                return f.read()
+        except (OSError, KeyError):
+            return None
+
+    def store(self, url, body, headers):
+        """
+        Cache a 200 response if it carries a validator.
+
+        Returns:
+            bool: True if the response was stored
+        """
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return False
+
+        body_hash = _sha256(body)
+        object_path = self._object_path(body_hash)
+        if not os.path.exists(object_path):
+            write_atomic(object_path, body)
+
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": headers.get("Content-Type"),
+            "body_hash": body_hash,
+        }
+        write_atomic(self._index_path(url), json.dumps(entry))
+        return True
+
+    def prune(self, max_age, now=None):
+        """
+        Delete index entries not used for max_age seconds, then every body
+        no remaining entry refers to.
+
+        Returns:
+            tuple: (index entries removed, bodies removed)
+        """
+        cutoff = (time.time() if now is None else now) - max_age
+        referenced = set()
+        removed_entries = 0
+        for path in _files(self.index_dir):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed_entries += 1
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    referenced.add(json.load(f).get("body_hash"))
+            except (OSError, ValueError):
+                # Unreadable entries are never served; drop them too
+                try:
+                    os.remove(path)
+                    removed_entries += 1
+                except OSError:
+                    pass
+
+        removed_objects = 0
+        for path in _files(self.objects_dir):
+            if os.path.basename(path) not in referenced:
+                try:
+                    os.remove(path)
+                    removed_objects += 1
+                except OSError:
+                    pass
+        return removed_entries, removed_objects
+
+
+def _files(directory):
+    """List the files in the two-level fan-out below directory"""
+    paths = []
+    try:
+        shards = os.listdir(directory)
+    except OSError:
+        return paths
+    for shard in shards:
+        try:
+            names = os.listdir(os.path.join(directory, shard))
+        except OSError:
+            continue
+        paths.extend(os.path.join(directory, shard, name) for name in names)
+    return paths
+
+
+def conditional_headers(entry):
+    """Build If-None-Match / If-Modified-Since headers for a cache entry"""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
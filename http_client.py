@@ -0,0 +1,480 @@
+"""
+Shared HTTP client for all scrapers.
+
+Every fetch (league pages, team pages, player pages and card images) goes
+through the single pooled session defined here, so keep-alive connections are
+reused across threads instead of paying a fresh TCP+TLS handshake per request.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+import concurrency
+import rate_limiter
+from http_cache import HTTPCache, conditional_headers
+from metrics import run_metrics
+
+# Import configuration with fallbacks
+try:
+    from config import (
+        MAX_WORKERS,
+        REQUEST_TIMEOUT,
+        MAX_RETRIES,
+        RETRY_DELAY_BASE,
+        HTTP_POOL_CONNECTIONS,
+        HTTP_POOL_MAXSIZE,
+        HTTP_CACHE_DIR,
+        HTTP_CACHE_MAX_AGE,
+        URL_REWRITES,
+        MAX_IMAGE_BYTES,
+    )
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    MAX_WORKERS = 64
+    REQUEST_TIMEOUT = 30
+    MAX_RETRIES = 3
+    RETRY_DELAY_BASE = 1
+    HTTP_POOL_CONNECTIONS = 4
+    HTTP_POOL_MAXSIZE = None
+    HTTP_CACHE_DIR = None
+    HTTP_CACHE_MAX_AGE = 30 * 24 * 3600
+    URL_REWRITES = {}
+    MAX_IMAGE_BYTES = 8 * 1024 * 1024
+
+# MINIFACE_URL_REWRITE="https://www.pesmaster.com=http://127.0.0.1:8000/www.pesmaster.com,..."
+# redirects requests to a local stand-in server (see benchmark.py)
+if os.getenv("MINIFACE_URL_REWRITE"):
+    URL_REWRITES = dict(
+        rule.split("=", 1) for rule in os.environ["MINIFACE_URL_REWRITE"].split(",")
+    )
+
+# brotli is optional - only advertise it when requests/urllib3 can decode it
+try:
+    import brotli  # noqa: F401
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36",
+    "Accept-Encoding": ACCEPT_ENCODING,
+    "Connection": "keep-alive",
+}
+
+# Every worker of the shared executor (plus the main thread helping it) can
+# be waiting on a socket at the same time, so size each per-host pool to it.
+if HTTP_POOL_MAXSIZE is None:
+    HTTP_POOL_MAXSIZE = MAX_WORKERS + 1
+
+# File signatures accepted for image downloads (PNG, JPEG, GIF, WebP)
+IMAGE_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"GIF8", b"RIFF")
+SIGNATURE_LENGTH = max(len(signature) for signature in IMAGE_SIGNATURES)
+# Rejection reasons of image responses that are pages rather than images
+NOT_AN_IMAGE = "body is not an image"
+UNEXPECTED_CONTENT_TYPE = "unexpected content type"
+# Bytes read per chunk when streaming an image
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+# Request durations kept (uniformly sampled) for percentiles
+LATENCY_SAMPLES = 10000
+
+_session = None
+_session_lock = threading.Lock()
+
+_cache = HTTPCache(HTTP_CACHE_DIR) if HTTP_CACHE_DIR else None
+
+_stats_lock = threading.Lock()
+_latency_counts = [0] * len(LATENCY_BUCKETS)
+_latency_total = 0.0
+_latency_samples = []
+_request_count = 0
+_cache_hits = 0
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def log_debug(message):
+    """Print debug messages only if in debug mode"""
+    if os.getenv("DEBUG") or globals().get("DEBUG", False):
+        print(f"[DEBUG] {message}")
+
+
+def get_session():
+    """
+    Return the process-wide pooled session, creating it on first use.
+
+    One HTTPAdapter is mounted for both schemes; urllib3 keeps a separate
+    connection pool per host (pesmaster.com, efootballhub.net, ...), each
+    holding up to HTTP_POOL_MAXSIZE keep-alive connections.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update(DEFAULT_HEADERS)
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    pool_block=True,
+                    max_retries=0,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def rewrite_url(url):
+    """Apply URL_REWRITES (prefix -> replacement) to a URL"""
+    for prefix, replacement in URL_REWRITES.items():
+        if url.startswith(prefix):
+            return replacement + url[len(prefix) :]
+    return url
+
+
+def fetch_stage(url):
+    """Return the metrics stage (see metrics.py) a request belongs to"""
+    parts = urlsplit(url)
+    if (parts.hostname or "").endswith("efootballhub.net"):
+        return "fallback_fetch"
+    if "/graphics/" in parts.path:
+        return "image_fetch"
+    if "/player/" in parts.path:
+        return "player_page"
+    if "/team/" in parts.path:
+        return "team_page"
+    return "league_discovery"
+
+
+def record_fetch(url, elapsed, status_code=None, nbytes=0):
+    """
+    Record a request in the latency histogram and the stage metrics.
+
+    Args:
+        status_code: Response status, None if the request failed
+        nbytes: Size of the response body
+    """
+    record_latency(elapsed)
+    ok = status_code is not None and status_code < 400
+    run_metrics.record(fetch_stage(url), elapsed, nbytes, ok=ok)
+
+
+def record_latency(elapsed):
+    """Add a single request duration to the latency histogram"""
+    global _latency_total, _request_count
+    with _stats_lock:
+        for index, upper in enumerate(LATENCY_BUCKETS):
+            if elapsed <= upper:
+                _latency_counts[index] += 1
+                break
+        _latency_total += elapsed
+        _request_count += 1
+
+        # Reservoir sampling keeps a uniform sample of every duration
+        if len(_latency_samples) < LATENCY_SAMPLES:
+            _latency_samples.append(elapsed)
+        else:
+            slot = random.randrange(_request_count)
+            if slot < LATENCY_SAMPLES:
+                _latency_samples[slot] = elapsed
+
+
+def is_image(content):
+    """Check that a body starts with a known image file signature"""
+    return content.startswith(IMAGE_SIGNATURES)
+
+
+def is_soft_404(rejected):
+    """
+    Check whether a 200 image response rejected for the given reason (None
+    if not rejected) was a page instead of an image
+    """
+    return (
+        rejected is None
+        or rejected == NOT_AN_IMAGE
+        or rejected.startswith(UNEXPECTED_CONTENT_TYPE)
+    )
+
+
+def image_rejection(content_type, content_length, max_bytes):
+    """
+    Check response headers before an image body is read.
+
+    Returns:
+        str: Why the body should not be read, or None
+    """
+    if content_type and content_type.split(";")[0].strip().startswith("text/"):
+        return f"{UNEXPECTED_CONTENT_TYPE} {content_type}"
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        return f"{content_length} bytes exceeds the limit of {max_bytes}"
+    return None
+
+
+def _read_image(r, max_bytes):
+    """
+    Stream an image body, keeping the received chunks until it is complete.
+
+    The body is abandoned (and the connection closed) as soon as the headers
+    or the first bytes show it is not an image, or it grows past max_bytes.
+    The chunks are joined once at the end, which for a body that arrived in
+    a single chunk is no copy at all. Sets r.rejected to the reason, or None.
+
+    Returns:
+        int: Number of body bytes read
+    """
+    r.rejected = image_rejection(
+        r.headers.get("Content-Type"), r.headers.get("Content-Length"), max_bytes
+    )
+    chunks = []
+    size = 0
+    sniffed = False
+    if r.rejected is None:
+        for chunk in r.iter_content(IMAGE_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                r.rejected = f"body exceeds the limit of {max_bytes} bytes"
+                break
+            chunks.append(chunk)
+            if not sniffed and size >= SIGNATURE_LENGTH:
+                # Decide on the first bytes instead of the whole body
+                sniffed = True
+                if not is_image(b"".join(chunks)[:SIGNATURE_LENGTH]):
+                    r.rejected = NOT_AN_IMAGE
+                    break
+        if r.rejected is None and not sniffed and not is_image(b"".join(chunks)):
+            r.rejected = NOT_AN_IMAGE
+    if r.rejected is not None:
+        r.close()
+        r._content = b""
+    else:
+        r._content = b"".join(chunks)
+    r._content_consumed = True
+    return size
+
+
+def set_cache_dir(directory):
+    """Point the on-disk HTTP cache at another directory (None disables it)"""
+    global _cache
+    _cache = HTTPCache(directory) if directory else None
+
+
+def get_cache():
+    """Return the active on-disk HTTP cache, or None if caching is disabled"""
+    return _cache
+
+
+def prune_cache():
+    """Drop cache entries unused for HTTP_CACHE_MAX_AGE and orphaned bodies"""
+    if _cache is None:
+        return
+    try:
+        entries, objects = _cache.prune(HTTP_CACHE_MAX_AGE)
+    except OSError as e:
+        log_error(f"Could not prune HTTP cache: {e}")
+        return
+    log_debug(f"Pruned {entries} HTTP cache entries and {objects} bodies")
+
+
+def _cached_response(response, entry, body):
+    """Turn a 304 Not Modified response into a 200 carrying the cached body"""
+    global _cache_hits
+    with _stats_lock:
+        _cache_hits += 1
+
+    cached = requests.Response()
+    cached.status_code = 200
+    cached._content = body
+    cached.headers = CaseInsensitiveDict(response.headers)
+    if entry.get("content_type"):
+        cached.headers["Content-Type"] = entry["content_type"]
+    cached.url = response.url
+    cached.request = response.request
+    cached.reason = "OK"
+    cached.from_cache = True
+    cached.rejected = None
+    return cached
+
+
+def get(
+    url,
+    headers=None,
+    timeout=None,
+    retries=None,
+    cache=False,
+    cancelled=None,
+    image=False,
+    max_bytes=None,
+    **kwargs,
+):
+    """
+    GET a URL through the shared session.
+
+    Each attempt first acquires a token from the per-host rate limiter;
+    network errors and 429/503 responses are retried.
+
+    Args:
+        url: URL to fetch
+        headers: Extra headers merged over the session defaults
+        timeout: Request timeout in seconds (default REQUEST_TIMEOUT)
+        retries: Number of attempts (default MAX_RETRIES)
+        cache: Revalidate against / store in the on-disk HTTP cache
+        cancelled: Optional threading.Event; once set, no further attempt
+            is sent (used to cancel the losers of a hedged fetch)
+        image: Stream the body and abort it early unless it is an image of
+            at most max_bytes (default MAX_IMAGE_BYTES); an aborted 200
+            response has an empty body and r.rejected set to the reason
+
+    Returns:
+        requests.Response with a from_cache attribute (True when the body
+        was served from disk after a 304)
+
+    Raises:
+        requests.RequestException: If every attempt failed or the request
+        was cancelled
+    """
+    session = get_session()
+    timeout = REQUEST_TIMEOUT if timeout is None else timeout
+    retries = MAX_RETRIES if retries is None else max(retries, 1)
+
+    cache = _cache if cache else None
+    entry = cache.lookup(url) if cache is not None else None
+    request_headers = headers
+    if entry is not None:
+        request_headers = {**(headers or {}), **conditional_headers(entry)}
+
+    limit = concurrency.limit_for(url)
+    for attempt in range(retries):
+        if cancelled is not None and cancelled.is_set():
+            raise requests.RequestException(f"Cancelled request for {url}")
+        if limit is not None and not limit.acquire(cancelled):
+            raise requests.RequestException(f"Cancelled request for {url}")
+        rate_limiter.acquire(url, cancelled)
+        if cancelled is not None and cancelled.is_set():
+            # Cancelled while waiting for a slot or a rate limit token
+            if limit is not None:
+                limit.release(abandoned=True)
+            raise requests.RequestException(f"Cancelled request for {url}")
+        start_time = time.perf_counter()
+        status_code = None
+        try:
+            try:
+                r = session.get(
+                    rewrite_url(url),
+                    headers=request_headers,
+                    timeout=timeout,
+                    stream=image,
+                    **kwargs,
+                )
+                status_code = r.status_code
+                if not image:
+                    size = len(r.content)
+                elif r.status_code == 200:
+                    size = _read_image(r, max_bytes or MAX_IMAGE_BYTES)
+                else:
+                    # Error pages of image requests are never looked at
+                    r.close()
+                    r._content, r._content_consumed = b"", True
+                    size = 0
+            finally:
+                if limit is not None:
+                    limit.release(time.perf_counter() - start_time, status_code)
+            record_fetch(url, time.perf_counter() - start_time, r.status_code, size)
+            r.rejected = getattr(r, "rejected", None)
+            if r.rejected is not None:
+                log_debug(f"Aborted image download {url}: {r.rejected}")
+            throttled = rate_limiter.report_response(url, r.status_code, r.headers)
+            if throttled and attempt < retries - 1:
+                log_debug(f"Throttled (HTTP {r.status_code}) on {url}, backing off")
+                continue
+
+            if entry is not None and r.status_code == 304:
+                body = cache.read_body(entry)
+                if body is not None:
+                    return _cached_response(r, entry, body)
+                # Cached body vanished - fetch it again unconditionally
+                return get(
+                    url,
+                    headers,
+                    timeout,
+                    retries,
+                    False,
+                    cancelled,
+                    image,
+                    max_bytes,
+                    **kwargs,
+                )
+
+            if cache is not None and r.status_code == 200 and r.rejected is None:
+                cache.store(url, r.content, r.headers)
+            r.from_cache = False
+            return r
+        except requests.RequestException as e:
+            record_fetch(url, time.perf_counter() - start_time)
+            if attempt < retries - 1:
+                log_debug(f"Retry {attempt + 1}/{retries} for {url}: {e}")
+                if cancelled is not None:
+                    cancelled.wait(RETRY_DELAY_BASE * (attempt + 1))
+                else:
+                    time.sleep(RETRY_DELAY_BASE * (attempt + 1))
+            else:
+                raise
+
+
+def latency_histogram():
+    """
+    Snapshot of the request latency histogram.
+
+    Returns:
+        dict: {"count", "cache_hits", "mean", "p50", "p95",
+        "buckets": [(upper_bound, count), ...]}
+    """
+    with _stats_lock:
+        samples = sorted(_latency_samples)
+        return {
+            "count": _request_count,
+            "cache_hits": _cache_hits,
+            "mean": _latency_total / max(_request_count, 1),
+            "p50": _percentile(samples, 0.50),
+            "p95": _percentile(samples, 0.95),
+            "buckets": list(zip(LATENCY_BUCKETS, _latency_counts)),
+        }
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    return samples[min(int(fraction * len(samples)), len(samples) - 1)]
+
+
+def format_latency_histogram():
+    """Render the latency histogram as printable lines"""
+    histogram = latency_histogram()
+    lines = [
+        f"Requests: {histogram['count']} ({histogram['cache_hits']} served from cache), mean latency: {histogram['mean'] * 1000:.1f}ms, p50: {histogram['p50'] * 1000:.1f}ms, p95: {histogram['p95'] * 1000:.1f}ms"
+    ]
+    total = max(histogram["count"], 1)
+    for upper, count in histogram["buckets"]:
+        label = "   +Inf" if upper == float("inf") else f"{upper:>6.2f}s"
+        bar = "#" * int(40 * count / total)
+        lines.append(f"  <= {label} {count:>7} {bar}")
+    return lines
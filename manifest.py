@@ -0,0 +1,202 @@
+"""
+Manifest of generated DDS files for incremental builds.
+
+For every card the manifest records the source image URLs and hashes plus
+the path and hash of both generated variants (standard and background).
+With --incremental, a card whose sources hash the same as last run and whose
+outputs are still on disk is not re-encoded, and a player whose page has not
+changed is skipped before any image is fetched. On a changed page, cards
+whose fingerprint (card id, team logo, event background and image URL) is
+the same as last run are skipped without fetching their images.
+"""
+
+import hashlib
+import json
+import sys
+import threading
+
+from atomic_file import write_atomic
+
+MANIFEST_VERSION = 1
+
+# Manifest used by the current run (None unless incremental mode is enabled)
+active_manifest = None
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def hash_bytes(data):
+    """Return the hex sha256 of a bytes object"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    """Return the hex sha256 of a file, or None if it cannot be read"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except OSError:
+        return None
+
+
+class Manifest:
+    """Thread-safe record of generated minifaces, persisted as JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.players = {}
+        self.cards = {}
+        self.dirty = False
+        self.load()
+
+    @staticmethod
+    def card_key(player_id, team, card_id):
+        return f"{player_id}/{team}/{card_id}"
+
+    def load(self):
+        """Load the manifest from disk, starting empty if it is missing or invalid"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log_error(f"Ignoring unreadable manifest {self.path}: {e}")
+            return
+
+        if data.get("version") != MANIFEST_VERSION:
+            log_error(f"Ignoring manifest {self.path} with unknown version")
+            return
+        self.players = data.get("players", {})
+        self.cards = data.get("cards", {})
+
+    def save(self):
+        """Atomically write the manifest to disk if it changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(
+                {
+                    "version": MANIFEST_VERSION,
+                    "players": self.players,
+                    "cards": self.cards,
+                },
+                sort_keys=True,
+            )
+            self.dirty = False
+
+        write_atomic(self.path, data)
+
+    def _outputs_intact(self, entry):
+        for output in entry.get("outputs", {}).values():
+            if hash_file(output["path"]) != output["hash"]:
+                return False
+        return bool(entry.get("outputs"))
+
+    def player_unchanged(self, player_id, page_hash):
+        """
+        Check whether a player page is identical to the last run.
+
+        True only if the page hashes the same and every card generated from
+        it still has intact outputs on disk.
+        """
+        with self.lock:
+            player = self.players.get(player_id)
+            if not player or player.get("page_hash") != page_hash:
+                return False
+            entries = [self.cards.get(key) for key in player.get("cards", [])]
+        return all(entry and self._outputs_intact(entry) for entry in entries)
+
+    def record_player(self, player_id, page_hash, card_keys):
+        """
+        Remember the page hash and the cards generated from it (cards with
+        nothing to generate have an empty key and are left out)
+        """
+        with self.lock:
+            self.players[player_id] = {
+                "page_hash": page_hash,
+                "cards": sorted(key for key in card_keys if key),
+            }
+            self.dirty = True
+
+    def card_unchanged(self, player_id, team, card_id, source_hash, background_hash):
+        """Check whether a card's sources match the last run and outputs are intact"""
+        with self.lock:
+            entry = self.cards.get(self.card_key(player_id, team, card_id))
+        if not entry:
+            return False
+        if (
+            entry.get("source_hash") != source_hash
+            or entry.get("background_hash") != background_hash
+        ):
+            return False
+        return self._outputs_intact(entry)
+
+    def card_fingerprint_unchanged(self, player_id, team, card_id, fingerprint):
+        """
+        Check whether a card parsed from a player page matches the last run.
+
+        Unlike card_unchanged this needs no downloaded image: the fingerprint
+        covers the card id, team logo, event background and image URL.
+        """
+        with self.lock:
+            entry = self.cards.get(self.card_key(player_id, team, card_id))
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return False
+        return self._outputs_intact(entry)
+
+    def record_fingerprint(self, player_id, team, card_id, fingerprint):
+        """Store the fingerprint of a card recorded without one"""
+        with self.lock:
+            entry = self.cards.get(self.card_key(player_id, team, card_id))
+            if entry is not None and entry.get("fingerprint") != fingerprint:
+                entry["fingerprint"] = fingerprint
+                self.dirty = True
+
+    def record_card(
+        self,
+        player_id,
+        team,
+        card_id,
+        source_url,
+        source_hash,
+        background_url,
+        background_hash,
+        outputs,
+        fingerprint=None,
+    ):
+        """
+        Record a generated card.
+
+        Args:
+            outputs: {"standard": path, "background": path} of written files
+            fingerprint: Card fingerprint from get_miniface.parse_card
+        """
+        entry = {
+            "player_id": player_id,
+            "team": team,
+            "card_id": card_id,
+            "fingerprint": fingerprint,
+            "source_url": source_url,
+            "source_hash": source_hash,
+            "background_url": background_url,
+            "background_hash": background_hash,
+            "outputs": {
+                variant: {"path": path, "hash": hash_file(path)}
+                for variant, path in outputs.items()
+            },
+        }
+        with self.lock:
+            self.cards[self.card_key(player_id, team, card_id)] = entry
+            self.dirty = True
+
+
+def enable(path):
+    """Load the manifest at path and make it the active one for this run"""
+    global active_manifest
+    active_manifest = Manifest(path)
+    return active_manifest
@@ -0,0 +1,203 @@
+"""
+Merge the output trees of sharded runs (script.py --shard i/N).
+
+Each shard directory is the working directory of one run and contains its
+MinifaceServer / MinifaceServer-Background trees and optionally its
+manifest. The merged trees and manifest are written to --output.
+
+When several shards produced the same DDS file, identical copies are kept
+once; differing copies are resolved in favour of the most recently written.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from manifest import Manifest, MANIFEST_VERSION
+from negative_cache import NegativeCache
+
+# Import configuration with fallbacks
+try:
+    from config import MANIFEST_PATH, NEGATIVE_CACHE_PATH
+except ImportError:
+    MANIFEST_PATH = "miniface_manifest.json"
+    NEGATIVE_CACHE_PATH = os.path.join(
+        "MinifaceServer", "content", "miniface-server", "skipped_players.txt"
+    )
+
+# Output directory paths (relative to each shard directory)
+OUTPUT_DIR_STANDARD = os.path.join("MinifaceServer", "content", "miniface-server")
+OUTPUT_DIR_BACKGROUND = os.path.join(
+    "MinifaceServer-Background", "content", "miniface-server"
+)
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Merge per-shard output trees and manifests into the final layout",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python merge_shards.py shard-0 shard-1 shard-2 shard-3
+  python merge_shards.py shards/* --output release
+        """,
+    )
+
+    parser.add_argument("shards", nargs="+", help="Shard working directories")
+
+    parser.add_argument(
+        "--output",
+        "-o",
+        default=".",
+        help="Directory receiving the merged trees (default: current directory)",
+    )
+
+    parser.add_argument(
+        "--quiet",
+        "-q",
+        action="store_true",
+        help="Quiet mode - only show errors and final summary",
+    )
+
+    return parser.parse_args()
+
+
+def file_hash(path):
+    """Return the sha256 of a file"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def merge_tree(shard_dirs, relative_root, output_dir, stats):
+    """
+    Copy the DDS files under relative_root from every shard into output_dir.
+
+    Returns:
+        dict: relative file path -> index of the shard whose copy was kept
+    """
+    winners = {}
+    for shard_index, shard_dir in enumerate(shard_dirs):
+        source_root = os.path.join(shard_dir, relative_root)
+        for dirpath, _, filenames in os.walk(source_root):
+            for filename in filenames:
+                if not filename.endswith(".dds"):
+                    continue
+                source = os.path.join(dirpath, filename)
+                relative = os.path.join(
+                    relative_root, os.path.relpath(source, source_root)
+                )
+                target = os.path.join(output_dir, relative)
+
+                if os.path.abspath(source) == os.path.abspath(target):
+                    winners[relative] = shard_index
+                    continue
+
+                if relative in winners:
+                    if file_hash(source) == file_hash(target):
+                        stats["duplicates"] += 1
+                        continue
+                    stats["conflicts"] += 1
+                    if os.path.getmtime(source) <= os.path.getmtime(target):
+                        continue
+
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(source, target)
+                winners[relative] = shard_index
+                stats["files"] += 1
+    return winners
+
+
+def load_manifest_data(path):
+    """Load a shard manifest, returning empty data if it is missing"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {"players": {}, "cards": {}}
+    except (OSError, ValueError) as e:
+        log_error(f"Ignoring unreadable manifest {path}: {e}")
+        return {"players": {}, "cards": {}}
+    if data.get("version") != MANIFEST_VERSION:
+        log_error(f"Ignoring manifest {path} with unknown version")
+        return {"players": {}, "cards": {}}
+    return data
+
+
+def merge_manifests(shard_dirs, output_dir, winners):
+    """
+    Merge shard manifests, keeping for each card the entry of the shard whose
+    standard output file won the tree merge.
+    """
+    merged = Manifest(os.path.join(output_dir, MANIFEST_PATH))
+    for shard_index, shard_dir in enumerate(shard_dirs):
+        data = load_manifest_data(os.path.join(shard_dir, MANIFEST_PATH))
+        for key, entry in data.get("cards", {}).items():
+            standard = entry.get("outputs", {}).get("standard", {}).get("path")
+            winner = winners.get(os.path.normpath(standard)) if standard else None
+            if winner is not None and winner != shard_index:
+                continue
+            merged.cards[key] = entry
+        for player_id, player in data.get("players", {}).items():
+            merged.players.setdefault(player_id, player)
+    merged.dirty = True
+    merged.save()
+    return len(merged.cards)
+
+
+def merge_skip_lists(shard_dirs, output_dir):
+    """Combine the skip lists (negative caches) of all shards"""
+    merged = NegativeCache()
+    for shard_dir in shard_dirs:
+        merged.merge(NegativeCache(os.path.join(shard_dir, NEGATIVE_CACHE_PATH)))
+    stats = merged.stats()
+    if stats["missing"] or stats["sources"]:
+        merged.save(os.path.join(output_dir, NEGATIVE_CACHE_PATH))
+    return stats["missing"]
+
+
+def main():
+    """Merge all shard directories into the output directory"""
+    args = parse_arguments()
+    start_time = time.time()
+
+    shard_dirs = [shard for shard in args.shards if os.path.isdir(shard)]
+    for shard in set(args.shards) - set(shard_dirs):
+        log_error(f"Shard directory not found: {shard}")
+    if not shard_dirs:
+        log_error("No shard directories to merge")
+        sys.exit(1)
+
+    os.makedirs(args.output, exist_ok=True)
+    stats = {"files": 0, "duplicates": 0, "conflicts": 0}
+    winners = {}
+    for relative_root in (OUTPUT_DIR_STANDARD, OUTPUT_DIR_BACKGROUND):
+        if not args.quiet:
+            print(f"Merging {relative_root} from {len(shard_dirs)} shards...")
+        winners.update(merge_tree(shard_dirs, relative_root, args.output, stats))
+
+    cards = merge_manifests(shard_dirs, args.output, winners)
+    if NEGATIVE_CACHE_PATH:
+        missing = merge_skip_lists(shard_dirs, args.output)
+    else:
+        missing = 0
+
+    print(
+        f"\n🎉 Merged {len(shard_dirs)} shards in {time.time() - start_time:.2f}s: "
+        f"{stats['files']} files copied, {stats['duplicates']} identical duplicates, "
+        f"{stats['conflicts']} conflicts resolved, {cards} manifest entries, "
+        f"{missing} missing images in the skip list"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Per-stage run metrics.
+
+Every stage of a run (league discovery, page and image fetches, decode,
+composite, DDS encode, disk write) records how often it ran, how often it
+failed, how many bytes it handled and a histogram of how long it took. At
+the end of a run the counters are written as a JSON report and, optionally,
+in the Prometheus text format (e.g. for the node exporter's textfile
+collector).
+
+Encode workers running in separate processes record into their own copy;
+encoder.py ships it back with every result and merges it here.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from atomic_file import write_atomic
+
+# Stages in pipeline order (the report lists them in this order)
+STAGES = (
+    "league_discovery",
+    "team_page",
+    "player_page",
+    "image_fetch",
+    "fallback_fetch",
+    "decode",
+    "composite",
+    "encode",
+    "write",
+)
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+STAGE_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    float("inf"),
+)
+
+
+def _empty_stage():
+    return {
+        "count": 0,
+        "errors": 0,
+        "bytes": 0,
+        "seconds": 0.0,
+        "buckets": [0] * len(STAGE_BUCKETS),
+    }
+
+
+class Metrics:
+    """Thread-safe counters, byte totals and latency histograms per stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, stage, seconds, nbytes=0, ok=True):
+        """Record one operation of a stage"""
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = _empty_stage()
+            entry["count"] += 1
+            entry["errors"] += not ok
+            entry["bytes"] += nbytes
+            entry["seconds"] += seconds
+            for index, upper in enumerate(STAGE_BUCKETS):
+                if seconds <= upper:
+                    entry["buckets"][index] += 1
+                    break
+
+    @contextmanager
+    def timed(self, stage, nbytes=0):
+        """Time the enclosed block as one operation (an exception counts as an error)"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record(stage, time.perf_counter() - start_time, nbytes, ok=False)
+            raise
+        self.record(stage, time.perf_counter() - start_time, nbytes)
+
+    def snapshot(self):
+        """Return a copy of every stage's counters"""
+        with self.lock:
+            return {
+                stage: dict(entry, buckets=list(entry["buckets"]))
+                for stage, entry in self.stages.items()
+            }
+
+    def drain(self):
+        """Return the counters and reset them (used by encode worker processes)"""
+        with self.lock:
+            stages, self.stages = self.stages, {}
+        return stages
+
+    def merge(self, stages):
+        """Add counters returned by drain() in another process"""
+        with self.lock:
+            for stage, other in stages.items():
+                entry = self.stages.get(stage)
+                if entry is None:
+                    entry = self.stages[stage] = _empty_stage()
+                for key in ("count", "errors", "bytes", "seconds"):
+                    entry[key] += other[key]
+                entry["buckets"] = [
+                    a + b for a, b in zip(entry["buckets"], other["buckets"])
+                ]
+
+    def ordered(self):
+        """Snapshot as (stage, counters) pairs in pipeline order"""
+        stages = self.snapshot()
+        order = [stage for stage in STAGES if stage in stages]
+        order += sorted(set(stages) - set(STAGES))
+        return [(stage, stages[stage]) for stage in order]
+
+    def report(self, run=None):
+        """
+        Build the JSON report.
+
+        Args:
+            run: Optional dict of run-level values (elapsed, players, ...)
+        """
+        stages = {}
+        for stage, entry in self.ordered():
+            stages[stage] = {
+                "count": entry["count"],
+                "errors": entry["errors"],
+                "bytes": entry["bytes"],
+                "seconds": entry["seconds"],
+                "mean": entry["seconds"] / max(entry["count"], 1),
+                "buckets": [
+                    ["+Inf" if upper == float("inf") else upper, count]
+                    for upper, count in zip(STAGE_BUCKETS, entry["buckets"])
+                ],
+            }
+        return {"run": run or {}, "stages": stages}
+
+    def write_json(self, path, run=None):
+        """Write the JSON report"""
+        write_atomic(path, json.dumps(self.report(run), indent=2))
+
+    def prometheus_text(self, run=None):
+        """Render the counters in the Prometheus text exposition format"""
+        lines = []
+        for name, key, kind, help_text in (
+            (
+                "miniface_stage_operations_total",
+                "count",
+                "counter",
+                "Operations per stage",
+            ),
+            (
+                "miniface_stage_errors_total",
+                "errors",
+                "counter",
+                "Failed operations per stage",
+            ),
+            (
+                "miniface_stage_bytes_total",
+                "bytes",
+                "counter",
+                "Bytes handled per stage",
+            ),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, entry in self.ordered():
+                lines.append(f'{name}{{stage="{stage}"}} {entry[key]}')
+
+        name = "miniface_stage_duration_seconds"
+        lines.append(f"# HELP {name} Duration of stage operations")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, entry in self.ordered():
+            cumulative = 0
+            for upper, count in zip(STAGE_BUCKETS, entry["buckets"]):
+                cumulative += count
+                le = "+Inf" if upper == float("inf") else f"{upper:g}"
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {entry["seconds"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {entry["count"]}')
+
+        for key, value in (run or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE miniface_run_{key} gauge")
+                lines.append(f"miniface_run_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, run=None):
+        """Write the Prometheus text file (atomically, as collectors expect)"""
+        write_atomic(path, self.prometheus_text(run))
+
+    def format_stats(self):
+        """Return one printable line per stage"""
+        return [
+            f"{stage}: {entry['count']} ops, {entry['errors']} errors, "
+            f"{entry['bytes'] / 1048576:.1f} MiB, {entry['seconds']:.2f}s total, "
+            f"{entry['seconds'] / max(entry['count'], 1) * 1000:.1f}ms mean"
+            for stage, entry in self.ordered()
+        ]
+
+
+# Metrics shared by every thread of this process
+run_metrics = Metrics()
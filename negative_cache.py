@@ -0,0 +1,247 @@
+"""
+Persisted negative cache of card images (skipped_players.txt).
+
+Image URLs that answered 404/410 or a soft-404 HTML page are remembered with
+their status, when they were first and last seen missing and a retry
+horizon. Until that horizon has passed the URL is not requested again; each
+further miss doubles the horizon (up to NEGATIVE_CACHE_MAX_RETRY). For every
+card image served by one of the efootballhub.net mirrors that mirror is
+remembered too, so the fallback chain starts there instead of re-probing
+pesmaster.
+
+The file is tab-separated text, one record per line, sorted for stable
+diffs (the GitHub workflows commit it):
+
+    missing <url> <status> <misses> <first seen> <last seen> <retry after>
+    source  <card image url> <mirror that last served it> <last seen>
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from atomic_file import write_atomic
+
+# Import configuration with fallbacks
+try:
+    from config import NEGATIVE_CACHE_RETRY, NEGATIVE_CACHE_MAX_RETRY
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    NEGATIVE_CACHE_RETRY = 7 * 24 * 3600
+    NEGATIVE_CACHE_MAX_RETRY = 90 * 24 * 3600
+
+HEADER = (
+    "# Machine-maintained skip list (negative_cache.py), do not edit by hand\n"
+    "# missing<TAB>url<TAB>status<TAB>misses<TAB>first seen<TAB>last seen<TAB>retry after\n"
+    "# source<TAB>card image url<TAB>mirror that last served it<TAB>last seen\n"
+)
+
+# Negative cache used by the current run (None if disabled)
+active_cache = None
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def format_time(timestamp):
+    """Format a Unix timestamp as ISO 8601 UTC"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+
+def parse_time(text):
+    """Parse a timestamp written by format_time"""
+    return (
+        datetime.strptime(text, "%Y-%m-%dT%H:%M:%SZ")
+        .replace(tzinfo=timezone.utc)
+        .timestamp()
+    )
+
+
+class NegativeCache:
+    """Thread-safe record of missing image URLs and last good sources"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        # url -> {"status", "misses", "first_seen", "last_seen", "retry_after"}
+        self.missing = {}
+        # card image url -> (mirror that last served it, last seen)
+        self.sources = {}
+        self.dirty = False
+        self.skips = 0
+        if path:
+            self.load()
+
+    def load(self, path=None):
+        """Add the records of a skip list file (missing files are ignored)"""
+        path = path or self.path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            log_error(f"Could not read skip list {path}: {e}")
+            return
+
+        with self.lock:
+            for line in lines:
+                if not line or line.startswith("#"):
+                    continue
+                fields = line.split("\t")
+                try:
+                    if fields[0] == "missing" and len(fields) == 7:
+                        self._merge_missing(
+                            fields[1],
+                            {
+                                "status": fields[2],
+                                "misses": int(fields[3]),
+                                "first_seen": parse_time(fields[4]),
+                                "last_seen": parse_time(fields[5]),
+                                "retry_after": parse_time(fields[6]),
+                            },
+                        )
+                    elif fields[0] == "source" and len(fields) == 4:
+                        self._merge_source(fields[1], fields[2], parse_time(fields[3]))
+                except ValueError:
+                    log_error(f"Ignoring malformed skip list line in {path}: {line}")
+
+    def _merge_missing(self, url, entry):
+        current = self.missing.get(url)
+        if current is None or entry["last_seen"] > current["last_seen"]:
+            if current is not None:
+                entry["first_seen"] = min(entry["first_seen"], current["first_seen"])
+            self.missing[url] = entry
+
+    def _merge_source(self, url, source, last_seen):
+        current = self.sources.get(url)
+        if current is None or last_seen > current[1]:
+            self.sources[url] = (source, last_seen)
+
+    def is_missing(self, url, now=None):
+        """Check whether url is known to be missing and not due for a retry"""
+        now = time.time() if now is None else now
+        with self.lock:
+            entry = self.missing.get(url)
+            return entry is not None and now < entry["retry_after"]
+
+    def sources_to_try(self, url, sources):
+        """
+        Order the sources of a card image for this run.
+
+        Args:
+            url: Card image URL (the first of sources)
+            sources: url followed by its fallback mirrors
+
+        Returns:
+            List of sources to request: the one that last served the image
+            first, then the others, without those known to be missing
+        """
+        now = time.time()
+        with self.lock:
+            preferred = self.sources.get(url)
+        ordered = list(sources)
+        if preferred is not None and preferred[0] in ordered:
+            ordered.remove(preferred[0])
+            ordered.insert(0, preferred[0])
+        remaining = [source for source in ordered if not self.is_missing(source, now)]
+        if len(remaining) < len(ordered):
+            with self.lock:
+                self.skips += len(ordered) - len(remaining)
+        return remaining
+
+    def record_missing(self, url, status):
+        """Remember that url answered with a 404/410 or an HTML page"""
+        now = time.time()
+        with self.lock:
+            entry = self.missing.get(url)
+            misses = entry["misses"] + 1 if entry else 1
+            self.missing[url] = {
+                "status": str(status),
+                "misses": misses,
+                "first_seen": entry["first_seen"] if entry else now,
+                "last_seen": now,
+                "retry_after": now
+                + min(
+                    NEGATIVE_CACHE_RETRY * 2 ** (misses - 1), NEGATIVE_CACHE_MAX_RETRY
+                ),
+            }
+            self.dirty = True
+
+    def record_found(self, url, source):
+        """Remember the source that served a card image"""
+        now = time.time()
+        with self.lock:
+            if self.missing.pop(source, None) is not None:
+                self.dirty = True
+            current = self.sources.get(url)
+            if source == url:
+                # pesmaster is tried first anyway; only mirrors are recorded
+                if current is not None:
+                    del self.sources[url]
+                    self.dirty = True
+            elif current is None or current[0] != source:
+                # Only a change of source is worth a new line in the file
+                self.sources[url] = (source, now)
+                self.dirty = True
+
+    def merge(self, other):
+        """Add the records of another cache (e.g. of another shard)"""
+        with other.lock:
+            missing = {url: dict(entry) for url, entry in other.missing.items()}
+            sources = dict(other.sources)
+        with self.lock:
+            for url, entry in missing.items():
+                self._merge_missing(url, entry)
+            for url, (source, last_seen) in sources.items():
+                self._merge_source(url, source, last_seen)
+            self.dirty = True
+
+    def stats(self):
+        """Known missing URLs, remembered sources and requests skipped this run"""
+        with self.lock:
+            return {
+                "missing": len(self.missing),
+                "sources": len(self.sources),
+                "skips": self.skips,
+            }
+
+    def save(self, path=None):
+        """Atomically write the skip list if it changed"""
+        path = path or self.path
+        with self.lock:
+            if not self.dirty or not path:
+                return
+            lines = [
+                "\t".join(
+                    (
+                        "missing",
+                        url,
+                        entry["status"],
+                        str(entry["misses"]),
+                        format_time(entry["first_seen"]),
+                        format_time(entry["last_seen"]),
+                        format_time(entry["retry_after"]),
+                    )
+                )
+                for url, entry in sorted(self.missing.items())
+            ]
+            lines += [
+                "\t".join(("source", url, source, format_time(last_seen)))
+                for url, (source, last_seen) in sorted(self.sources.items())
+            ]
+            self.dirty = False
+
+        write_atomic(path, HEADER + "".join(line + "\n" for line in lines))
+
+
+def enable(path):
+    """Load the skip list at path and make it the active cache for this run"""
+    global active_cache
+    active_cache = NegativeCache(path)
+    return active_cache
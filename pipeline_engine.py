@@ -0,0 +1,519 @@
+"""
+Streaming pipeline crawl engine (script.py --engine pipeline).
+
+The threaded engine nests its pools: a league waits for all of its teams and
+a team for all of its players, so a few slow teams leave most workers idle
+and leagues run one at a time. Here the crawl is split into independent
+stages connected by bounded queues:
+
+    leagues -> teams -> players -> images -> encode stage (encoder.py)
+
+Each stage has its own worker threads and pulls the next item as soon as it
+is free, across league and team boundaries. A full queue blocks the stage
+feeding it, so memory stays bounded however large a league is.
+
+Completion is tracked per league, team and player (a Unit counts its
+outstanding children), so the checkpoint journal and the manifest are
+updated exactly as in the other engines.
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+
+import requests
+
+import discovery
+import http_client
+import manifest
+from get_miniface import (
+    encode_succeeded,
+    find_player_cards,
+    parse_card,
+    save_card_images,
+    unchanged_card_key,
+    download_image,
+    get_card_event,
+)
+from players_in_team import players_in_team
+from teams import teams_urls_scrapper
+
+# Import configuration with fallbacks
+try:
+    from config import REQUEST_TIMEOUT, PIPELINE_WORKERS, PIPELINE_QUEUE_SIZE
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    REQUEST_TIMEOUT = 30
+    PIPELINE_WORKERS = {"leagues": 2, "teams": 4, "players": 16, "images": 32}
+    PIPELINE_QUEUE_SIZE = 1000
+
+# Marks the end of a stage's input
+_STOP = object()
+
+
+def log_error(message):
+    """Always print error messages"""
+    print(f"[ERROR] {message}", file=sys.stderr)
+
+
+def log_debug(message):
+    """Print debug messages only if in debug mode"""
+    if os.getenv("DEBUG") or globals().get("DEBUG", False):
+        print(f"[DEBUG] {message}")
+
+
+def when_encoded(encodes, callback):
+    """Call callback(ok) once every encode future has finished"""
+    lock = threading.Lock()
+    remaining = [len(encodes)]
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            callback(all(map(encode_succeeded, encodes)))
+
+    for future in encodes:
+        future.add_done_callback(on_done)
+
+
+class Unit:
+    """
+    A league, team or player that completes once all of its children have.
+
+    A unit that finishes without failures is marked done in the checkpoint
+    journal. Either way it reports to its parent exactly once, even if it
+    is failed early while some of its children are still running.
+    """
+
+    def __init__(self, kind, key, parent=None, name=None, on_finish=None):
+        self.kind = kind
+        self.key = key
+        self.parent = parent
+        self.name = name or key
+        self.on_finish = on_finish
+        self.lock = threading.Lock()
+        self.remaining = 0
+        self.total = 0
+        self.successful = 0
+        self.failed = False
+        self.finished = False
+        self.result = None
+        self.followers = []
+        self.start_time = time.time()
+        self.page_hash = None
+        self.card_keys = []
+
+    def expand(self, count):
+        """Set the number of children; a unit without children finishes now"""
+        with self.lock:
+            self.remaining = self.total = count
+        if count == 0:
+            self.finish()
+
+    def child_done(self, ok=True):
+        """Record a finished child, finishing this unit after the last one"""
+        with self.lock:
+            self.remaining -= 1
+            if ok:
+                self.successful += 1
+            else:
+                self.failed = True
+            last = self.remaining == 0
+        if last:
+            self.finish()
+
+    def follow(self, unit):
+        """
+        Finish together with unit, the same player listed by another team,
+        so this team does not count as done before the player's files are
+        on disk.
+        """
+        self.expand(1)
+        with unit.lock:
+            if unit.result is None:
+                unit.followers.append(self)
+                return
+            ok = unit.result
+        self.child_done(ok)
+
+    def fail(self):
+        """Finish this unit unsuccessfully (its work could not be discovered)"""
+        self.failed = True
+        self.finish()
+
+    def finish(self):
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+            ok = not self.failed
+        if ok:
+            try:
+                if (
+                    self.kind == "player"
+                    and self.page_hash
+                    and None not in self.card_keys
+                ):
+                    manifest.active_manifest.record_player(
+                        self.key, self.page_hash, self.card_keys
+                    )
+                if self.kind == "league":
+                    discovery.finish_league(self.key)
+                elif self.kind == "team":
+                    discovery.finish_team(self.key, ok)
+                else:
+                    discovery.mark_done(self.kind, self.key)
+            except Exception as e:
+                log_error(f"Could not record {self.kind} {self.name} as done: {e}")
+                ok = False
+        try:
+            if self.on_finish is not None:
+                self.on_finish(self, ok)
+        finally:
+            with self.lock:
+                self.result = ok
+                followers, self.followers = self.followers, []
+            for follower in followers:
+                follower.child_done(ok)
+            # The parent must hear back, or run() would wait forever
+            if self.parent is not None:
+                self.parent.child_done(ok)
+
+
+class Stage:
+    """A pool of worker threads consuming one bounded queue"""
+
+    def __init__(self, name, handler, workers, output=None, on_error=None):
+        """
+        Args:
+            name: Stage name (used for thread names)
+            handler: Function called as handler(item, emit) for every item
+            workers: Number of worker threads
+            output: Queue items passed to emit are put on (None for the last stage)
+            on_error: Function called with an item whose handler raised, to
+                fail the unit it belongs to
+        """
+        self.name = name
+        self.handler = handler
+        self.on_error = on_error
+        self.workers = max(1, workers)
+        self.input = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.output = output
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def _emit(self, item):
+        # Blocks while the next stage is backed up
+        self.output.put(item)
+
+    def _work(self):
+        while True:
+            item = self.input.get()
+            if item is _STOP:
+                return
+            try:
+                self.handler(item, self._emit)
+            except Exception as e:
+                log_error(f"Unexpected error in {self.name} stage: {e}")
+                if self.on_error is not None:
+                    try:
+                        self.on_error(item)
+                    except Exception as e:
+                        log_error(f"Could not fail item of {self.name} stage: {e}")
+
+    def close(self):
+        """Stop the workers once the queue is drained"""
+        for _ in self.threads:
+            self.input.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+
+class PipelineCrawler:
+    """Stage-per-level crawler connected by bounded queues"""
+
+    def __init__(
+        self,
+        done_players,
+        output_dir_standard,
+        output_dir_background,
+        alternate_offsets=None,
+        shard=None,
+        quiet=False,
+        workers=None,
+    ):
+        self.done_players = done_players
+        self.done_players_lock = threading.Lock()
+        # Player ID -> unit of the first listing processed in this run
+        self.players = {}
+        self.output_dir_standard = output_dir_standard
+        self.output_dir_background = output_dir_background
+        self.alternate_offsets = alternate_offsets or []
+        self.shard = shard
+        self.quiet = quiet
+        self.workers = dict(PIPELINE_WORKERS, **(workers or {}))
+
+        self.successful_leagues = 0
+        # Leagues whose teams are still in the pipeline or the encode stage
+        self.open_leagues = 0
+        self.stats_lock = threading.Condition()
+
+    def on_league_finished(self, league, ok):
+        elapsed_time = time.time() - league.start_time
+        with self.stats_lock:
+            self.successful_leagues += ok
+            self.open_leagues -= 1
+            self.stats_lock.notify_all()
+        if not self.quiet:
+            print(
+                f"✓ Completed League {league.name} in {elapsed_time:.2f}s ({league.successful}/{league.total} teams successful)"
+            )
+
+    def process_league(self, item, emit):
+        """League URL -> outstanding team units"""
+        league_counter, league_url, league_name, total = item
+        try:
+            teams_urls = self.discover_teams(
+                league_counter, league_url, league_name, total
+            )
+        except Exception as e:
+            log_error(f"Error processing league {league_name}: {e}")
+            return
+        if teams_urls is None:
+            return
+
+        league = Unit(
+            "league", league_url, name=league_name, on_finish=self.on_league_finished
+        )
+        with self.stats_lock:
+            self.open_leagues += 1
+        try:
+            league.expand(len(teams_urls))
+            for team_url in teams_urls:
+                emit(Unit("team", team_url, parent=league))
+        except Exception:
+            league.fail()
+            raise
+
+    def discover_teams(self, league_counter, league_url, league_name, total):
+        """
+        Return the outstanding team URLs of a league, or None if there is
+        nothing to process.
+        """
+        if not self.quiet:
+            print(f"\nStarted League ({league_counter + 1}/{total}): {league_name}")
+
+        if discovery.is_done("league", league_url):
+            log_debug(f"Skipped League {league_name} (completed in a previous run)")
+            with self.stats_lock:
+                self.successful_leagues += 1
+            return None
+
+        teams_urls = discovery.recorded_teams(league_url)
+        if teams_urls is None:
+            teams_urls = discovery.record_teams(
+                league_url,
+                league_name,
+                teams_urls_scrapper(league_url),
+                self.alternate_offsets,
+                self.shard,
+            )
+            if teams_urls is None:
+                return None
+        return discovery.outstanding_teams(league_name, teams_urls)
+
+    def process_team(self, team, emit):
+        """Team unit -> player units"""
+        try:
+            players_urls = discovery.recorded_players(team.key)
+            if players_urls is None:
+                players_urls = discovery.record_players(
+                    team.key, players_in_team(team.key)
+                )
+        except Exception as e:
+            log_error(f"Error processing team {team.key}: {e}")
+            players_urls = None
+
+        if not players_urls:
+            log_debug(f"No players found for team {team.key}")
+            team.fail()
+            return
+
+        team.expand(len(players_urls))
+        for player_url in players_urls:
+            player_id = str(player_url.split("/player/")[-1].split("/")[0])
+            # Players are keyed by ID; the name holds the page URL
+            emit(Unit("player", player_id, parent=team, name=player_url))
+
+    def process_player(self, player, emit):
+        """Player unit -> (player, card) pairs"""
+        player_id = player.key
+        with self.done_players_lock:
+            first = self.players.get(player_id)
+            done_before = first is None and player_id in self.done_players
+            if first is None and not done_before:
+                self.players[player_id] = player
+                self.done_players.add(player_id)
+        if first is not None:
+            log_debug(f"Waiting for {player_id} (listed by another team)")
+            player.follow(first)
+            return
+        if done_before:
+            log_debug(f"Skipped {player_id} (completed in a previous run)")
+            player.expand(0)
+            return
+
+        try:
+            r = http_client.get(player.name, timeout=REQUEST_TIMEOUT, cache=True)
+            # An error page would parse as "no cards" and be journaled as done
+            r.raise_for_status()
+            cards = find_player_cards(r.content)
+        except requests.RequestException as e:
+            log_error(f"Request error for player {player.name}: {e}")
+            player.fail()
+            return
+        except Exception as e:
+            log_error(f"Error processing player {player.name}: {e}")
+            player.fail()
+            return
+
+        if manifest.active_manifest is not None:
+            player.page_hash = manifest.hash_bytes(r.content)
+            if manifest.active_manifest.player_unchanged(player_id, player.page_hash):
+                log_debug(f"Skipped {player_id} (unchanged since last run)")
+                player.page_hash = None
+                player.expand(0)
+                return
+
+        if not cards:
+            log_debug(f"No efootball-2022 cards found for player {player_id}")
+            player.page_hash = None
+            player.expand(0)
+            return
+
+        player.expand(len(cards))
+        for card in cards:
+            emit((player, card))
+
+    def process_card(self, item, emit):
+        """Download the images of a card and queue it on the encode stage"""
+        player, card = item
+        try:
+            image_dict, image_download_tasks = parse_card(card)
+            encodes = []
+            card_key = unchanged_card_key(image_dict, player.key)
+            if card_key is None:
+                for img_type, url, name in image_download_tasks:
+                    if img_type == "main":
+                        image_dict["bytes"] = download_image(url)
+                    else:
+                        image_dict["background_bytes"] = get_card_event(name, url)
+
+                card_key = save_card_images(
+                    image_dict,
+                    player.key,
+                    self.output_dir_standard,
+                    self.output_dir_background,
+                    encodes,
+                )
+        except Exception as e:
+            log_error(f"Error processing card of player {player.key}: {e}")
+            player.child_done(False)
+            return
+
+        with player.lock:
+            player.card_keys.append(card_key)
+        if card_key is None:
+            # An image could not be fetched, so the card was not generated
+            player.child_done(False)
+        elif encodes:
+            # The player completes once all of its files are on disk
+            when_encoded(encodes, player.child_done)
+        else:
+            player.child_done(True)
+
+    def run(self, leagues_urls, leagues_names):
+        """Stream every league through the pipeline and return the number that succeeded"""
+        images = Stage(
+            "images",
+            self.process_card,
+            self.workers["images"],
+            on_error=lambda item: item[0].child_done(False),
+        )
+        players = Stage(
+            "players",
+            self.process_player,
+            self.workers["players"],
+            images.input,
+            on_error=Unit.fail,
+        )
+        teams = Stage(
+            "teams",
+            self.process_team,
+            self.workers["teams"],
+            players.input,
+            on_error=Unit.fail,
+        )
+        leagues = Stage(
+            "leagues", self.process_league, self.workers["leagues"], teams.input
+        )
+        stages = [leagues, teams, players, images]
+        for stage in stages:
+            stage.start()
+
+        for counter, league_url in enumerate(leagues_urls):
+            leagues.input.put(
+                (counter, league_url, leagues_names[counter], len(leagues_urls))
+            )
+
+        # Each stage's input is complete once the stage before it has stopped
+        for stage in stages:
+            stage.close()
+
+        # The last cards may still be encoding
+        with self.stats_lock:
+            while self.open_leagues:
+                self.stats_lock.wait()
+        return self.successful_leagues
+
+
+def run_pipeline_engine(
+    leagues_urls,
+    leagues_names,
+    done_players,
+    output_dir_standard,
+    output_dir_background,
+    alternate_offsets=None,
+    shard=None,
+    quiet=False,
+    workers=None,
+):
+    """
+    Run the pipeline engine to completion.
+
+    Args:
+        workers: Optional per-stage worker counts overriding PIPELINE_WORKERS
+
+    Returns:
+        int: Number of leagues processed successfully
+    """
+    crawler = PipelineCrawler(
+        done_players,
+        output_dir_standard,
+        output_dir_background,
+        alternate_offsets=alternate_offsets,
+        shard=shard,
+        quiet=quiet,
+        workers=workers,
+    )
+    return crawler.run(leagues_urls, leagues_names)
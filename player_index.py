@@ -0,0 +1,114 @@
+"""
+Global index of the players listed on team pages.
+
+The same player is listed by their club, national and alternate national
+teams. script.py (threads engine) therefore reads every team page of the
+run first and records, per player ID, the teams and leagues listing them;
+only then is each unique player page fetched - exactly once. The index is
+written as JSON after the discovery pass, for incremental runs and
+reporting.
+"""
+
+import json
+import threading
+
+from atomic_file import write_atomic
+
+INDEX_VERSION = 1
+
+
+def player_id_from_url(player_url):
+    """Return the player ID of a .../player/<id>/ URL"""
+    return str(player_url.split("/player/")[-1].split("/")[0])
+
+
+def team_id_from_url(team_url):
+    """Return the team ID of a .../team/<id>/ URL"""
+    return str(team_url.rstrip("/").split("/team/")[-1])
+
+
+class PlayerIndex:
+    """Thread-safe player ID -> (page URL, team IDs, leagues) mapping"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.players = {}
+        self.teams = {}
+        self.listings = 0
+
+    def add_team(self, team_url, league_name, players_urls):
+        """
+        Record the players listed on a team page.
+
+        Returns:
+            List of player IDs that were not in the index yet
+        """
+        team_id = team_id_from_url(team_url)
+        new_players = []
+        with self.lock:
+            if team_url in self.teams:
+                return new_players
+            team_players = self.teams[team_url] = []
+            for player_url in players_urls:
+                player_id = player_id_from_url(player_url)
+                entry = self.players.get(player_id)
+                if entry is None:
+                    entry = self.players[player_id] = {
+                        "url": player_url,
+                        "teams": set(),
+                        "leagues": set(),
+                    }
+                    new_players.append(player_id)
+                entry["teams"].add(team_id)
+                entry["leagues"].add(league_name)
+                team_players.append(player_id)
+                self.listings += 1
+        return new_players
+
+    def url(self, player_id):
+        """Return the page URL of an indexed player"""
+        with self.lock:
+            return self.players[player_id]["url"]
+
+    def player_ids(self):
+        """Return the IDs of every indexed player"""
+        with self.lock:
+            return list(self.players)
+
+    def team_players(self, team_url):
+        """Return the player IDs listed on a team page"""
+        with self.lock:
+            return list(self.teams.get(team_url, ()))
+
+    def stats(self):
+        """Unique players, team pages and player listings seen so far"""
+        with self.lock:
+            return {
+                "players": len(self.players),
+                "teams": len(self.teams),
+                "listings": self.listings,
+            }
+
+    def save(self, path):
+        """Atomically write the index as JSON"""
+        with self.lock:
+            data = json.dumps(
+                {
+                    "version": INDEX_VERSION,
+                    "players": {
+                        player_id: {
+                            "url": entry["url"],
+                            "teams": sorted(entry["teams"]),
+                            "leagues": sorted(entry["leagues"]),
+                        }
+                        for player_id, entry in self.players.items()
+                    },
+                    "teams": {
+                        team_id_from_url(team_url): players
+                        for team_url, players in self.teams.items()
+                    },
+                },
+                sort_keys=True,
+            )
+
+        write_atomic(path, data)
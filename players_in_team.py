@@ -1,14 +1,9 @@
 import requests
-from bs4 import BeautifulSoup as bs
+import http_client
+from html_parsing import parse_html
 import sys
-import time
-
-headers = {
-    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36"
-}
 
 REQUEST_TIMEOUT = 30  # Timeout for requests
-REQUEST_DELAY = 0.05  # Small delay to be respectful
 
 
 def log_error(message):
@@ -24,6 +19,48 @@ def log_debug(message):
         print(f"[DEBUG] {message}")
 
 
+def parse_players_in_team(content, url=""):
+    """
+    Extract unique player URLs from the HTML of a team page.
+
+    Args:
+        content: Raw HTML of the team page
+        url: Team URL, only used for error messages
+
+    Returns:
+        List of absolute player URLs
+    """
+    all_players = []
+    seen = set()
+    soup = parse_html(content, "div", "player-card-container")
+    players_div = soup.find_all("div", attrs={"class": "player-card-container"})
+
+    if len(players_div) == 5:
+        for counter, players in enumerate(players_div):
+            if counter == 4:
+                players_url = players.find_all("a")
+                for player_url in players_url:
+                    try:
+                        original_link = player_url.get_attribute_list("href")[
+                            0
+                        ].split("/player/")
+                        real_player_id = str(
+                            int(
+                                hex(int(original_link[-1].replace("/", "")))[-5:],
+                                base=16,
+                            )
+                        )
+                        final_url = f"https://www.pesmaster.com{original_link[0]}/player/{real_player_id}/"
+                        if final_url not in seen:
+                            seen.add(final_url)
+                            all_players.append(final_url)
+                    except (ValueError, IndexError) as e:
+                        log_error(f"Error processing player URL in team {url}: {e}")
+                        continue
+
+    return all_players
+
+
 def players_in_team(url):
     """
     Optimized version with better error handling and timeouts
@@ -31,34 +68,10 @@ def players_in_team(url):
     all_players = []
 
     try:
-        time.sleep(REQUEST_DELAY)  # Be respectful to the server
-        r = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        r = http_client.get(url, timeout=REQUEST_TIMEOUT, cache=True)
         r.raise_for_status()  # Raise an exception for bad status codes
 
-        soup = bs(r.content, "html.parser")
-        players_div = soup.find_all("div", attrs={"class": "player-card-container"})
-
-        if len(players_div) == 5:
-            for counter, players in enumerate(players_div):
-                if counter == 4:
-                    players_url = players.find_all("a")
-                    for player_url in players_url:
-                        try:
-                            original_link = player_url.get_attribute_list("href")[
-                                0
-                            ].split("/player/")
-                            real_player_id = str(
-                                int(
-                                    hex(int(original_link[-1].replace("/", "")))[-5:],
-                                    base=16,
-                                )
-                            )
-                            final_url = f"https://www.pesmaster.com{original_link[0]}/player/{real_player_id}/"
-                            if final_url not in all_players:
-                                all_players.append(final_url)
-                        except (ValueError, IndexError) as e:
-                            log_error(f"Error processing player URL in team {url}: {e}")
-                            continue
+        all_players = parse_players_in_team(r.content, url)
 
     except requests.RequestException as e:
         log_error(f"Error fetching team {url}: {e}")
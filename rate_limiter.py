@@ -0,0 +1,172 @@
+"""
+Process-wide token-bucket rate limiting.
+
+Every fetch acquires a token from the bucket of the host group it targets
+(pesmaster pages, pesmaster graphics, efootballhub.net mirrors), so the
+request rate stays the same no matter how many workers are running. Buckets
+back off on 429/503 responses, honouring Retry-After, and recover gradually.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Import configuration with fallbacks
+try:
+    from config import RATE_LIMITS, RATE_LIMIT_BACKOFF, RATE_LIMIT_RECOVERY
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    RATE_LIMITS = {
+        "pages": (10.0, 10),
+        "graphics": (20.0, 20),
+        "mirror": (5.0, 5),
+    }
+    RATE_LIMIT_BACKOFF = 0.5
+    RATE_LIMIT_RECOVERY = 1.05
+
+# Status codes that mean "slow down"
+THROTTLE_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    """Thread-safe token bucket with adaptive rate"""
+
+    def __init__(self, rate, burst):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take one token, possibly borrowing from the future.
+
+        Returns:
+            float: Seconds the caller must wait before sending its request
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def throttled(self, retry_after=None):
+        """Cut the rate and pause the bucket after a 429/503 response"""
+        with self.lock:
+            self.rate = max(self.rate * RATE_LIMIT_BACKOFF, self.max_rate / 100)
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self):
+        """Let the rate recover towards its configured maximum"""
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.rate * RATE_LIMIT_RECOVERY, self.max_rate)
+
+    def configure(self, rate=None, burst=None):
+        """Change the configured rate and/or burst at runtime"""
+        with self.lock:
+            if rate is not None:
+                self.max_rate = self.rate = float(rate)
+            if burst is not None:
+                self.burst = max(float(burst), 1.0)
+                self.tokens = min(self.tokens, self.burst)
+
+
+# MINIFACE_RATE_SCALE multiplies every rate and burst, e.g. to benchmark the
+# crawler against a local stand-in server (see benchmark.py)
+_scale = float(os.getenv("MINIFACE_RATE_SCALE", "1"))
+_buckets = {
+    group: TokenBucket(rate * _scale, burst * _scale)
+    for group, (rate, burst) in RATE_LIMITS.items()
+}
+
+
+def host_group(url):
+    """Return the rate limit group a URL belongs to"""
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    if host.endswith("efootballhub.net"):
+        return "mirror"
+    if "/graphics/" in parts.path:
+        return "graphics"
+    return "pages"
+
+
+def bucket_for(url):
+    """Return the token bucket for a URL"""
+    return _buckets[host_group(url)]
+
+
+def acquire(url, cancelled=None):
+    """
+    Block until a request to url is allowed, or until the optional
+    threading.Event cancelled is set
+    """
+    wait = bucket_for(url).reserve()
+    if wait > 0:
+        if cancelled is not None:
+            cancelled.wait(wait)
+        else:
+            time.sleep(wait)
+
+
+async def acquire_async(url):
+    """Wait on the event loop until a request to url is allowed"""
+    wait = bucket_for(url).reserve()
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def report_response(url, status_code, headers=None):
+    """
+    Feed a response status back to the limiter.
+
+    Returns:
+        bool: True if the response was a throttle signal (429/503)
+    """
+    bucket = bucket_for(url)
+    if status_code in THROTTLE_STATUSES:
+        retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+        bucket.throttled(retry_after)
+        return True
+    bucket.succeeded()
+    return False
+
+
+def configure(group, rate=None, burst=None):
+    """Override the rate (requests/sec) and/or burst of a host group"""
+    _buckets[group].configure(rate, burst)
+
+
+def describe():
+    """Human readable summary of the configured limits"""
+    return ", ".join(
+        f"{group}={bucket.max_rate:g}/s (burst {bucket.burst:g})"
+        for group, bucket in _buckets.items()
+    )
@@ -1,41 +1,71 @@
 import os
 import requests
+import http_client
+import concurrency
+import rate_limiter
+import manifest
+import negative_cache
+import checkpoint
+import discovery
 import threading
 import argparse
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
-from bs4 import BeautifulSoup as bs
-from get_miniface import miniface_downloader
-from teams import league_info_scrapper, teams_urls_scrapper, generate_alternate_team_urls
+from concurrent.futures import wait
+from get_miniface import (
+    encode_succeeded,
+    miniface_downloader,
+    find_player_cards,
+    remove_stale_temp_files,
+)
+from encoder import shutdown_encode_stage
+import work_executor
+from work_executor import get_executor, PRIORITY_PLAYER, PRIORITY_TEAM
+from event_cache import events
+from metrics import run_metrics
+from teams import league_info_scrapper, teams_urls_scrapper
 from players_in_team import players_in_team
+from player_index import PlayerIndex, player_id_from_url
+from sharding import parse_shard
 import time
 
 # Import configuration with fallbacks
 try:
     from config import (
-        MAX_WORKERS_TEAMS,
-        MAX_WORKERS_PLAYERS,
-        MAX_WORKERS_IMAGES,
+        MAX_WORKERS,
         REQUEST_DELAY,
         REQUEST_TIMEOUT,
         FETCH_ALTERNATE_NATIONALS,
         ALTERNATE_TEAM_OFFSETS,
+        MANIFEST_PATH,
+        NEGATIVE_CACHE_PATH,
+        CHECKPOINT_PATH,
+        PLAYER_INDEX_PATH,
+        RUN_REPORT_PATH,
+        PROMETHEUS_REPORT_PATH,
     )
 except ImportError:
     # Fallback configuration if config.py doesn't exist
-    MAX_WORKERS_TEAMS = 4
-    MAX_WORKERS_PLAYERS = 8
-    MAX_WORKERS_IMAGES = 6
+    MAX_WORKERS = 64
     REQUEST_DELAY = 0.1
     REQUEST_TIMEOUT = 30
     FETCH_ALTERNATE_NATIONALS = False
     ALTERNATE_TEAM_OFFSETS = []
+    MANIFEST_PATH = "miniface_manifest.json"
+    NEGATIVE_CACHE_PATH = os.path.join(
+        "MinifaceServer", "content", "miniface-server", "skipped_players.txt"
+    )
+    CHECKPOINT_PATH = "scrape_journal.jsonl"
+    PLAYER_INDEX_PATH = "player_index.json"
+    RUN_REPORT_PATH = "run_report.json"
+    PROMETHEUS_REPORT_PATH = None
 
 # Thread-safe set for tracking processed players
 done_players_lock = threading.Lock()
 done_players = set()
 
+# Players listed on the team pages of this run (threads engine)
+player_index = PlayerIndex()
+
 # Output directory paths
 OUTPUT_DIR_STANDARD = os.path.join("MinifaceServer", "content", "miniface-server")
 OUTPUT_DIR_BACKGROUND = os.path.join(
@@ -45,6 +75,12 @@ OUTPUT_DIR_BACKGROUND = os.path.join(
 # Global debug flag
 DEBUG = False
 
+# (index, count) of the shard processed by this run, None for everything
+SHARD = None
+
+# Parsed command line arguments (set by main)
+args = None
+
 
 def debug_print(message):
     """Print debug messages only if debug mode is enabled"""
@@ -79,6 +115,10 @@ Examples:
   python script.py                    # Run with default settings
   python script.py --debug           # Run with debug logging
   python script.py -d --quiet        # Debug mode with minimal output
+  python script.py --engine async    # Single event loop instead of thread pools
+  python script.py --incremental     # Only regenerate changed minifaces
+  python script.py --resume          # Continue an interrupted run
+  python script.py --shard 0/4       # Process one of four partitions
         """,
     )
 
@@ -97,21 +137,56 @@ Examples:
     )
 
     parser.add_argument(
-        "--workers-teams",
+        "--workers",
         type=int,
-        help="Override number of concurrent teams (default from config.py)",
+        help="Override total number of worker threads shared by teams, players and images (default from config.py)",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only regenerate minifaces whose source changed since the last run (uses the manifest)",
     )
 
     parser.add_argument(
-        "--workers-players",
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run from the checkpoint journal, skipping completed work",
+    )
+
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="Only process shard i of N (format i/N, e.g. 0/4); combine outputs with merge_shards.py",
+    )
+
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async", "pipeline"],
+        default="threads",
+        help="Crawl engine: nested thread pools, a single asyncio event loop, or a streaming pipeline of bounded stage queues (default: threads)",
+    )
+
+    parser.add_argument(
+        "--max-in-flight",
         type=int,
-        help="Override number of concurrent players per team (default from config.py)",
+        help="Override global concurrent request budget for --engine async (default from config.py)",
     )
 
     parser.add_argument(
         "--delay",
         type=float,
-        help="Override request delay in seconds (default from config.py)",
+        help="Override minimum interval between page requests across all workers in seconds (default from config.py)",
+    )
+
+    parser.add_argument(
+        "--report",
+        help="Path of the JSON run report with per-stage metrics (default from config.py)",
+    )
+
+    parser.add_argument(
+        "--prometheus",
+        help="Also write the per-stage metrics in Prometheus text format to this path",
     )
 
     return parser.parse_args()
@@ -124,73 +199,119 @@ os.makedirs(OUTPUT_DIR_BACKGROUND, exist_ok=True)
 
 def initialize_script():
     """Initialize the script with configuration and arguments"""
-    global DEBUG, MAX_WORKERS_TEAMS, MAX_WORKERS_PLAYERS, MAX_WORKERS_IMAGES, REQUEST_DELAY, REQUEST_TIMEOUT
+    global DEBUG, SHARD, MAX_WORKERS, REQUEST_DELAY, REQUEST_TIMEOUT
 
     # Parse command line arguments
     args = parse_arguments()
     DEBUG = args.debug
     QUIET = args.quiet
+    SHARD = args.shard
 
     # Import configuration with fallbacks
     try:
         from config import (
-            MAX_WORKERS_TEAMS as DEFAULT_TEAMS,
-            MAX_WORKERS_PLAYERS as DEFAULT_PLAYERS,
-            MAX_WORKERS_IMAGES as DEFAULT_IMAGES,
+            MAX_WORKERS as DEFAULT_WORKERS,
             REQUEST_DELAY as DEFAULT_DELAY,
             REQUEST_TIMEOUT as DEFAULT_TIMEOUT,
         )
 
         debug_print("Configuration loaded from config.py")
     except ImportError:
-        DEFAULT_TEAMS = 4
-        DEFAULT_PLAYERS = 8
-        DEFAULT_IMAGES = 6
+        DEFAULT_WORKERS = 64
         DEFAULT_DELAY = 0.1
         DEFAULT_TIMEOUT = 30
         log_error("config.py not found, using default configuration")
 
     # Apply command line overrides
-    MAX_WORKERS_TEAMS = args.workers_teams if args.workers_teams else DEFAULT_TEAMS
-    MAX_WORKERS_PLAYERS = (
-        args.workers_players if args.workers_players else DEFAULT_PLAYERS
-    )
-    MAX_WORKERS_IMAGES = DEFAULT_IMAGES
+    MAX_WORKERS = args.workers if args.workers else DEFAULT_WORKERS
+    work_executor.configure(MAX_WORKERS)
     REQUEST_DELAY = args.delay if args.delay else DEFAULT_DELAY
+    if args.delay:
+        rate_limiter.configure("pages", rate=1 / REQUEST_DELAY)
     REQUEST_TIMEOUT = DEFAULT_TIMEOUT
 
+    if args.incremental:
+        manifest.enable(MANIFEST_PATH)
+        debug_print(f"Incremental mode: using manifest {MANIFEST_PATH}")
+
+    if NEGATIVE_CACHE_PATH:
+        cache = negative_cache.enable(NEGATIVE_CACHE_PATH)
+        debug_print(
+            f"Skip list {NEGATIVE_CACHE_PATH}: {cache.stats()['missing']} images known to be missing"
+        )
+
+    journal = checkpoint.enable(CHECKPOINT_PATH, resume=args.resume)
+    if args.resume:
+        # Players finished by the interrupted run are not fetched again
+        done_players.update(journal.completed_players())
+        debug_print(
+            f"Resuming from {CHECKPOINT_PATH}: {len(done_players)} players already done"
+        )
+
+    if SHARD is not None:
+        debug_print(f"Processing shard {SHARD[0]}/{SHARD[1]}")
+
     if not QUIET:
         print("Loading Info...")
-    debug_print(
-        f"Configuration: Teams={MAX_WORKERS_TEAMS}, Players={MAX_WORKERS_PLAYERS}, Delay={REQUEST_DELAY}s"
-    )
+    debug_print(f"Configuration: Workers={MAX_WORKERS}, Delay={REQUEST_DELAY}s")
 
     return args
 
 
-# Initialize and get configuration
-args = initialize_script()
-
-leagues_urls = league_info_scrapper(
-    "https://www.pesmaster.com/efootball-2022/", "url", 2022
-)
-leagues_names = league_info_scrapper(
-    "https://www.pesmaster.com/efootball-2022/", "name", 2022
-)
-
-headers = {
-    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36"
-}
+def write_run_report(args, elapsed, players, leagues=None):
+    """Write the JSON run report and, if requested, the Prometheus text file"""
+    histogram = http_client.latency_histogram()
+    run = {
+        "elapsed": elapsed,
+        "players": players,
+        "players_per_second": players / max(elapsed, 1e-9),
+        "requests": histogram["count"],
+        "cache_hits": histogram["cache_hits"],
+        "latency_mean": histogram["mean"],
+        "latency_p50": histogram["p50"],
+        "latency_p95": histogram["p95"],
+    }
+    if leagues is not None:
+        run["leagues"] = leagues
+    index_stats = player_index.stats()
+    if index_stats["teams"]:
+        run.update({f"index_{key}": value for key, value in index_stats.items()})
+    for group, stats in concurrency.snapshot().items():
+        run[f"concurrency_limit_{group}"] = stats["limit"]
+        run[f"concurrency_decreases_{group}"] = stats["decreases"]
+    if negative_cache.active_cache is not None:
+        cache_stats = negative_cache.active_cache.stats()
+        run.update({f"skip_list_{key}": value for key, value in cache_stats.items()})
+    event_stats = events.stats()
+    run.update({f"event_cache_{key}": value for key, value in event_stats.items()})
+    try:
+        run_metrics.write_json(args.report or RUN_REPORT_PATH, run)
+        prometheus_path = args.prometheus or PROMETHEUS_REPORT_PATH
+        if prometheus_path:
+            run_metrics.write_prometheus(prometheus_path, run)
+    except OSError as e:
+        log_error(f"Could not write run report: {e}")
+
+
+def load_leagues():
+    """Scrape the league URLs and names from the eFootball index page"""
+    leagues_urls = league_info_scrapper(
+        "https://www.pesmaster.com/efootball-2022/", "url", 2022
+    )
+    leagues_names = league_info_scrapper(
+        "https://www.pesmaster.com/efootball-2022/", "name", 2022
+    )
 
-if not args.quiet:
-    print("Loaded!")
-debug_print(f"Found {len(leagues_urls)} leagues to process")
+    if not args.quiet:
+        print("Loaded!")
+    debug_print(f"Found {len(leagues_urls)} leagues to process")
+    return leagues_urls, leagues_names
 
 
-def process_player(player_url, team_name, league_name):
+def process_player(player_url):
     """Process a single player - download and extract miniface"""
     try:
-        player_id = str(player_url.split("/player/")[-1].split("/")[0])
+        player_id = player_id_from_url(player_url)
 
         # Thread-safe check if player already processed
         with done_players_lock:
@@ -199,34 +320,54 @@ def process_player(player_url, team_name, league_name):
                 return f"Skipped {player_id} (already processed)"
             done_players.add(player_id)
 
-        debug_print(f"Processing player {player_id} from {team_name}")
+        debug_print(f"Processing player {player_id}")
 
-        # Add small delay to be respectful to the server
-        time.sleep(REQUEST_DELAY)
+        r = http_client.get(player_url, timeout=REQUEST_TIMEOUT, cache=True)
+        # An error page would parse as "no cards" and be journaled as done
+        r.raise_for_status()
 
-        r = requests.get(player_url, headers=headers, timeout=REQUEST_TIMEOUT)
-        soup = bs(r.content, "html.parser")
-        cards_div = soup.find_all("div", attrs={"class": "player-card-container"})
+        page_hash = None
+        if manifest.active_manifest is not None:
+            page_hash = manifest.hash_bytes(r.content)
+            if manifest.active_manifest.player_unchanged(player_id, page_hash):
+                checkpoint.active_journal.mark_done("player", player_id)
+                debug_print(f"Skipped {player_id} (unchanged since last run)")
+                return f"Skipped {player_id} (unchanged since last run)"
 
-        if not cards_div:
+        cards_div = find_player_cards(r.content)
+
+        if cards_div is None:
+            checkpoint.active_journal.mark_done("player", player_id)
             debug_print(f"No cards found for player {player_id}")
             return f"No cards found for player {player_id}"
 
-        cards_div = cards_div[len(cards_div) - 1].find_all(
-            "figure", attrs={"class": "player-card efootball-2022"}
-        )
-
         if not cards_div:
+            checkpoint.active_journal.mark_done("player", player_id)
             debug_print(f"No efootball-2022 cards found for player {player_id}")
             return f"No efootball-2022 cards found for player {player_id}"
 
-        for card in cards_div:
+        encodes = []
+        card_keys = [
             miniface_downloader(
-                card, player_id, OUTPUT_DIR_STANDARD, OUTPUT_DIR_BACKGROUND
+                card, player_id, OUTPUT_DIR_STANDARD, OUTPUT_DIR_BACKGROUND, encodes
             )
+            for card in cards_div
+        ]
+
+        # Encoding runs on the encode stage; the player only counts as done
+        # (for the checkpoint journal) once its files are on disk
+        wait(encodes)
+        if None in card_keys or not all(map(encode_succeeded, encodes)):
+            log_error(f"Incomplete player {player_id}, not marking it done")
+            return f"✗ Incomplete player {player_id}"
+
+        # Only remember the page once every card on it has been generated
+        if page_hash is not None:
+            manifest.active_manifest.record_player(player_id, page_hash, card_keys)
 
-        log_success(f"Processed player {player_id} from {team_name}")
-        return f"✓ Processed player {player_id} from {team_name}"
+        checkpoint.active_journal.mark_done("player", player_id)
+        log_success(f"Processed player {player_id}")
+        return f"✓ Processed player {player_id}"
 
     except IndexError as e:
         log_error(f"IndexError for player {player_url}: {e}")
@@ -239,147 +380,243 @@ def process_player(player_url, team_name, league_name):
         return f"✗ Error processing player {player_url}: {e}"
 
 
-def process_team(team_url, team_counter, total_teams, league_name):
-    """Process a single team - get all players and process them concurrently"""
+def discover_team(team_url, team_counter, total_teams, league_name):
+    """Discovery pass for a single team - add its players to the player index"""
     try:
-        log_info(f"Processing team {team_counter}/{total_teams} in {league_name}")
+        log_info(f"Discovering team {team_counter}/{total_teams} in {league_name}")
 
-        # Add small delay to be respectful to the server
-        time.sleep(REQUEST_DELAY)
-
-        players_urls = players_in_team(team_url)
+        # Replay the player list recorded by an interrupted run if available
+        players_urls = discovery.recorded_players(team_url)
+        if players_urls is None:
+            players_urls = discovery.record_players(team_url, players_in_team(team_url))
 
         if not players_urls:
             debug_print(f"No players found for team {team_url}")
             return f"  No players found for team {team_url}"
 
-        debug_print(f"Found {len(players_urls)} players in team {team_counter}")
-
-        # Process players in this team concurrently
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS_PLAYERS) as executor:
-            player_futures = {
-                executor.submit(
-                    process_player, player_url, f"team_{team_counter}", league_name
-                ): player_url
-                for player_url in players_urls
-            }
-
-            results = []
-            successful_players = 0
-            for future in as_completed(player_futures):
-                result = future.result()
-                results.append(result)
-                if result.startswith("✓"):
-                    successful_players += 1
-                    debug_print(f"    {result}")
-                elif result.startswith("✗"):
-                    debug_print(f"    {result}")
-
-        log_info(
-            f"Completed team {team_counter}/{total_teams} in {league_name} ({successful_players}/{len(players_urls)} players successful)"
+        new_players = player_index.add_team(team_url, league_name, players_urls)
+        debug_print(
+            f"Found {len(players_urls)} players in team {team_counter} ({len(new_players)} not listed by an earlier team)"
         )
-        return f"  ✓ Completed team {team_counter}/{total_teams} in {league_name} ({successful_players}/{len(players_urls)} players)"
+        return f"  ✓ Discovered team {team_counter}/{total_teams} in {league_name} ({len(players_urls)} players)"
 
     except Exception as e:
-        log_error(f"Error processing team {team_url}: {e}")
-        return f"  ✗ Error processing team {team_url}: {e}"
+        log_error(f"Error discovering team {team_url}: {e}")
+        return f"  ✗ Error discovering team {team_url}: {e}"
+
 
+def discover_league(league_counter, league_url, league_name, total_leagues):
+    """
+    Discovery pass for a single league - read all of its team pages
+    concurrently into the player index.
 
-def process_league(league_counter, league_url, league_name, total_leagues):
-    """Process a single league - get all teams and process them concurrently"""
+    Returns:
+        tuple: (result message, list of the league's team URLs)
+    """
     try:
         if not args.quiet:
             print(
-                f"\nStarted League ({league_counter + 1}/{total_leagues}): {league_name}"
+                f"\nDiscovering League ({league_counter + 1}/{total_leagues}): {league_name}"
             )
-        debug_print(f"Processing league: {league_name} at {league_url}")
+        debug_print(f"Discovering league: {league_name} at {league_url}")
         start_time = time.time()
 
-        teams_urls = teams_urls_scrapper(league_url)
-
-        if not teams_urls:
-            log_error(f"No teams found for league {league_name}")
-            return f"No teams found for league {league_name}"
-
-        # Generate alternate team URLs for national leagues
-        is_national = "National" in league_name
-        if is_national and FETCH_ALTERNATE_NATIONALS and ALTERNATE_TEAM_OFFSETS:
-            alternate_urls = []
-            for team_url in teams_urls:
-                alternate_urls.extend(
-                    generate_alternate_team_urls(team_url, ALTERNATE_TEAM_OFFSETS)
-                )
-            if alternate_urls:
-                debug_print(
-                    f"Generated {len(alternate_urls)} alternate national team URLs"
-                )
-                teams_urls.extend(alternate_urls)
+        # Replay the team list recorded by an interrupted run if available.
+        # Team pages already read by that run are replayed from the journal
+        # too, so the index also covers completed teams without refetching.
+        teams_urls = discovery.recorded_teams(league_url)
+        if teams_urls is None:
+            teams_urls = discovery.record_teams(
+                league_url,
+                league_name,
+                teams_urls_scrapper(league_url),
+                ALTERNATE_TEAM_OFFSETS if FETCH_ALTERNATE_NATIONALS else None,
+                SHARD,
+            )
+            if teams_urls is None:
+                return f"No teams found for league {league_name}", []
 
         debug_print(f"Found {len(teams_urls)} teams in {league_name}")
 
-        # Process teams in this league concurrently
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS_TEAMS) as executor:
-            team_futures = {
-                executor.submit(
-                    process_team,
-                    team_url,
-                    team_counter + 1,
-                    len(teams_urls),
-                    league_name,
-                ): team_url
-                for team_counter, team_url in enumerate(teams_urls)
-            }
-
-            completed_teams = 0
-            successful_teams = 0
-            for future in as_completed(team_futures):
-                result = future.result()
-                completed_teams += 1
-                if result.startswith("  ✓"):
-                    successful_teams += 1
-                    debug_print(result)
-                elif result.startswith("  ✗"):
-                    debug_print(result)
+        # Read the team pages on the shared executor
+        executor = get_executor()
+        team_futures = [
+            executor.submit(
+                PRIORITY_TEAM,
+                discover_team,
+                team_url,
+                team_counter + 1,
+                len(teams_urls),
+                league_name,
+            )
+            for team_counter, team_url in enumerate(teams_urls)
+        ]
+        executor.wait(team_futures)
+
+        successful_teams = 0
+        for future in team_futures:
+            result = future.result()
+            if result.startswith("  ✓"):
+                successful_teams += 1
+                debug_print(result)
+            elif result.startswith("  ✗"):
+                debug_print(result)
 
         elapsed_time = time.time() - start_time
-        success_message = f"✓ Completed League {league_name} in {elapsed_time:.2f}s ({successful_teams}/{len(teams_urls)} teams successful)"
+        success_message = f"✓ Discovered League {league_name} in {elapsed_time:.2f}s ({successful_teams}/{len(teams_urls)} teams successful)"
         if not args.quiet:
             print(success_message)
         debug_print(success_message)
-        return success_message
+        return success_message, teams_urls
 
     except Exception as e:
-        error_message = f"✗ Error processing league {league_name}: {e}"
+        error_message = f"✗ Error discovering league {league_name}: {e}"
         log_error(error_message)
-        return error_message
+        return error_message, []
+
+
+def process_indexed_players(leagues):
+    """
+    Fetch every unique player of the player index exactly once, then mark
+    the teams and leagues whose players all succeeded as done.
+
+    Args:
+        leagues: List of (league URL, team URLs) pairs from the discovery pass
+    """
+    player_ids = [
+        player_id
+        for player_id in player_index.player_ids()
+        if player_id not in done_players
+    ]
+    stats = player_index.stats()
+    if not args.quiet:
+        print(
+            f"\nFetching {len(player_ids)} players ({stats['players']} unique of {stats['listings']} listed on {stats['teams']} team pages)"
+        )
+
+    executor = get_executor()
+    player_futures = {
+        player_id: executor.submit(
+            PRIORITY_PLAYER,
+            process_player,
+            player_index.url(player_id),
+        )
+        for player_id in player_ids
+    }
+    executor.wait(player_futures.values())
+
+    failed_players = set()
+    for player_id, future in player_futures.items():
+        result = future.result()
+        if result.startswith("✓"):
+            debug_print(f"    {result}")
+        elif result.startswith("✗"):
+            failed_players.add(player_id)
+            debug_print(f"    {result}")
+
+    for league_url, teams_urls in leagues:
+        for team_url in teams_urls:
+            team_players = player_index.team_players(team_url)
+            discovery.finish_team(
+                team_url,
+                bool(team_players) and failed_players.isdisjoint(team_players),
+            )
+        discovery.finish_league(league_url)
 
 
 def main():
     """Main function to orchestrate the entire download process"""
+    global args
+
+    # Initialize and get configuration. This is done here rather than at
+    # import time so worker processes can import this module safely.
+    args = initialize_script()
+    for output_dir in (OUTPUT_DIR_STANDARD, OUTPUT_DIR_BACKGROUND):
+        remove_stale_temp_files(output_dir)
+    leagues_urls, leagues_names = load_leagues()
+
     if not args.quiet:
-        print(
-            f"Starting optimized download with {MAX_WORKERS_TEAMS} team workers, {MAX_WORKERS_PLAYERS} player workers"
-        )
+        print(f"Starting optimized download with {MAX_WORKERS} workers")
         print(f"Total leagues to process: {len(leagues_urls)}")
 
-    debug_print(f"Debug mode enabled - verbose logging active")
+    debug_print("Debug mode enabled - verbose logging active")
     debug_print(
-        f"Configuration: Teams={MAX_WORKERS_TEAMS}, Players={MAX_WORKERS_PLAYERS}, Images={MAX_WORKERS_IMAGES}"
+        f"Configuration: Workers={MAX_WORKERS} shared by teams, players and images"
     )
-    debug_print(f"Request delay: {REQUEST_DELAY}s, Timeout: {REQUEST_TIMEOUT}s")
+    debug_print(f"Rate limits: {rate_limiter.describe()}, Timeout: {REQUEST_TIMEOUT}s")
 
     overall_start_time = time.time()
 
-    # Process leagues sequentially to avoid overwhelming the server
     successful_leagues = 0
-    for counter, league_url in enumerate(leagues_urls):
-        result = process_league(
-            counter, league_url, leagues_names[counter], len(leagues_urls)
+    if args.engine == "async":
+        from async_engine import run_async_engine, ASYNC_MAX_IN_FLIGHT
+
+        max_in_flight = args.max_in_flight or ASYNC_MAX_IN_FLIGHT
+        debug_print(f"Async engine: {max_in_flight} requests in flight")
+        successful_leagues = run_async_engine(
+            leagues_urls,
+            leagues_names,
+            done_players,
+            OUTPUT_DIR_STANDARD,
+            OUTPUT_DIR_BACKGROUND,
+            alternate_offsets=(
+                ALTERNATE_TEAM_OFFSETS if FETCH_ALTERNATE_NATIONALS else None
+            ),
+            max_in_flight=max_in_flight,
+            shard=SHARD,
+            quiet=args.quiet,
         )
-        if result.startswith("✓"):
-            successful_leagues += 1
-        elif not args.quiet:
-            print(result)
+    elif args.engine == "pipeline":
+        from pipeline_engine import run_pipeline_engine, PIPELINE_WORKERS
+
+        debug_print(f"Pipeline engine: stage workers {PIPELINE_WORKERS}")
+        successful_leagues = run_pipeline_engine(
+            leagues_urls,
+            leagues_names,
+            done_players,
+            OUTPUT_DIR_STANDARD,
+            OUTPUT_DIR_BACKGROUND,
+            alternate_offsets=(
+                ALTERNATE_TEAM_OFFSETS if FETCH_ALTERNATE_NATIONALS else None
+            ),
+            shard=SHARD,
+            quiet=args.quiet,
+        )
+    else:
+        # Discovery pass: read the team pages of every league (leagues one
+        # at a time to avoid overwhelming the server) into the player index
+        discovered = []
+        for counter, league_url in enumerate(leagues_urls):
+            result, teams_urls = discover_league(
+                counter, league_url, leagues_names[counter], len(leagues_urls)
+            )
+            discovered.append((league_url, teams_urls))
+            if result.startswith("✓"):
+                successful_leagues += 1
+            elif not args.quiet:
+                print(result)
+
+        try:
+            player_index.save(PLAYER_INDEX_PATH)
+            debug_print(f"Player index written to {PLAYER_INDEX_PATH}")
+        except OSError as e:
+            log_error(f"Could not write player index: {e}")
+
+        # Then fetch each unique player page exactly once
+        process_indexed_players(discovered)
+
+    # Wait for queued encodes before recording the final state
+    work_executor.shutdown_executor()
+    shutdown_encode_stage()
+    checkpoint.active_journal.close()
+    if manifest.active_manifest is not None:
+        manifest.active_manifest.save()
+    if negative_cache.active_cache is not None:
+        try:
+            negative_cache.active_cache.save()
+        except OSError as e:
+            log_error(f"Could not write skip list: {e}")
+    http_client.prune_cache()
 
     overall_elapsed_time = time.time() - overall_start_time
 
@@ -394,15 +631,23 @@ def main():
     print(f"Average time per player: {overall_elapsed_time/max(total_players, 1):.2f}s")
 
     if DEBUG:
-        print(f"\n[DEBUG] Final Statistics:")
+        print("\n[DEBUG] Final Statistics:")
         print(f"[DEBUG] - Total execution time: {overall_elapsed_time:.2f}s")
         print(
             f"[DEBUG] - Players per second: {total_players/max(overall_elapsed_time, 1):.2f}"
         )
-        print(
-            f"[DEBUG] - Thread configuration used: Teams={MAX_WORKERS_TEAMS}, Players={MAX_WORKERS_PLAYERS}"
-        )
+        print(f"[DEBUG] - Thread configuration used: Workers={MAX_WORKERS}")
         print(f"[DEBUG] - Request delay used: {REQUEST_DELAY}s")
+        print("[DEBUG] - Request latency histogram:")
+        for line in http_client.format_latency_histogram():
+            print(f"[DEBUG]   {line}")
+        print(f"[DEBUG] - Event cache: {events.format_stats()}")
+        print(f"[DEBUG] - Final concurrency limits: {concurrency.describe()}")
+        print("[DEBUG] - Stage metrics:")
+        for line in run_metrics.format_stats():
+            print(f"[DEBUG]   {line}")
+
+    write_run_report(args, overall_elapsed_time, total_players, successful_leagues)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+"""
+Deterministic partitioning of the scrape across shards (script.py --shard i/N).
+
+Teams are assigned to shards by a stable hash of their URL, so every runner
+of a CI matrix computes the same partition independently, including the
+alternate national team URLs.
+"""
+
+import argparse
+import hashlib
+
+
+def parse_shard(value):
+    """
+    Parse an "i/N" shard specification (argparse type).
+
+    Returns:
+        tuple: (index, count) with 0 <= index < count
+
+    Raises:
+        argparse.ArgumentTypeError: If the specification is malformed
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid shard '{value}', expected i/N (e.g. 0/4)"
+        )
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', need 0 <= i < N")
+    return index, count
+
+
+def shard_of(team_url, count):
+    """Return the shard index a team URL belongs to"""
+    key = team_url.rstrip("/").lower().encode("utf-8")
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], "big") % count
+
+
+def filter_shard(teams_urls, shard):
+    """
+    Keep only the team URLs belonging to a shard.
+
+    Args:
+        teams_urls: List of team URLs
+        shard: (index, count) tuple, or None to keep everything
+    """
+    if shard is None:
+        return teams_urls
+    index, count = shard
+    return [url for url in teams_urls if shard_of(url, count) == index]
@@ -1,15 +1,10 @@
-from bs4 import BeautifulSoup as bs
+from html_parsing import parse_html
 import requests
+import http_client
 import os
 import sys
-import time
-
-headers = {
-    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36"
-}
 
 REQUEST_TIMEOUT = 30  # Timeout for requests
-REQUEST_DELAY = 0.1  # Delay between requests
 
 
 def log_error(message):
@@ -25,29 +20,42 @@ def log_debug(message):
         print(f"[DEBUG] {message}")
 
 
+def parse_teams_urls(content):
+    """
+    Extract team URLs from the HTML of a league page.
+
+    Args:
+        content: Raw HTML of the league page
+
+    Returns:
+        List of absolute team URLs
+    """
+    urls = []
+    soup = parse_html(content, "div", "team-block-container")
+    team_container = soup.find("div", attrs={"class": "team-block-container"})
+
+    if team_container:
+        teams_urls_div = team_container.find_all("div", attrs={"class": "team-block"})
+        for team_url_div in teams_urls_div:
+            team_link = team_url_div.find("a")
+            if team_link:
+                team_url = team_link.get_attribute_list("href")[0]
+                team_url = "https://www.pesmaster.com/" + team_url
+                urls.append(team_url)
+
+    return urls
+
+
 def teams_urls_scrapper(url):
     """
     Optimized version with better error handling and timeouts
     """
     urls = []
     try:
-        time.sleep(REQUEST_DELAY)  # Be respectful to the server
-        r = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        r = http_client.get(url, timeout=REQUEST_TIMEOUT, cache=True)
         r.raise_for_status()
 
-        soup = bs(r.content, "html.parser")
-        team_container = soup.find("div", attrs={"class": "team-block-container"})
-
-        if team_container:
-            teams_urls_div = team_container.find_all(
-                "div", attrs={"class": "team-block"}
-            )
-            for team_url_div in teams_urls_div:
-                team_link = team_url_div.find("a")
-                if team_link:
-                    team_url = team_link.get_attribute_list("href")[0]
-                    team_url = "https://www.pesmaster.com/" + team_url
-                    urls.append(team_url)
+        urls = parse_teams_urls(r.content)
 
     except requests.RequestException as e:
         log_error(f"Error fetching teams from {url}: {e}")
@@ -100,11 +108,10 @@ def league_info_scrapper(url, needed, pes_version):
         url_year = url.find("-20")
         url = url[:url_year] + "-" + str(pes_version) + "/"
 
-        time.sleep(REQUEST_DELAY)  # Be respectful to the server
-        r = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        r = http_client.get(url, timeout=REQUEST_TIMEOUT)
         r.raise_for_status()
 
-        soup = bs(r.content, "html.parser")
+        soup = parse_html(r.content, "div", "team-block-container")
         team_names_div = soup.find_all("div", attrs={"class": "team-block-container"})
 
         for position, team_name_div in enumerate(team_names_div):
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for the checkpoint journal and --resume (run with python -m pytest).
+
+A player may only be journaled as done once its page was fetched and every
+card was downloaded and encoded; otherwise --resume would skip it for good.
+"""
+
+import os
+import sys
+from concurrent.futures import Future
+
+import pytest
+import requests
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import checkpoint
+import script
+from fixture_server import SyntheticSite
+
+PLAYER_ID = 10000
+PLAYER_URL = f"https://www.pesmaster.com/efootball-2022/player/{PLAYER_ID}/"
+GRAPHICS = "/efootball-2022/graphics"
+DEFAULT_CARD_PAGE = (
+    '<div class="player-card-container"><figure class="player-card efootball-2022">'
+    f'<img data-src="{GRAPHICS}/teamlogos/e_1000.png">'
+    f'<img data-src="{GRAPHICS}/players/player_{PLAYER_ID}.png">'
+    "</figure></div>"
+)
+
+
+def response(status_code, content=b"", url=PLAYER_URL):
+    r = requests.Response()
+    r.status_code = status_code
+    r._content = content
+    r.url = url
+    r.rejected = None
+    return r
+
+
+def encoded(result=None, error=None):
+    """A finished encode future"""
+    future = Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+    return future
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(script, "done_players", set())
+    monkeypatch.setattr(script.manifest, "active_manifest", None)
+    journal = checkpoint.enable(str(tmp_path / "journal.jsonl"))
+    yield journal
+    journal.close()
+    checkpoint.active_journal = None
+
+
+def serve_page(monkeypatch, status_code=200):
+    page = SyntheticSite().player_page(PLAYER_ID).encode("utf-8")
+    monkeypatch.setattr(
+        script.http_client, "get", lambda *args, **kwargs: response(status_code, page)
+    )
+
+
+def encode_with(monkeypatch, future, card_key="card"):
+    def miniface_downloader(card, player_id, standard, background, encodes):
+        encodes.append(future)
+        return card_key
+
+    monkeypatch.setattr(script, "miniface_downloader", miniface_downloader)
+
+
+def resumed(path):
+    """Replay the journal as --resume would"""
+    journal = checkpoint.Journal(path, resume=True)
+    journal.close()
+    return journal.completed_players()
+
+
+def test_error_page_is_not_done(journal, monkeypatch):
+    serve_page(monkeypatch, status_code=503)
+    encode_with(monkeypatch, encoded({"standard": True}))
+
+    assert script.process_player(PLAYER_URL).startswith("✗")
+    journal.close()
+    assert resumed(journal.path) == set()
+
+
+@pytest.mark.parametrize(
+    "future, card_key",
+    [
+        (encoded(error=RuntimeError("encoder crashed")), "card"),
+        (encoded({"standard": True, "background": False}), "card"),
+        (encoded({"standard": True}), None),
+    ],
+    ids=["encode raised", "output not written", "image fetch failed"],
+)
+def test_failed_card_is_not_done(journal, monkeypatch, future, card_key):
+    serve_page(monkeypatch)
+    encode_with(monkeypatch, future, card_key)
+
+    assert script.process_player(PLAYER_URL).startswith("✗")
+    journal.close()
+    assert resumed(journal.path) == set()
+
+
+def test_default_card_player_is_done(journal, monkeypatch):
+    # Default cards have no image to generate from: nothing to do is success
+    monkeypatch.setattr(
+        script.http_client,
+        "get",
+        lambda *args, **kwargs: response(200, DEFAULT_CARD_PAGE.encode("utf-8")),
+    )
+
+    assert script.process_player(PLAYER_URL).startswith("✓")
+    journal.close()
+    assert resumed(journal.path) == {str(PLAYER_ID)}
+
+
+@pytest.mark.parametrize(
+    "image_status, done", [(404, True), (503, False)], ids=["missing", "server error"]
+)
+def test_image_status_decides_done(journal, monkeypatch, image_status, done):
+    # An image missing at every source is final; a server error is retried
+    page = SyntheticSite().player_page(PLAYER_ID).encode("utf-8")
+
+    def get(url, *args, **kwargs):
+        if url == PLAYER_URL:
+            return response(200, page)
+        return response(image_status, url=url)
+
+    monkeypatch.setattr(script.http_client, "get", get)
+
+    assert script.process_player(PLAYER_URL).startswith("✓" if done else "✗")
+    journal.close()
+    assert resumed(journal.path) == ({str(PLAYER_ID)} if done else set())
+
+
+def test_resume_retries_failed_player(journal, monkeypatch):
+    serve_page(monkeypatch, status_code=503)
+    script.process_player(PLAYER_URL)
+    journal.close()
+
+    # The next run resumes, and this time the page and encodes succeed
+    script.done_players = set()
+    journal = checkpoint.enable(journal.path, resume=True)
+    assert not journal.is_done("player", str(PLAYER_ID))
+    serve_page(monkeypatch)
+    encode_with(monkeypatch, encoded({"standard": True, "background": True}))
+
+    assert script.process_player(PLAYER_URL).startswith("✓")
+    journal.close()
+    assert resumed(journal.path) == {str(PLAYER_ID)}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for the adaptive (AIMD) in-flight limits (run with python -m pytest).
+
+The limit grows by about one slot per window of successes while it is fully
+used, and is cut multiplicatively - once per burst - on failures, throttling
+and latency spikes.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import concurrency
+from concurrency import AIMDLimit
+
+LATENCY = 0.1
+
+
+def saturate(limit):
+    """Take every free slot"""
+    while limit._free() > 0:
+        assert limit.acquire()
+
+
+def succeed(limit, count, saturated=True):
+    """Complete count requests, refilling the freed slot if saturated"""
+    for _ in range(count):
+        limit.release(LATENCY, 200)
+        if saturated:
+            saturate(limit)
+
+
+def test_additive_increase_while_saturated():
+    limit = AIMDLimit(4, 1, 16)
+    saturate(limit)
+    succeed(limit, 4)
+    # About one slot per window of `limit` successes
+    assert int(limit.limit) == 4
+    succeed(limit, 1)
+    assert int(limit.limit) == 5
+    assert limit.in_flight == 5
+
+    succeed(limit, 500)
+    assert limit.limit == 16
+    assert limit.decreases == 0
+
+
+def test_no_increase_while_underused():
+    limit = AIMDLimit(4, 1, 16)
+    for _ in range(100):
+        assert limit.acquire()
+        limit.release(LATENCY, 200)
+    assert limit.limit == 4
+
+
+@pytest.mark.parametrize(
+    "status_code, failed",
+    [(503, False), (429, False), (None, False), (None, True)],
+    ids=["503", "429", "no response", "timeout"],
+)
+def test_multiplicative_decrease(status_code, failed):
+    limit = AIMDLimit(10, 1, 16)
+    limit.acquire()
+    limit.release(LATENCY, status_code, failed=failed)
+    assert limit.limit == pytest.approx(10 * concurrency.CONCURRENCY_DECREASE)
+    assert limit.decreases == 1
+
+
+def test_burst_of_failures_cuts_once():
+    limit = AIMDLimit(8, 1, 16)
+    saturate(limit)
+    for _ in range(8):
+        limit.release(LATENCY, 503)
+    assert limit.decreases == 1
+
+    # The next failure after the burst is a new congestion signal
+    limit.acquire()
+    limit.release(LATENCY, 503)
+    assert limit.decreases == 2
+
+
+def test_decrease_stops_at_minimum():
+    limit = AIMDLimit(8, 2, 16)
+    for _ in range(50):
+        limit.acquire()
+        limit.release(LATENCY, 503)
+    assert limit.limit == 2
+    assert limit._free() == 2
+
+
+def test_latency_spike_backs_off():
+    limit = AIMDLimit(8, 1, 16)
+    limit.acquire()
+    limit.release(LATENCY, 200)
+    for _ in range(50):
+        limit.acquire()
+        limit.release(LATENCY * concurrency.CONCURRENCY_LATENCY_TOLERANCE * 10, 200)
+    assert limit.decreases >= 1
+    assert limit.limit < 8
+
+
+def test_abandoned_request_keeps_limit():
+    limit = AIMDLimit(4, 1, 16)
+    limit.acquire()
+    limit.release(abandoned=True)
+    assert limit.limit == 4
+    assert limit.in_flight == 0
+    assert limit.completed == 0
+
+
+def test_acquire_waits_for_a_slot():
+    limit = AIMDLimit(1, 1, 1)
+    assert limit.acquire()
+
+    cancelled = threading.Event()
+    cancelled.set()
+    assert not limit.acquire(cancelled)
+
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: limit.acquire() and acquired.set())
+    waiter.start()
+    assert not acquired.wait(0.1)
+    limit.release(LATENCY, 200)
+    assert acquired.wait(5)
+    waiter.join()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
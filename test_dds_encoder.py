@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the pure-NumPy BC3 encoder (run with python -m pytest).
+
+BC3 is lossy, so images are compressed and decompressed again and compared
+by PSNR instead of byte for byte.
+"""
+
+import os
+import struct
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dds_encoder
+from dds_encoder import decode_bc3, encode_bc3, psnr, read_dds, NumpyBackend
+
+# Smooth gradients compress to well above this; broken block ordering,
+# endpoint or index packing drops far below it
+MIN_PSNR = 35
+
+
+def gradient(height, width):
+    """An RGBA image with gradients in every channel, including alpha"""
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 5, y * 3, (x + y) * 2, 255 - x * 4], -1)
+    return pixels.clip(0, 255).astype(np.uint8)
+
+
+def test_round_trip_psnr():
+    pixels = gradient(64, 64)
+    data = encode_bc3(pixels)
+
+    assert len(data) == 16 * 16 * 16
+    decoded = decode_bc3(data, 64, 64)
+    assert decoded.shape == pixels.shape
+    assert psnr(pixels[..., :3], decoded[..., :3]) > MIN_PSNR
+    assert psnr(pixels[..., 3], decoded[..., 3]) > MIN_PSNR
+
+
+@pytest.mark.parametrize(
+    "height, width", [(1, 1), (3, 5), (13, 7), (2, 63), (33, 1), (130, 17)]
+)
+def test_odd_sizes(height, width):
+    pixels = gradient(height, width)
+    data = encode_bc3(pixels)
+
+    # Partial blocks are padded, so every started 4x4 block is stored
+    assert len(data) == -(-height // 4) * -(-width // 4) * 16
+    decoded = decode_bc3(data, width, height)
+    assert decoded.shape == (height, width, 4)
+    assert psnr(pixels, decoded) > MIN_PSNR
+
+
+def test_solid_colour_is_exact():
+    # Representable in RGB565, so nothing may be lost
+    pixels = np.zeros((8, 8, 4), dtype=np.uint8)
+    pixels[...] = (255, 0, 255, 128)
+
+    assert np.array_equal(decode_bc3(encode_bc3(pixels), 8, 8), pixels)
+
+
+def test_batch_matches_single_images():
+    images = np.stack([gradient(16, 16), 255 - gradient(16, 16)])
+
+    assert encode_bc3(images) == [encode_bc3(image) for image in images]
+
+
+def test_dds_file_has_mipmap_chain():
+    image = Image.fromarray(gradient(64, 64), "RGBA")
+    data = NumpyBackend.encode_dds([image])[0]
+
+    height, width, linear_size, _, mipmaps = struct.unpack_from("<5I", data, 12)
+    assert (width, height, mipmaps) == (64, 64, 7)
+    assert linear_size == 16 * 16 * 16
+    # 64x64 down to 1x1; levels below 4x4 still take one block
+    blocks = sum(max(1, size // 4) ** 2 for size in (64, 32, 16, 8, 4, 2, 1))
+    assert len(data) == 128 + blocks * 16
+    assert psnr(np.asarray(image), read_dds(data)) > MIN_PSNR
+
+
+def test_non_power_of_two_dds_has_one_level():
+    image = Image.fromarray(gradient(30, 50), "RGBA")
+    data = NumpyBackend.encode_dds([image])[0]
+
+    assert dds_encoder.mipmap_sizes(50, 30) == [(50, 30)]
+    assert len(data) == 128 + 13 * 8 * 16
+    assert read_dds(data).shape == (30, 50, 4)
+
+
+def test_read_dds_rejects_other_formats():
+    with pytest.raises(ValueError):
+        read_dds(b"\x89PNG\r\n\x1a\n" + bytes(200))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
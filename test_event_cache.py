@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the event background cache (run with python -m pytest).
+
+Concurrent requests for one event must share a single download, and the
+cache must stay within its byte budget by evicting the least recently used
+backgrounds.
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from event_cache import EventCache
+
+THREADS = 8
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_concurrent_gets_share_one_download():
+    cache = EventCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return b"background"
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        futures = [pool.submit(cache.get, "event", loader) for _ in range(THREADS)]
+        wait_for(lambda: cache.stats()["waits"] == THREADS - 1)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == [b"background"] * THREADS
+    assert len(calls) == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.get("event", loader) == b"background"
+    assert len(calls) == 1
+
+
+def test_failed_download_is_shared_but_not_cached():
+    cache = EventCache()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise OSError("connection reset")
+
+    with ThreadPoolExecutor(2) as pool:
+        owner = pool.submit(cache.get, "event", failing)
+        wait_for(lambda: cache.loading)
+        waiter = pool.submit(cache.get, "event", failing)
+        wait_for(lambda: cache.stats()["waits"] == 1)
+        release.set()
+        for future in (owner, waiter):
+            with pytest.raises(OSError):
+                future.result()
+
+    assert not cache.loading
+    assert cache.get("event", lambda: None) is None
+    assert cache.get("event", lambda: b"retried") == b"retried"
+
+
+def test_lru_eviction():
+    cache = EventCache(max_bytes=10)
+    cache.store("a", b"aaaa")
+    cache.store("b", b"bbbb")
+    assert cache.lookup("a") == b"aaaa"
+
+    # "b" is now the least recently used and makes room for "c"
+    cache.store("c", b"cccc")
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") == b"aaaa"
+    assert cache.lookup("c") == b"cccc"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+
+def test_get_refreshes_recency():
+    cache = EventCache(max_bytes=10)
+    cache.store("a", b"aaaa")
+    cache.store("b", b"bbbb")
+    assert cache.get("a", lambda: pytest.fail("cached")) == b"aaaa"
+
+    cache.get("c", lambda: b"cccc")
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_size_budget():
+    cache = EventCache(max_bytes=10)
+    cache.store("huge", b"x" * 11)
+    cache.store("a", b"aaaa")
+    cache.store("a", b"aaaaaa")
+    assert cache.lookup("huge") is None
+    assert cache.stats()["bytes"] == 6
+    assert cache.stats()["entries"] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
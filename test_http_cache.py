@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk HTTP cache (run with python -m pytest).
+
+A cached URL is revalidated with its ETag / Last-Modified validator and a
+304 answer is served from disk; prune() drops entries no run has used for a
+while, together with the bodies nothing refers to any more.
+"""
+
+import os
+import sys
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import http_client
+from http_cache import HTTPCache, conditional_headers
+
+PAGE_URL = "https://www.pesmaster.com/efootball-2022/player/1/"
+OTHER_URL = "https://www.pesmaster.com/efootball-2022/player/2/"
+BODY = b"<html>player 1</html>"
+ETAG = '"v1"'
+LAST_MODIFIED = "Sat, 01 Jun 2024 12:00:00 GMT"
+DAY = 24 * 3600
+
+
+def response(status_code, content=b"", headers=None, url=PAGE_URL):
+    r = requests.Response()
+    r.status_code = status_code
+    r._content = content
+    r.headers = CaseInsensitiveDict(headers or {})
+    r.url = url
+    return r
+
+
+class FakeSession:
+    """Answer GETs from a list of canned responses, recording the headers"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = HTTPCache(str(tmp_path / "http_cache"))
+    monkeypatch.setattr(http_client, "_cache", cache)
+    return cache
+
+
+def serve(monkeypatch, *responses):
+    session = FakeSession(*responses)
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+    return session
+
+
+@pytest.mark.parametrize(
+    "validator, conditional",
+    [
+        ({"ETag": ETAG}, {"If-None-Match": ETAG}),
+        ({"Last-Modified": LAST_MODIFIED}, {"If-Modified-Since": LAST_MODIFIED}),
+    ],
+    ids=["etag", "last-modified"],
+)
+def test_304_served_from_cache(monkeypatch, cache, validator, conditional):
+    headers = {"Content-Type": "text/html", **validator}
+    session = serve(monkeypatch, response(200, BODY, headers), response(304))
+
+    first = http_client.get(PAGE_URL, cache=True, retries=1)
+    assert first.content == BODY
+    assert not first.from_cache
+    assert session.sent[0] == {}
+
+    second = http_client.get(PAGE_URL, cache=True, retries=1)
+    assert session.sent[1] == conditional
+    assert second.status_code == 200
+    assert second.from_cache
+    assert second.content == BODY
+    assert second.headers["Content-Type"] == "text/html"
+
+
+def test_changed_page_replaces_cached_body(monkeypatch, cache):
+    serve(
+        monkeypatch,
+        response(200, BODY, {"ETag": ETAG}),
+        response(200, b"<html>new</html>", {"ETag": '"v2"'}),
+    )
+    http_client.get(PAGE_URL, cache=True, retries=1)
+    second = http_client.get(PAGE_URL, cache=True, retries=1)
+
+    assert not second.from_cache
+    entry = cache.lookup(PAGE_URL)
+    assert conditional_headers(entry) == {"If-None-Match": '"v2"'}
+    assert cache.read_body(entry) == b"<html>new</html>"
+
+
+def test_response_without_validator_is_not_cached(monkeypatch, cache):
+    session = serve(monkeypatch, response(200, BODY), response(200, BODY))
+    http_client.get(PAGE_URL, cache=True, retries=1)
+    http_client.get(PAGE_URL, cache=True, retries=1)
+
+    assert cache.lookup(PAGE_URL) is None
+    assert session.sent == [{}, {}]
+
+
+def test_identical_bodies_stored_once(cache):
+    cache.store(PAGE_URL, BODY, {"ETag": ETAG})
+    cache.store(OTHER_URL, BODY, {"ETag": '"other"'})
+    assert cache.lookup(PAGE_URL)["body_hash"] == cache.lookup(OTHER_URL)["body_hash"]
+    assert len(os.listdir(cache.objects_dir)) == 1
+
+
+def test_prune_drops_stale_entries_and_orphaned_bodies(cache):
+    now = 1_700_000_000
+    shared = b"<html>shared</html>"
+    cache.store(PAGE_URL, BODY, {"ETag": ETAG})
+    cache.store(OTHER_URL, shared, {"ETag": ETAG})
+    cache.store(PAGE_URL + "alt", shared, {"ETag": ETAG})
+    for url, age in ((PAGE_URL, 40 * DAY), (OTHER_URL, 40 * DAY)):
+        os.utime(cache._index_path(url), (now - age, now - age))
+    os.utime(cache._index_path(PAGE_URL + "alt"), (now - DAY, now - DAY))
+
+    assert cache.prune(30 * DAY, now=now) == (2, 1)
+    assert cache.lookup(PAGE_URL) is None
+    assert cache.lookup(OTHER_URL) is None
+    # The body still referenced by a fresh entry survives
+    assert cache.read_body(cache.lookup(PAGE_URL + "alt")) == shared
+
+
+def test_lookup_keeps_entry_from_being_pruned(cache):
+    now = 1_700_000_000
+    cache.store(PAGE_URL, BODY, {"ETag": ETAG})
+    os.utime(cache._index_path(PAGE_URL), (now - 40 * DAY, now - 40 * DAY))
+
+    assert cache.lookup(PAGE_URL) is not None
+    assert cache.prune(30 * DAY) == (0, 0)
+    assert cache.lookup(PAGE_URL) is not None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
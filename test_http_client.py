@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Tests for streamed image downloads (run with python -m pytest).
+
+Image responses are read chunk by chunk and abandoned as soon as the headers
+or the first bytes show an HTML page, or the body grows past the size limit.
+"""
+
+import os
+import sys
+
+import pytest
+from requests.structures import CaseInsensitiveDict
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import http_client
+from http_client import NOT_AN_IMAGE, UNEXPECTED_CONTENT_TYPE, _read_image, is_soft_404
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(56)
+HTML = b"<!DOCTYPE html><html><body>Not found</body></html>"
+IMAGE_URL = (
+    "https://www.pesmaster.com/efootball-2022/graphics/players/Variation2022/1_.png"
+)
+MAX_BYTES = 1024
+
+
+class StreamedResponse:
+    """Streamed response yielding a body in fixed chunks"""
+
+    def __init__(self, body, chunk_size=16, headers=None, status_code=200):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.status_code = status_code
+        self.url = IMAGE_URL
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk_size):
+            chunk = self.body[start : start + self.chunk_size]
+            self.read += len(chunk)
+            yield chunk
+
+    @property
+    def content(self):
+        return self._content
+
+    def close(self):
+        self.closed = True
+
+
+def test_image_is_read_whole():
+    r = StreamedResponse(PNG, headers={"Content-Type": "image/png"})
+    assert _read_image(r, MAX_BYTES) == len(PNG)
+    assert r.rejected is None
+    assert r._content == PNG
+    assert not r.closed
+
+
+def test_html_content_type_rejected_before_reading():
+    r = StreamedResponse(HTML, headers={"Content-Type": "text/html; charset=utf-8"})
+    assert _read_image(r, MAX_BYTES) == 0
+    assert r.rejected.startswith(UNEXPECTED_CONTENT_TYPE)
+    assert r.read == 0
+    assert r.closed
+    assert r._content == b""
+
+
+def test_html_body_rejected_on_first_chunk():
+    # Mislabelled error page: only the sniffed first chunk is read
+    body = HTML * 20
+    r = StreamedResponse(body, headers={"Content-Type": "image/png"})
+    _read_image(r, MAX_BYTES)
+    assert r.rejected == NOT_AN_IMAGE
+    assert r.read == 16
+    assert r.closed
+    assert r._content == b""
+
+
+def test_magic_sniffed_across_chunks():
+    r = StreamedResponse(PNG, chunk_size=1)
+    _read_image(r, MAX_BYTES)
+    assert r.rejected is None
+    assert r._content == PNG
+
+    r = StreamedResponse(HTML, chunk_size=1)
+    _read_image(r, MAX_BYTES)
+    assert r.rejected == NOT_AN_IMAGE
+    assert r.read == http_client.SIGNATURE_LENGTH
+
+
+@pytest.mark.parametrize(
+    "body, rejected",
+    [
+        (b"\xff\xd8\xff\xd9", None),
+        (b"GIF8", None),
+        (b"<ht", NOT_AN_IMAGE),
+        (b"", NOT_AN_IMAGE),
+    ],
+    ids=["jpeg", "gif", "html", "empty"],
+)
+def test_magic_sniffed_on_short_body(body, rejected):
+    # Shorter than the longest signature, so checked once the body ended
+    r = StreamedResponse(body)
+    _read_image(r, MAX_BYTES)
+    assert r.rejected == rejected
+    assert r._content == (body if rejected is None else b"")
+
+
+def test_oversize_content_length_rejected_before_reading():
+    r = StreamedResponse(PNG, headers={"Content-Length": str(MAX_BYTES + 1)})
+    assert _read_image(r, MAX_BYTES) == 0
+    assert "exceeds the limit" in r.rejected
+    assert r.read == 0
+    assert r.closed
+
+
+def test_oversize_body_aborted():
+    # No Content-Length: the download stops once the limit is crossed
+    body = PNG + bytes(4 * MAX_BYTES)
+    r = StreamedResponse(body, chunk_size=256)
+    assert _read_image(r, MAX_BYTES) == 5 * 256
+    assert "exceeds the limit" in r.rejected
+    assert r.read < len(body)
+    assert r.closed
+    assert r._content == b""
+
+
+def test_soft_404_reasons():
+    assert is_soft_404(None)
+    assert is_soft_404(NOT_AN_IMAGE)
+    assert is_soft_404(f"{UNEXPECTED_CONTENT_TYPE} text/html")
+    assert not is_soft_404(f"body exceeds the limit of {MAX_BYTES} bytes")
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.stream = None
+
+    def get(self, url, stream=False, **kwargs):
+        self.stream = stream
+        return self.response
+
+
+@pytest.mark.parametrize(
+    "response, content, rejected",
+    [
+        (StreamedResponse(PNG), PNG, None),
+        (StreamedResponse(HTML), b"", NOT_AN_IMAGE),
+        (StreamedResponse(HTML, status_code=404), b"", None),
+    ],
+    ids=["image", "soft 404", "404"],
+)
+def test_get_streams_images(monkeypatch, response, content, rejected):
+    session = FakeSession(response)
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+    r = http_client.get(IMAGE_URL, retries=1, image=True, max_bytes=MAX_BYTES)
+    assert session.stream
+    assert r.content == content
+    assert r.rejected == rejected
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for the negative cache of missing images (run with python -m pytest).
+
+The skip list is committed by the workflows and merged across shards, so it
+must survive a save/load round trip and keep the newest record of each URL.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import get_miniface
+import negative_cache
+from http_client import NOT_AN_IMAGE
+from negative_cache import NegativeCache
+
+DAY = 24 * 3600
+IMAGE_URL = (
+    "https://www.pesmaster.com/efootball-2022/graphics/players/Variation2022/1_.png"
+)
+MIRROR_URL = "https://efootballhub.net/images/efootball23/players/1_.png"
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(32)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze time.time() for the cache; set clock.now to move it"""
+
+    class Clock:
+        now = 1_700_000_000
+
+    monkeypatch.setattr(negative_cache.time, "time", lambda: Clock.now)
+    monkeypatch.setattr(negative_cache, "NEGATIVE_CACHE_RETRY", 7 * DAY)
+    monkeypatch.setattr(negative_cache, "NEGATIVE_CACHE_MAX_RETRY", 30 * DAY)
+    return Clock
+
+
+@pytest.fixture
+def active(monkeypatch):
+    cache = NegativeCache()
+    monkeypatch.setattr(negative_cache, "active_cache", cache)
+    return cache
+
+
+def test_save_load_round_trip(tmp_path, clock):
+    path = str(tmp_path / "skipped_players.txt")
+    cache = NegativeCache(path)
+    cache.record_missing(IMAGE_URL, 404)
+    cache.record_missing(MIRROR_URL, "html")
+    cache.record_found(IMAGE_URL.replace("1_", "2_"), MIRROR_URL.replace("1_", "2_"))
+    cache.save()
+
+    loaded = NegativeCache(path)
+    assert loaded.missing == cache.missing
+    assert loaded.sources == cache.sources
+    assert not loaded.dirty
+    # Sorted records, so the committed file diffs cleanly
+    with open(path, encoding="utf-8") as f:
+        records = [line for line in f if not line.startswith("#")]
+    assert records == sorted(records)
+
+
+def test_save_skips_unchanged_cache(tmp_path):
+    path = tmp_path / "skipped_players.txt"
+    NegativeCache(str(path)).save()
+
+    assert not path.exists()
+
+
+def test_retry_horizon_doubles_up_to_the_maximum(clock):
+    cache = NegativeCache()
+    horizons = []
+    for _ in range(4):
+        cache.record_missing(IMAGE_URL, 404)
+        horizons.append(cache.missing[IMAGE_URL]["retry_after"] - clock.now)
+
+    assert horizons == [7 * DAY, 14 * DAY, 28 * DAY, 30 * DAY]
+    assert cache.missing[IMAGE_URL]["misses"] == 4
+
+
+def test_missing_url_is_retried_after_the_horizon(clock):
+    cache = NegativeCache()
+    cache.record_missing(IMAGE_URL, 404)
+
+    assert cache.sources_to_try(IMAGE_URL, [IMAGE_URL, MIRROR_URL]) == [MIRROR_URL]
+    clock.now += 7 * DAY
+    assert not cache.is_missing(IMAGE_URL)
+    assert cache.sources_to_try(IMAGE_URL, [IMAGE_URL, MIRROR_URL]) == [
+        IMAGE_URL,
+        MIRROR_URL,
+    ]
+
+
+def test_merge_keeps_newest_record(clock):
+    old, new = NegativeCache(), NegativeCache()
+    old.record_missing(IMAGE_URL, 404)
+    first_seen = clock.now
+    clock.now += DAY
+    new.record_missing(IMAGE_URL, "html")
+    new.record_found(IMAGE_URL.replace("1_", "2_"), MIRROR_URL.replace("1_", "2_"))
+
+    old.merge(new)
+    entry = old.missing[IMAGE_URL]
+    assert entry["status"] == "html"
+    assert entry["first_seen"] == first_seen
+    assert entry["last_seen"] == clock.now
+    assert IMAGE_URL.replace("1_", "2_") in old.sources
+
+    # Merging the older record back does not roll the newer one back
+    stale = NegativeCache()
+    clock.now -= DAY
+    stale.record_missing(IMAGE_URL, 410)
+    old.merge(stale)
+    assert old.missing[IMAGE_URL]["status"] == "html"
+
+
+def test_found_image_clears_miss_and_remembers_mirror(clock):
+    cache = NegativeCache()
+    cache.record_missing(MIRROR_URL, 404)
+    cache.record_found(IMAGE_URL, MIRROR_URL)
+
+    assert MIRROR_URL not in cache.missing
+    assert cache.sources_to_try(IMAGE_URL, [IMAGE_URL, MIRROR_URL])[0] == MIRROR_URL
+
+
+@pytest.mark.parametrize(
+    "status_code, rejected, recorded",
+    [
+        (404, None, "404"),
+        (200, NOT_AN_IMAGE, "html"),
+        (200, "unexpected content type text/html; charset=utf-8", "html"),
+        (200, "body exceeds the limit of 1024 bytes", None),
+        (503, None, None),
+    ],
+    ids=["404", "not an image", "text content type", "too large", "server error"],
+)
+def test_record_image_response(active, status_code, rejected, recorded):
+    valid = get_miniface.record_image_response(
+        IMAGE_URL, IMAGE_URL, status_code, b"", rejected
+    )
+
+    assert not valid
+    entry = active.missing.get(IMAGE_URL)
+    assert (entry and entry["status"]) == recorded
+
+
+def test_record_valid_image_response(active):
+    active.record_missing(MIRROR_URL, 404)
+
+    assert get_miniface.record_image_response(IMAGE_URL, MIRROR_URL, 200, PNG)
+    assert active.missing == {}
+    assert active.sources[IMAGE_URL][0] == MIRROR_URL
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
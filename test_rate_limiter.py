@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-bucket rate limiter (run with python -m pytest).
+
+Buckets refill at their configured rate up to the burst size, and every host
+group has its own bucket, so throttling one host never slows down another.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rate_limiter
+from rate_limiter import TokenBucket
+
+PAGE_URL = "https://www.pesmaster.com/efootball-2022/player/1/"
+IMAGE_URL = (
+    "https://www.pesmaster.com/efootball-2022/graphics/players/Variation2022/1_.png"
+)
+MIRROR_URL = "https://efootballhub.net/images/efootball23/players/1_.png"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze time.monotonic() for the limiter; set clock.now to move it"""
+
+    class Clock:
+        now = 1000.0
+
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: Clock.now)
+    return Clock
+
+
+@pytest.fixture
+def buckets(monkeypatch, clock):
+    """Fresh 10/s buckets with a burst of 2 for every host group"""
+    fresh = {group: TokenBucket(10, 2) for group in ("pages", "graphics", "mirror")}
+    monkeypatch.setattr(rate_limiter, "_buckets", fresh)
+    return fresh
+
+
+def test_burst_then_rate(clock):
+    bucket = TokenBucket(10, 2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # The burst is spent: later requests are spaced 1/rate apart
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve() == pytest.approx(0.2)
+
+
+def test_refill_over_time(clock):
+    bucket = TokenBucket(10, 2)
+    for _ in range(3):
+        bucket.reserve()
+    assert bucket.tokens == pytest.approx(-1)
+
+    clock.now += 0.15
+    # 1.5 tokens refilled: the debt is paid and half a token is left
+    assert bucket.reserve() == pytest.approx(0.05)
+
+    clock.now += 0.05
+    assert bucket.reserve() == pytest.approx(0.1)
+
+
+def test_refill_capped_at_burst(clock):
+    bucket = TokenBucket(10, 2)
+    clock.now += 3600
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1)
+
+
+def test_throttle_pauses_and_recovers(clock):
+    bucket = TokenBucket(10, 2)
+    bucket.throttled(retry_after=5)
+    assert bucket.rate == pytest.approx(10 * rate_limiter.RATE_LIMIT_BACKOFF)
+    assert bucket.reserve() == pytest.approx(5)
+
+    for _ in range(200):
+        bucket.succeeded()
+    assert bucket.rate == bucket.max_rate
+
+
+@pytest.mark.parametrize(
+    "url, group",
+    [(PAGE_URL, "pages"), (IMAGE_URL, "graphics"), (MIRROR_URL, "mirror")],
+)
+def test_host_group(url, group):
+    assert rate_limiter.host_group(url) == group
+
+
+def test_host_groups_are_isolated(buckets):
+    for _ in range(5):
+        rate_limiter.bucket_for(MIRROR_URL).reserve()
+    assert rate_limiter.report_response(IMAGE_URL, 429, {"Retry-After": "30"})
+
+    # Neither the drained mirror bucket nor the throttled graphics bucket
+    # delays page fetches
+    assert rate_limiter.bucket_for(PAGE_URL).reserve() == 0
+    assert buckets["pages"].rate == 10
+    assert buckets["graphics"].reserve() == pytest.approx(30)
+    assert buckets["mirror"].reserve() > 0
+
+
+def test_acquire_sleeps_for_the_reserved_wait(monkeypatch, buckets):
+    slept = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", slept.append)
+    for _ in range(3):
+        rate_limiter.acquire(PAGE_URL)
+    rate_limiter.acquire(IMAGE_URL)
+    assert slept == [pytest.approx(0.1)]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for sharded runs and merge_shards.py (run with python -m pytest).
+
+Every runner of a CI matrix must compute the same team -> shard assignment
+on its own, and merging the shard outputs must yield every file exactly once.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import merge_shards
+from manifest import MANIFEST_VERSION
+from sharding import filter_shard, parse_shard, shard_of
+from teams import generate_alternate_team_urls
+
+TEAMS_URLS = [
+    f"https://www.pesmaster.com/efootball-2022/team/{team_id}/"
+    for team_id in range(100, 160)
+]
+
+
+def test_shard_assignment_is_stable():
+    # Pinned values: changing the hash would reshuffle every CI matrix
+    assert [shard_of(url, 4) for url in TEAMS_URLS[:8]] == [2, 2, 0, 3, 3, 0, 1, 0]
+    assert shard_of(TEAMS_URLS[0], 4) == shard_of(TEAMS_URLS[0].rstrip("/"), 4)
+    assert shard_of(TEAMS_URLS[0], 4) == shard_of(TEAMS_URLS[0].upper(), 4)
+
+
+def test_shard_assignment_matches_across_processes():
+    script = (
+        "import sys; from sharding import shard_of; "
+        "print(' '.join(str(shard_of(u, 4)) for u in sys.argv[1:]))"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", script, *TEAMS_URLS],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "PYTHONHASHSEED": "12345"},
+        text=True,
+    )
+    assert output.split() == [str(shard_of(url, 4)) for url in TEAMS_URLS]
+
+
+@pytest.mark.parametrize("count", [1, 2, 4, 7])
+def test_shards_partition_the_teams(count):
+    teams_urls = list(TEAMS_URLS)
+    for team_url in TEAMS_URLS[:5]:
+        teams_urls.extend(generate_alternate_team_urls(team_url, [1000]))
+
+    shards = [filter_shard(teams_urls, (index, count)) for index in range(count)]
+    assigned = [url for shard in shards for url in shard]
+    assert sorted(assigned) == sorted(teams_urls)
+    assert len(set(assigned)) == len(assigned)
+    if count > 1:
+        assert all(len(shard) < len(teams_urls) for shard in shards)
+
+
+def test_no_shard_keeps_everything():
+    assert filter_shard(TEAMS_URLS, None) == TEAMS_URLS
+
+
+@pytest.mark.parametrize("value", ["4/4", "-1/4", "0/0", "1", "a/b"])
+def test_parse_shard_rejects(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_shard(value)
+
+
+def write(path, content, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def dds_files(root):
+    return sorted(
+        os.path.relpath(os.path.join(dirpath, name), root)
+        for dirpath, _, names in os.walk(root)
+        for name in names
+        if name.endswith(".dds")
+    )
+
+
+@pytest.fixture
+def shards(tmp_path):
+    """Two shard trees sharing one identical and one conflicting file"""
+    root = merge_shards.OUTPUT_DIR_STANDARD
+    shard_dirs = [str(tmp_path / "shard-0"), str(tmp_path / "shard-1")]
+    write(os.path.join(shard_dirs[0], root, "1", "a.dds"), b"a")
+    write(os.path.join(shard_dirs[1], root, "2", "b.dds"), b"b")
+    for shard_dir in shard_dirs:
+        write(os.path.join(shard_dir, root, "3", "same.dds"), b"same")
+    write(os.path.join(shard_dirs[0], root, "4", "c.dds"), b"old", mtime=1000)
+    write(os.path.join(shard_dirs[1], root, "4", "c.dds"), b"new", mtime=2000)
+    return shard_dirs
+
+
+def test_merge_is_complete_and_duplicate_free(tmp_path, shards):
+    output = str(tmp_path / "merged")
+    stats = {"files": 0, "duplicates": 0, "conflicts": 0}
+    winners = merge_shards.merge_tree(
+        shards, merge_shards.OUTPUT_DIR_STANDARD, output, stats
+    )
+
+    expected = [os.path.join("1", "a.dds"), os.path.join("2", "b.dds")]
+    expected += [os.path.join("3", "same.dds"), os.path.join("4", "c.dds")]
+    assert dds_files(os.path.join(output, merge_shards.OUTPUT_DIR_STANDARD)) == sorted(
+        expected
+    )
+    assert len(winners) == 4
+    assert stats["duplicates"] == 1
+    assert stats["conflicts"] == 1
+    # The most recently written copy wins a conflict
+    c_path = os.path.join(output, merge_shards.OUTPUT_DIR_STANDARD, "4", "c.dds")
+    with open(c_path, "rb") as f:
+        assert f.read() == b"new"
+
+
+def test_merge_manifests_keeps_the_winning_card(tmp_path, shards):
+    output = str(tmp_path / "merged")
+    stats = {"files": 0, "duplicates": 0, "conflicts": 0}
+    winners = merge_shards.merge_tree(
+        shards, merge_shards.OUTPUT_DIR_STANDARD, output, stats
+    )
+
+    c_path = os.path.join(merge_shards.OUTPUT_DIR_STANDARD, "4", "c.dds")
+    for index, shard_dir in enumerate(shards):
+        data = {
+            "version": MANIFEST_VERSION,
+            "players": {str(index): {"cards": [f"{index}/c"]}},
+            "cards": {
+                "c": {"outputs": {"standard": {"path": c_path}}, "shard": index},
+                f"only-{index}": {"outputs": {}},
+            },
+        }
+        write(
+            os.path.join(shard_dir, merge_shards.MANIFEST_PATH),
+            json.dumps(data).encode("utf-8"),
+        )
+
+    assert merge_shards.merge_manifests(shards, output, winners) == 3
+    with open(os.path.join(output, merge_shards.MANIFEST_PATH)) as f:
+        merged = json.load(f)
+    assert merged["cards"]["c"]["shard"] == 1
+    assert set(merged["cards"]) == {"c", "only-0", "only-1"}
+    assert set(merged["players"]) == {"0", "1"}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
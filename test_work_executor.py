@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared priority executor (run with python -m pytest).
+
+A task waiting for its subtasks runs them on its own thread instead of
+blocking it, so nested team -> player -> image work completes even on a
+pool with a single thread.
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED
+
+import pytest
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from work_executor import (
+    PRIORITY_IMAGE,
+    PRIORITY_PLAYER,
+    PRIORITY_TEAM,
+    PriorityExecutor,
+)
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def executor():
+    executor = PriorityExecutor(max_workers=1)
+    yield executor
+    executor.shutdown()
+
+
+def current_thread():
+    return threading.current_thread().name
+
+
+def block(executor):
+    """Occupy a pool thread until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        return release.wait(TIMEOUT)
+
+    future = executor.submit(PRIORITY_TEAM, blocker)
+    assert started.wait(TIMEOUT)
+    return future, release
+
+
+def test_nested_wait_runs_subtasks_inline(executor):
+    def image():
+        return current_thread()
+
+    def player():
+        futures = [executor.submit(PRIORITY_IMAGE, image) for _ in range(3)]
+        executor.wait(futures)
+        return current_thread(), [future.result() for future in futures]
+
+    def team():
+        futures = [executor.submit(PRIORITY_PLAYER, player) for _ in range(3)]
+        executor.wait(futures)
+        return current_thread(), [future.result() for future in futures]
+
+    team_thread, players = executor.submit(PRIORITY_TEAM, team).result(TIMEOUT)
+    # The only pool thread ran every subtask while waiting for them
+    assert len(executor.threads) == 1
+    for player_thread, images in players:
+        assert player_thread == team_thread
+        assert images == [team_thread] * 3
+
+
+def test_saturated_pool_runs_own_tasks_of_equal_priority(executor):
+    def league():
+        futures = [executor.submit(PRIORITY_TEAM, current_thread) for _ in range(3)]
+        executor.wait(futures)
+        return [future.result() for future in futures]
+
+    # Teams are not more urgent than the waiting task, but no other thread
+    # could ever run them
+    assert executor.submit(PRIORITY_TEAM, league).result(TIMEOUT) == ["worker-0"] * 3
+
+
+def test_wait_from_outside_the_pool_helps(executor):
+    blocker, release = block(executor)
+    futures = [executor.submit(PRIORITY_PLAYER, current_thread) for _ in range(2)]
+
+    executor.wait(futures)
+    assert [future.result() for future in futures] == [current_thread()] * 2
+    release.set()
+    assert blocker.result(TIMEOUT)
+
+
+def test_queued_tasks_run_most_urgent_first(executor):
+    order = []
+    blocker, release = block(executor)
+    futures = [
+        executor.submit(priority, order.append, priority)
+        for priority in (PRIORITY_TEAM, PRIORITY_PLAYER, PRIORITY_IMAGE)
+    ]
+    release.set()
+    blocker.result(TIMEOUT)
+    for future in futures:
+        future.result(TIMEOUT)
+    assert order == [PRIORITY_IMAGE, PRIORITY_PLAYER, PRIORITY_TEAM]
+
+
+def test_timed_wait_leaves_other_tasks_to_the_pool():
+    executor = PriorityExecutor(max_workers=2)
+    try:
+        slow, release = block(executor)
+        other = executor.submit(PRIORITY_IMAGE, current_thread)
+        executor.wait([slow], timeout=0.05, return_when=FIRST_COMPLETED)
+        assert not slow.done()
+        assert other.result(TIMEOUT) != current_thread()
+        release.set()
+        executor.wait([slow])
+        assert slow.result()
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
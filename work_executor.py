@@ -0,0 +1,203 @@
+"""
+Shared priority executor for the threaded crawl.
+
+Team, player and image tasks all run on one long-lived pool of MAX_WORKERS
+threads instead of a fresh ThreadPoolExecutor per league, team and player.
+Queued tasks run most urgent first - images, then players, then teams - so
+work for an already fetched player finishes before new teams are
+discovered.
+
+A task waiting for its subtasks (see wait()) does not just block its
+thread: it runs queued tasks more urgent than itself in the meantime. A
+team can therefore never starve the players it waits for, and the total
+number of threads stays MAX_WORKERS however deeply tasks are nested.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future
+
+# Import configuration with fallbacks
+try:
+    from config import MAX_WORKERS
+except ImportError:
+    # Fallback configuration if config.py doesn't exist
+    MAX_WORKERS = 64
+
+# Task priorities (lower runs first)
+PRIORITY_IMAGE = 0
+PRIORITY_PLAYER = 1
+PRIORITY_TEAM = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class PriorityExecutor:
+    """Bounded thread pool running queued tasks by priority"""
+
+    def __init__(self, max_workers=MAX_WORKERS, thread_name_prefix="worker"):
+        self.max_workers = max(1, max_workers)
+        self.thread_name_prefix = thread_name_prefix
+        self.cond = threading.Condition()
+        self.queue = []
+        self.counter = itertools.count()
+        self.threads = []
+        self.idle = 0
+        self.stopping = False
+        # Priority of the task running on the current thread
+        self.local = threading.local()
+
+    def submit(self, priority, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) with a priority (PRIORITY_* constant).
+
+        Returns:
+            concurrent.futures.Future
+        """
+        future = Future()
+        with self.cond:
+            if self.stopping:
+                raise RuntimeError("cannot submit after shutdown")
+            # The counter keeps tasks of equal priority in submission order
+            heapq.heappush(
+                self.queue, (priority, next(self.counter), future, fn, args, kwargs)
+            )
+            if self.idle == 0 and len(self.threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"{self.thread_name_prefix}-{len(self.threads)}",
+                    daemon=True,
+                )
+                self.threads.append(thread)
+                thread.start()
+            self.cond.notify_all()
+        return future
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.stopping:
+                    self.idle += 1
+                    self.cond.wait()
+                    self.idle -= 1
+                if not self.queue:
+                    return
+                task = heapq.heappop(self.queue)
+            self._run(task)
+
+    def _run(self, task):
+        priority, _, future, fn, args, kwargs = task
+        if not future.set_running_or_notify_cancel():
+            return
+        outer = getattr(self.local, "priority", None)
+        self.local.priority = priority
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            self.local.priority = outer
+            with self.cond:
+                self.cond.notify_all()
+
+    def wait(self, futures, timeout=None, return_when=ALL_COMPLETED):
+        """
+        Wait for futures of this executor, running more urgent queued tasks
+        on the calling thread in the meantime (any task when called from a
+        thread outside the pool).
+
+        Args:
+            futures: Futures returned by submit()
+            timeout: Seconds to wait at most (None waits until done); a
+                timed wait leaves other queued tasks to the pool so it can
+                end on time
+            return_when: ALL_COMPLETED, or FIRST_COMPLETED to return as soon
+                as any of the futures is done
+        """
+        current = getattr(self.local, "priority", None)
+        finished = any if return_when == FIRST_COMPLETED else all
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.cond:
+                if finished(future.done() for future in futures):
+                    return
+                if (
+                    deadline is None
+                    and self.queue
+                    and (current is None or self.queue[0][0] < current)
+                ):
+                    task = heapq.heappop(self.queue)
+                elif self.idle == 0 and len(self.threads) >= self.max_workers:
+                    # No thread is free to pick up the awaited tasks: run one
+                    # here, as waiting for them could deadlock a full pool
+                    task = self._take(futures)
+                else:
+                    task = None
+                if task is None:
+                    if deadline is None:
+                        # Woken when a task finishes or a new one is queued
+                        self.cond.wait()
+                    elif deadline <= time.monotonic():
+                        return
+                    else:
+                        self.cond.wait(deadline - time.monotonic())
+                    continue
+            self._run(task)
+
+    def _take(self, futures):
+        """Remove and return a queued task of the given futures, if any"""
+        if all(future.running() or future.done() for future in futures):
+            return None
+        for index, task in enumerate(self.queue):
+            if task[2] in futures:
+                self.queue[index] = self.queue[-1]
+                self.queue.pop()
+                heapq.heapify(self.queue)
+                return task
+        return None
+
+    def map(self, priority, fn, iterable):
+        """Run fn over every item and return the futures once all are done"""
+        futures = [self.submit(priority, fn, item) for item in iterable]
+        self.wait(futures)
+        return futures
+
+    def shutdown(self, wait=True):
+        """Finish the queued tasks and stop the threads"""
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+            threads = list(self.threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+def configure(max_workers):
+    """Set the thread count of the shared executor (before its first use)"""
+    global MAX_WORKERS
+    MAX_WORKERS = max_workers
+
+
+def get_executor():
+    """Return the process-wide executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = PriorityExecutor(MAX_WORKERS)
+    return _executor
+
+
+def shutdown_executor(wait=True):
+    """Stop the shared executor if it was started"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)